@@ -0,0 +1,91 @@
+# encoding: utf-8
+#
+# bench_grammar.py
+#
+
+""" Benchmark of parse time against nesting depth and and/or chain length.
+
+Compares the default 'pyparsing' engine with the left-factored 'fast' engine and
+the hand-written 'pratt' engine, with and without pyparsing packrat memoization.
+Run from the repository root::
+
+    python benchmarks/bench_grammar.py
+    python benchmarks/bench_grammar.py --packrat
+
+The default engine backtracks exponentially with the nesting depth, so it is only
+timed up to a small depth; deeper rows, and searches nested too deeply to
+parse at all, show '-'.
+"""
+
+import sys
+import timeit
+
+sys.path.insert(0, '.')
+import sqlalchemy_boolean_search as sbs  # noqa: E402
+
+
+DEPTHS = [1, 2, 4, 6, 10, 20, 40]
+CHAINS = [2, 10, 50, 100, 200]
+MAX_PYPARSING_DEPTH = 6
+
+
+def nested_search(depth):
+    ''' Build a search nested depth levels deep, alternating and/or '''
+    search = 'x{0}==1'.format(depth)
+    for i in range(depth):
+        search = '(x{0}<{0} {1} {2})'.format(i, 'and' if i % 2 else 'or', search)
+    return search
+
+
+def chain_search(length, op='and'):
+    ''' Build a flat chain of length conditions joined by op '''
+    return ' {0} '.format(op).join('x{0}=={0}'.format(i) for i in range(length))
+
+
+def time_parse(search, engine, number=None):
+    ''' Return the best time in milliseconds to parse a search, or None if it fails '''
+    def parse():
+        sbs.parse_boolean_search(search, engine=engine)
+
+    try:
+        parse()
+    except sbs.BooleanSearchException:
+        # e.g. nested too deeply for the recursion limit
+        return None
+
+    if number is None:
+        number, __ = timeit.Timer(parse).autorange()
+        number = max(1, number // 4)
+    return min(timeit.repeat(parse, number=number, repeat=3)) / number * 1000.
+
+
+def format_row(label, times):
+    return '{0:>12} '.format(label) + ' '.join(
+        '{0:>12}'.format('-' if t is None else '{0:.3f}'.format(t)) for t in times)
+
+
+def main(argv):
+    if '--packrat' in argv:
+        sbs.enable_packrat()
+
+    engines = ['pyparsing', 'fast', 'pratt']
+    print('parse time (ms), packrat {0}'.format('on' if '--packrat' in argv else 'off'))
+    print(format_row('depth', []) + ' '.join('{0:>12}'.format(e) for e in engines))
+    for depth in DEPTHS:
+        search = nested_search(depth)
+        times = [None if engine == 'pyparsing' and depth > MAX_PYPARSING_DEPTH
+                 else time_parse(search, engine) for engine in engines]
+        print(format_row(depth, times))
+
+    print(format_row('and chain', []) + ' '.join('{0:>12}'.format(e) for e in engines))
+    for length in CHAINS:
+        print(format_row(length, [time_parse(chain_search(length), engine) for engine in engines]))
+
+    print(format_row('or chain', []) + ' '.join('{0:>12}'.format(e) for e in engines))
+    for length in CHAINS:
+        times = [time_parse(chain_search(length, 'or'), engine) for engine in engines]
+        print(format_row(length, times))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
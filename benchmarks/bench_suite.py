@@ -0,0 +1,263 @@
+# encoding: utf-8
+#
+# bench_suite.py
+#
+
+""" Benchmark suite for parsing, filter compilation and query execution.
+
+Times, against a generated SQLite database of Record, Parent and GrandParent rows:
+
+- parse latency of each engine across nesting depths and and/or chain lengths
+- ``filter()`` compilation on a single model, a list of models, a module and a
+  ModelRegistry, and rebinding a CompiledFilter
+- SQL compilation of the filter clauses
+- query execution
+- import time, and the time of the first parse, which builds the grammar, in a fresh
+  interpreter
+
+Results are saved as JSON so they can be compared between versions.  Run from
+the repository root::
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+
+Use ``--quick`` for a fast, less precise run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, '.')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import pyparsing  # noqa: E402
+import sqlalchemy  # noqa: E402
+from sqlalchemy import (Column, Integer, Float, String, Unicode, Boolean, ForeignKey,  # noqa: E402
+                        create_engine)
+from sqlalchemy.orm import relationship, sessionmaker  # noqa: E402
+from sqlalchemy.ext.declarative import declarative_base  # noqa: E402
+import sqlalchemy_boolean_search as sbs  # noqa: E402
+from bench_grammar import nested_search, chain_search, MAX_PYPARSING_DEPTH  # noqa: E402
+
+
+Base = declarative_base()
+
+
+class GrandParent(Base):
+    __tablename__ = 'grandparents'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, server_default='')
+
+
+class Parent(Base):
+    __tablename__ = 'parents'
+    id = Column(Integer, primary_key=True)
+    grandparent_id = Column(Integer(), ForeignKey('grandparents.id', ondelete='CASCADE'))
+    grandparent = relationship('GrandParent')
+    name = Column(String(50), nullable=False, server_default='')
+
+
+class Record(Base):
+    __tablename__ = 'records'
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer(), ForeignKey('parents.id', ondelete='CASCADE'))
+    parent = relationship('Parent')
+
+    string = Column(String(50), nullable=False, server_default='')
+    unicode = Column(Unicode(50), nullable=False, server_default=u'')
+    boolean = Column(Boolean(), nullable=False, server_default='0')
+    integer = Column(Integer(), nullable=False, server_default='0')
+    float = Column(Float(), nullable=False, server_default='0.0')
+
+
+ENGINES = ['pyparsing', 'fast', 'pratt']
+DEPTHS = [1, 2, 4, 6, 10, 20]
+CHAINS = [2, 10, 50, 100]
+ROWS = 20000
+
+FILTER_SEARCH = 'integer > 10 and float < 500.5 and (string = ab* or not integer between 3 and 7)'
+MODELS_SEARCH = 'integer > 10 and parent.name = p1* and grandparent.name == g2'
+QUERY_SEARCHES = {
+    'equality': 'integer == 42',
+    'range': 'integer > 10 and integer < 20 and float < 500',
+    'like': 'string = ab*',
+    'contains': 'string = ab',
+    'mixed': FILTER_SEARCH,
+}
+
+
+def build_database(rows=ROWS, seed=0):
+    ''' Create an in-memory SQLite database of generated rows, and return a session '''
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    rand = random.Random(seed)
+    grandparents = [GrandParent(name='g{0}'.format(i)) for i in range(10)]
+    parents = [Parent(name='p{0}'.format(i), grandparent=rand.choice(grandparents))
+               for i in range(100)]
+    session.add_all(grandparents + parents)
+    session.flush()
+    letters = 'abcdefgh'
+    session.bulk_insert_mappings(Record, [
+        dict(parent_id=rand.choice(parents).id,
+             string=''.join(rand.choice(letters) for __ in range(rand.randint(2, 8))),
+             unicode=u'u{0}'.format(i), boolean=bool(i % 2),
+             integer=rand.randint(0, 100), float=rand.uniform(0, 1000))
+        for i in range(rows)])
+    session.commit()
+    return session
+
+
+def measure(function, quick=False):
+    ''' Return the best and mean times in milliseconds of a function, or None if it fails '''
+    try:
+        function()
+    except sbs.BooleanSearchException:
+        # e.g. nested too deeply for the recursion limit
+        return None
+
+    number, __ = timeit.Timer(function).autorange()
+    number = max(1, number // (20 if quick else 4))
+    times = timeit.repeat(function, number=number, repeat=3 if quick else 5)
+    return {'best': min(times) / number * 1000., 'mean': sum(times) / len(times) / number * 1000.,
+            'number': number}
+
+
+def bench_parse(results, quick):
+    # the default engine backtracks exponentially with the nesting depth
+    max_depth = 4 if quick else MAX_PYPARSING_DEPTH
+    for engine in ENGINES:
+        for depth in DEPTHS:
+            if engine == 'pyparsing' and depth > max_depth:
+                continue
+            search = nested_search(depth)
+            results['parse.{0}.depth{1}'.format(engine, depth)] = measure(
+                lambda: sbs.parse_boolean_search(search, engine=engine), quick)
+        for length in CHAINS:
+            search = chain_search(length)
+            results['parse.{0}.chain{1}'.format(engine, length)] = measure(
+                lambda: sbs.parse_boolean_search(search, engine=engine), quick)
+
+
+def bench_filter(results, quick):
+    expression = sbs.parse_boolean_search(FILTER_SEARCH)
+    models_expression = sbs.parse_boolean_search(MODELS_SEARCH)
+    module = sys.modules[__name__]
+    registry = sbs.ModelRegistry(module)
+    targets = [('model', expression, Record),
+               ('list', models_expression, [Record, Parent, GrandParent]),
+               ('module', models_expression, module),
+               ('registry', models_expression, registry)]
+    for label, expr, models in targets:
+        results['filter.{0}'.format(label)] = measure(lambda: expr.filter(models), quick)
+
+    compiled = sbs.CompiledFilter(expression, Record)
+    other = sbs.parse_boolean_search(FILTER_SEARCH.replace('10', '20'))
+    results['filter.compiled_bind'] = measure(lambda: compiled.bind(other), quick)
+
+
+def bench_sql(results, quick, session):
+    dialect = session.get_bind().dialect
+    for label, search in sorted(QUERY_SEARCHES.items()):
+        clause = sbs.parse_boolean_search(search).filter(Record)
+        results['sql_compile.{0}'.format(label)] = measure(
+            lambda: clause.compile(dialect=dialect), quick)
+
+
+def bench_query(results, quick, session):
+    for label, search in sorted(QUERY_SEARCHES.items()):
+        expression = sbs.parse_boolean_search(search)
+        results['query.{0}'.format(label)] = measure(
+            lambda: session.query(Record).filter(expression.filter(Record)).all(), quick)
+    expression = sbs.parse_boolean_search(MODELS_SEARCH)
+    models = [Record, Parent, GrandParent]
+    query = session.query(Record).join(Parent).join(GrandParent)
+    results['query.joined'] = measure(lambda: query.filter(expression.filter(models)).all(), quick)
+
+
+IMPORT_CODE = '''
+import sys, timeit
+{preload}
+start = timeit.default_timer()
+import sqlalchemy_boolean_search
+imported = timeit.default_timer()
+sqlalchemy_boolean_search.parse_boolean_search('a == 1 and b < 2')
+print(imported - start, timeit.default_timer() - imported)
+'''
+
+
+def bench_import(results, quick):
+    ''' Time the import and the first parse in fresh interpreters '''
+    for label, preload in [('total', ''), ('module', 'import sqlalchemy, sqlalchemy.orm')]:
+        times = []
+        for __ in range(3 if quick else 10):
+            code = IMPORT_CODE.format(preload=preload)
+            output = subprocess.check_output([sys.executable, '-c', code])
+            times.append([float(t) * 1000. for t in output.split()])
+        imports = [t[0] for t in times]
+        results['import.{0}'.format(label)] = {'best': min(imports),
+                                               'mean': sum(imports) / len(imports), 'number': 1}
+        if label == 'module':
+            parses = [t[1] for t in times]
+            results['import.first_parse'] = {'best': min(parses),
+                                             'mean': sum(parses) / len(parses), 'number': 1}
+
+
+def environment():
+    return {'sqlalchemy_boolean_search': sbs.__version__, 'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__, 'pyparsing': pyparsing.__version__,
+            'platform': platform.platform()}
+
+
+def compare(results, previous):
+    ''' Print the ratio of the best times to those of a previous run '''
+    print('{0:<32} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'before (ms)', 'after (ms)',
+                                                  'ratio'))
+    for name in sorted(results):
+        before, after = previous.get(name), results[name]
+        if before is None or after is None:
+            continue
+        print('{0:<32} {1:>12.4f} {2:>12.4f} {3:>8.2f}'.format(
+            name, before['best'], after['best'], after['best'] / before['best']))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='compare with the results in this JSON file')
+    parser.add_argument('--quick', action='store_true', help='fewer repetitions')
+    parser.add_argument('--rows', type=int, default=ROWS, help='rows in the generated database')
+    args = parser.parse_args(argv)
+
+    session = build_database(rows=args.rows)
+    results = {}
+    bench_parse(results, args.quick)
+    bench_filter(results, args.quick)
+    bench_sql(results, args.quick, session)
+    bench_query(results, args.quick, session)
+    bench_import(results, args.quick)
+
+    for name in sorted(results):
+        timing = results[name]
+        best = '-' if timing is None else '{0:.4f}'.format(timing['best'])
+        print('{0:<32} {1:>12}'.format(name, best))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'rows': args.rows, 'results': results}, f,
+                      indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+        print()
+        compare(results, previous)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
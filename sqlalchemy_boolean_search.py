@@ -58,10 +58,13 @@ from __future__ import print_function
 import copy
 import inspect
 import decimal
-import pyparsing as pp
-from pyparsing import ParseException  # explicit export
+import math
+import re
+import threading
+import timeit
+from collections import OrderedDict, namedtuple
+import sqlalchemy
 from sqlalchemy import func, bindparam, text
-from sqlalchemy.dialects import postgresql
 from sqlalchemy.sql import or_, and_, not_, sqltypes, between
 from operator import le, ge, gt, lt, eq, ne
 
@@ -91,12 +94,421 @@ def get_field(DataModelClass, field_name, base_name=None):
     return getattr(DataModelClass, field_name, None)
 
 
+def _token_dict(data):
+    ''' Return the first parsed token as a dictionary
+
+    Tokens from the pyparsing grammar are ParseResults; the expression builders
+    of the other parser engines pass plain dictionaries.
+    '''
+    token = data[0]
+    return token.asDict() if hasattr(token, 'asDict') else dict(token)
+
+
+# ***** Parse context *****
+
+class ParseContext(object):
+    """ Collects the parameters, bind names and function conditions of a single parse.
+
+        A context is activated for the duration of a parse with a ``with`` block.  The
+        pyparsing parse actions (the Condition, BoolNot, BoolAnd, BoolOr and function
+        condition classes) register themselves with the active context of the current
+        thread, so concurrent parses in different threads never share any state.
+
+        Example:
+            with ParseContext() as context:
+                expression = expression_parser.parseString('a < 1 and a > 2')[0]
+            context.params     # {'a': '2'}
+            context.bindnames  # {'a', 'a_1'}
+    """
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.params = {}
+        self.uniqueparams = []
+        self.functions = []
+        self.bindnames = set()
+        # the expanding bind names of 'in' conditions, see reserve
+        self.expanding = set()
+        self._previous = []
+
+    @classmethod
+    def current(cls):
+        ''' Return the context active in this thread
+
+        If no context has been activated, e.g. when expression_parser is used
+        directly, the per-thread context started by the grammar for the current
+        parse is returned.
+        '''
+        context = getattr(cls._local, 'context', None)
+        if context is None:
+            context = getattr(cls._local, 'fallback', None)
+            if context is None:
+                context = cls._local.fallback = cls()
+        return context
+
+    @classmethod
+    def _begin_parse(cls, tokens):
+        ''' Parse action starting a per-thread context when none has been activated '''
+        if getattr(cls._local, 'context', None) is None:
+            cls._local.fallback = cls()
+
+    @classmethod
+    def _end_parse(cls, tokens):
+        ''' Parse action attaching the per-thread context to a directly parsed expression '''
+        if getattr(cls._local, 'context', None) is None and tokens:
+            cls.current().attach(tokens[0])
+
+    def __enter__(self):
+        self._previous.append(getattr(self._local, 'context', None))
+        self._local.context = self
+        return self
+
+    def __exit__(self, *exc):
+        self._local.context = self._previous.pop()
+        return False
+
+    def bind(self, fullname, value):
+        ''' Register a parameter value and return a unique bind parameter name for it
+
+        The first condition on a parameter binds to its full name, later ones
+        to the full name with an increasing numeric suffix, e.g. 'a', 'a_1', 'a_2'.
+
+        Parameters:
+            fullname (str): The full parameter name
+            value (str): The parameter value
+
+        Returns:
+            The bind parameter name
+        '''
+        self.params[fullname] = value
+        return self.reserve(fullname)
+
+    def reserve(self, name, expanding=False):
+        ''' Reserve and return a bind parameter name not yet used in this parse
+
+        SQLAlchemy expands an expanding bind parameter 'x' into 'x_1', 'x_2', ..., so
+        those names are kept clear of the other bind parameters as well.  A name that
+        is already an expanding one continues as 'x_', 'x__1', ....
+        '''
+        if not expanding and name in self.expanding:
+            name += '_'
+        bindname = name
+        count = 0
+        while bindname in self.bindnames or self._expands_into(bindname, expanding):
+            count += 1
+            bindname = '{0}_{1}'.format(name, count)
+        self.bindnames.add(bindname)
+        if expanding:
+            self.expanding.add(bindname)
+        return bindname
+
+    def _expands_into(self, bindname, expanding):
+        ''' Returns True if a bind name clashes with the expansion of an expanding one '''
+        prefix = bindname + '_'
+        if expanding and any(other.startswith(prefix) and other[len(prefix):].isdigit()
+                             for other in self.bindnames):
+            return True
+        base, sep, index = bindname.rpartition('_')
+        return bool(sep) and index.isdigit() and base in self.expanding
+
+    def add_unique(self, fullname):
+        ''' Record a parameter name used in the expression '''
+        if fullname not in self.uniqueparams:
+            self.uniqueparams.append(fullname)
+
+    def add_function(self, condition):
+        ''' Record a function condition separated out of a boolean operator '''
+        self.functions.append(condition)
+
+    def update_params(self, condition):
+        ''' update the params with the parameter/value of a condition '''
+        if isinstance(condition, Condition) and condition.fullname not in self.params:
+            self.params.update({condition.fullname: condition.value})
+
+    def attach(self, expression):
+        ''' Attach the collected params, uniqueparams and functions to a parsed expression '''
+        expression.params = self.params
+        expression.uniqueparams = list(self.uniqueparams)
+        expression.functions = self.functions
+        return expression
+
+
+# ***** Instrumentation *****
+
+_instruments = ()
+_clock = timeit.default_timer
+
+
+def add_instrument(instrument):
+    ''' Register a callback receiving the wall time of each instrumented stage
+
+    The callback is called as ``instrument(stage, seconds, target)``, where stage is
+    one of SearchStats.stages and target is the parsed, optimized or reordered
+    expression, or for 'field_lookup' and 'clause_build' the Condition being
+    compiled by filter().  While no instrument is registered the stages are not timed.
+
+    Parameters:
+        instrument: A callable, e.g. a SearchStats
+
+    Example:
+        add_instrument(lambda stage, seconds, target: statsd.timing(stage, seconds * 1000))
+    '''
+    global _instruments
+    _instruments = _instruments + (instrument,)
+
+
+def remove_instrument(instrument):
+    ''' Unregister a callback registered with add_instrument '''
+    global _instruments
+    instruments = list(_instruments)
+    instruments.remove(instrument)
+    _instruments = tuple(instruments)
+
+
+def _emit(stage, start, target):
+    ''' Pass the time elapsed since start to the registered instruments '''
+    seconds = _clock() - start
+    for instrument in _instruments:
+        instrument(stage, seconds, target)
+
+
+def expression_size(expression):
+    ''' Return the number of conditions and the depth of a parsed expression
+
+    Function conditions count as conditions; a single condition has depth 1.
+
+    Returns:
+        A tuple of the condition count and the tree depth
+    '''
+    if isinstance(expression, BoolNot):
+        count, depth = expression_size(expression.condition)
+        return count, depth + 1
+    if isinstance(expression, (BoolAnd, BoolOr)):
+        children = expression.conditions + expression.fxn_conditions
+        sizes = [expression_size(child) for child in children]
+        return sum(count for count, __ in sizes), 1 + max([depth for __, depth in sizes] or [0])
+    if isinstance(expression, BoolConstant):
+        return 0, 1
+    return 1, 1
+
+
+class SearchStats(object):
+    """ Collects the wall time and count of each instrumented stage of a search.
+
+        The stages are 'parse', 'field_lookup' (resolving parameter names to model
+        fields in filter()), 'clause_build' (building the SQLAlchemy condition of each
+        Condition), 'optimize' and 'reorder'.  Each parse also records the number of
+        conditions and the depth of the parsed expression.  Use the stats as a ``with``
+        block, or register them with add_instrument, and export them with as_dict.
+
+        Example:
+            with SearchStats() as stats:
+                expression = parse_boolean_search('a < 1 and not b == 2')
+                records = DataModel.query.filter(expression.filter(DataModel)).all()
+            stats.as_dict()  # {'parse.count': 1, 'parse.seconds': 0.0004, ...}
+    """
+
+    stages = ('parse', 'field_lookup', 'clause_build', 'optimize', 'reorder')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        ''' Clear all collected statistics '''
+        self.counts = dict.fromkeys(self.stages, 0)
+        self.seconds = dict.fromkeys(self.stages, 0.)
+        self.max_seconds = dict.fromkeys(self.stages, 0.)
+        self.searches = 0
+        self.conditions = 0
+        self.max_conditions = 0
+        self.max_depth = 0
+
+    def __call__(self, stage, seconds, target):
+        if stage == 'parse':
+            conditions, depth = expression_size(target)
+        with self._lock:
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+            self.seconds[stage] = self.seconds.get(stage, 0.) + seconds
+            self.max_seconds[stage] = max(self.max_seconds.get(stage, 0.), seconds)
+            if stage == 'parse':
+                self.searches += 1
+                self.conditions += conditions
+                self.max_conditions = max(self.max_conditions, conditions)
+                self.max_depth = max(self.max_depth, depth)
+
+    def __enter__(self):
+        add_instrument(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_instrument(self)
+        return False
+
+    def as_dict(self):
+        ''' Return the statistics as a flat dictionary of metric names and values
+
+        Each stage has '<stage>.count', '<stage>.seconds' and '<stage>.max_seconds'
+        entries; 'searches', 'conditions', 'max_conditions' and 'max_depth' describe
+        the parsed expressions.
+        '''
+        with self._lock:
+            stats = OrderedDict()
+            extra = sorted(stage for stage in self.counts if stage not in self.stages)
+            for stage in self.stages + tuple(extra):
+                stats[stage + '.count'] = self.counts[stage]
+                stats[stage + '.seconds'] = self.seconds[stage]
+                stats[stage + '.max_seconds'] = self.max_seconds[stage]
+            stats['searches'] = self.searches
+            stats['conditions'] = self.conditions
+            stats['max_conditions'] = self.max_conditions
+            stats['max_depth'] = self.max_depth
+        return stats
+
+
+# the compilation modes of conditions on ARRAY fields, see Condition.array_mode
+array_modes = ('contains', 'any')
+
+# the operators of conditions on ARRAY fields, reversed for 'value op ANY(field)'
+_array_operators = {'==': eq, '=': eq, '!=': ne, '<': gt, '<=': ge, '>': lt, '>=': le, 'in': eq}
+
+# the string-match strategies of '=' conditions on string fields, see Condition.match_strategy
+match_strategies = ('contains', 'prefix', 'exact', 'lower', 'trigram')
+
+
+def _field_options(field):
+    ''' Return the boolean search options of a field, from its column info dictionary '''
+    column = getattr(field, 'expression', None)
+    info = getattr(column, 'info', None) or {}
+    return info.get('boolean_search', {})
+
+
+def resolve_field(DataModelClass, fullname):
+    ''' Return the model class and field a parameter name refers to
+
+    Parameters:
+        DataModelClass:
+            A model class, a list of model classes, a module containing the
+            model classes, or a ModelRegistry
+        fullname (str):
+            The parameter name, optionally prefixed with a table or relationship name
+
+    Returns:
+        A tuple of the model class and its field
+    '''
+    if '.' in fullname:
+        basename, name = fullname.split('.', 1)
+    else:
+        basename, name = None, fullname
+
+    if isinstance(DataModelClass, JoinPlanner):
+        # relationship paths from a root model
+        return DataModelClass.resolve(fullname)
+
+    if isinstance(DataModelClass, ModelRegistry):
+        # pre-built index of the fields of many models
+        resolved = DataModelClass.resolve(name, basename=basename)
+        if resolved is None:
+            raise BooleanSearchException(
+                "No table in the model registry has a field named '%(field_name)s'."
+                % dict(field_name=fullname))
+        return resolved
+
+    if inspect.ismodule(DataModelClass):
+        # one module
+        models = _module_models(DataModelClass)
+    else:
+        # list of Model Classes
+        if isinstance(DataModelClass, list):
+            models = DataModelClass
+        else:
+            models = None
+
+    if models:
+        # Input is a a list of DataModelClasses
+        field = None
+        index = None
+        for i, model in enumerate(models):
+
+            field = get_field(model, name, base_name=basename)
+            try:
+                ptype = field.type
+                ilike = field.ilike
+            except AttributeError:
+                ptype = None
+                ilike = None
+
+            if not isinstance(field, type(None)) and ptype and ilike:
+                index = i
+                break
+
+        if isinstance(field, type(None)):
+            raise BooleanSearchException(
+                "Table '%(table_name)s' does not have a field named '%(field_name)s'."
+                % dict(table_name=model.__tablename__, field_name=name))
+
+        return models[index], field
+
+    else:
+        # Input is only one DataModelClass
+        field = get_field(DataModelClass, name)
+        if field:
+            return DataModelClass, field
+        else:
+            raise BooleanSearchException(
+                "Table '%(table_name)s' does not have a field named '%(field_name)s'."
+                % dict(table_name=DataModelClass.__tablename__, field_name=name))
+
+
+def _cone_model(DataModelClass):
+    ''' Return the first model with a cone search configuration, and the configuration '''
+    if isinstance(DataModelClass, JoinPlanner):
+        DataModelClass = DataModelClass.models
+    if isinstance(DataModelClass, ModelRegistry):
+        models = DataModelClass.models
+    elif inspect.ismodule(DataModelClass):
+        models = _module_models(DataModelClass)
+    elif isinstance(DataModelClass, list):
+        models = DataModelClass
+    else:
+        models = [DataModelClass]
+    for model in models:
+        options = getattr(model, '__boolean_search__', {}).get('cone')
+        if options is not None:
+            return model, options
+    return None, None
+
+
+def _is_array(fieldtype):
+    ''' Check if a column type is an ARRAY, such as the PostgreSQL ARRAY type '''
+    return isinstance(fieldtype, sqltypes.ARRAY)
+
+
+def _is_string_type(fieldtype):
+    ''' Returns True for string column types, whose '=' conditions map to LIKE '''
+    return isinstance(fieldtype, (sqltypes.TEXT, sqltypes.VARCHAR, sqltypes.String))
+
+
+def iter_conditions(expression):
+    ''' Yield the Condition elements of a parsed expression, in textual order '''
+    if isinstance(expression, Condition):
+        yield expression
+    elif isinstance(expression, BoolNot):
+        for condition in iter_conditions(expression.condition):
+            yield condition
+    elif hasattr(expression, 'conditions'):
+        for child in expression.conditions:
+            for condition in iter_conditions(child):
+                yield condition
+
+
 # ***** Define the expression element classes *****
 
 class FxnCondition(object):
     ''' Base function condition '''
     def __init__(self, data):
-        self.data = data[0].asDict()
+        self.data = _token_dict(data)
         self.fxn_name = self.data.get('fxn', None)
         self.args = self.data.get('args', None)
         self.kwargs = self.data.get('kwargs', None)
@@ -105,6 +517,10 @@ class FxnCondition(object):
         #return text(self.fxn_name)
         pass
 
+    def predicate(self):
+        ''' Function conditions are not evaluated in memory; returns None, like filter '''
+        return None
+
     def __repr__(self):
         args = self.args if self.args else []
         kwargs = [k + '=' + g for k, g in self.kwargs.items()] if self.kwargs else []
@@ -117,6 +533,7 @@ class ConeCondition(FxnCondition):
     def __init__(self, data):
         super(ConeCondition, self).__init__(data)
 
+        self.coords = self.value = None
         if self.kwargs:
             self.coords = (self.kwargs.get('ra', None), self.kwargs.get('dec', None))
             self.value = self.kwargs.get('radius', None)
@@ -126,6 +543,71 @@ class ConeCondition(FxnCondition):
             self.coords = [coorda, coordb]
             self.value = value
 
+    def _center(self):
+        ''' Return the center RA, Dec and radius of the cone, in degrees '''
+        try:
+            return float(self.coords[0]), float(self.coords[1]), float(self.value)
+        except (TypeError, ValueError, IndexError):
+            raise BooleanSearchException("Cone search {0} expects numeric ra, dec and radius "
+                                         "values in degrees.".format(repr(self)))
+
+    def filter(self, DataModelClass):
+        ''' Return the cone search as an SQLAlchemy condition
+
+        The RA and Dec columns, in degrees, are configured per model in its
+        ``__boolean_search__`` dictionary, e.g.
+        ``__boolean_search__ = {'cone': {'ra': 'ra', 'dec': 'dec', 'mode': 'bbox'}}``.
+        The mode is one of:
+
+            bbox: a bounding box on RA and Dec, which can use indexes on the columns,
+                and an exact angular distance check on the rows inside it (default)
+            q3c: the PostgreSQL q3c_radial_query function
+            pgsphere: the PostgreSQL pgSphere spoint <@ scircle containment operator
+
+        Returns None, leaving the condition to the caller, if no model has a cone
+        configuration, or for other functions parsed as a ConeCondition.
+        '''
+        if (self.fxn_name or '').lower() != 'cone':
+            return None
+        model, options = _cone_model(DataModelClass)
+        if model is None:
+            return None
+
+        ra = getattr(model, options.get('ra', 'ra'))
+        dec = getattr(model, options.get('dec', 'dec'))
+        ra0, dec0, radius = self._center()
+        mode = options.get('mode', 'bbox')
+        if mode == 'q3c':
+            return func.q3c_radial_query(ra, dec, ra0, dec0, radius)
+        elif mode == 'pgsphere':
+            point = func.spoint(func.radians(ra), func.radians(dec))
+            center = func.spoint(math.radians(ra0), math.radians(dec0))
+            circle = func.scircle(center, math.radians(radius))
+            return point.op('<@')(circle)
+        elif mode != 'bbox':
+            raise BooleanSearchException("Unknown cone search mode '{0}'. Expected one of: "
+                                         "bbox, q3c, pgsphere.".format(mode))
+
+        # bounding box prefilter: the Dec band, and the RA range unless the cone reaches a pole
+        conditions = [between(dec, dec0 - radius, dec0 + radius)]
+        if abs(dec0) + radius < 90:
+            sin_dra = math.sin(math.radians(radius)) / math.cos(math.radians(dec0))
+            dra = math.degrees(math.asin(sin_dra))
+            low, high = ra0 - dra, ra0 + dra
+            if low < 0:
+                conditions.append(or_(ra >= low + 360, ra <= high))
+            elif high >= 360:
+                conditions.append(or_(ra >= low, ra <= high - 360))
+            else:
+                conditions.append(between(ra, low, high))
+
+        # exact check: the cosine of the angular distance is at least the cosine of the radius
+        sin0, cos0 = math.sin(math.radians(dec0)), math.cos(math.radians(dec0))
+        cosine = (func.sin(func.radians(dec)) * sin0 +
+                  func.cos(func.radians(dec)) * cos0 * func.cos(func.radians(ra - ra0)))
+        conditions.append(cosine >= math.cos(math.radians(radius)))
+        return and_(*conditions)
+
 
 class HistCondition(FxnCondition):
     ''' Conditon for histogram searches '''
@@ -138,19 +620,74 @@ class HistCondition(FxnCondition):
             self.parameters = self.args[:-3]
             self.n_bins, self.low_edges, self.upp_edges = self.args[-3:]
 
+    def bins(self):
+        ''' Return the number of bins and the low and high edges of the histogram '''
+        try:
+            n_bins, low, high = int(self.n_bins), float(self.low_edges), float(self.upp_edges)
+        except (TypeError, ValueError):
+            raise BooleanSearchException("Histogram {0} expects an integer number of bins and "
+                                         "numeric low and high edges.".format(repr(self)))
+        if n_bins < 1 or high <= low:
+            raise BooleanSearchException("Histogram {0} needs at least one bin and a high edge "
+                                         "above the low edge.".format(repr(self)))
+        return n_bins, low, high
+
+    def edges(self):
+        ''' Return the n_bins + 1 bin edges of the histogram '''
+        n_bins, low, high = self.bins()
+        return [low + (high - low) * i / n_bins for i in range(n_bins + 1)]
+
+    def bucket(self, field, dialect_name=None):
+        ''' Return the SQL expression of the 0-based bin of a field, for values within the edges
+
+        Uses width_bucket on PostgreSQL, and integer truncation of the scaled value,
+        the floor for values within the edges, elsewhere.
+        '''
+        n_bins, low, high = self.bins()
+        if dialect_name == 'postgresql':
+            return func.width_bucket(field, low, high, n_bins) - 1
+        return sqlalchemy.cast((field - low) * (n_bins / (high - low)), sqlalchemy.Integer)
+
 
 class ExprCondition(FxnCondition):
     ''' Condition for a functional condition search '''
 
     def __init__(self, data):
         super(ExprCondition, self).__init__(data)
-        self.data = data[0].asDict()
+        self.data = _token_dict(data)
         self.fxn_call = self.data.get('call', None)
         self.fxn_name = self.fxn_call.get('fxn', None)
         self.condition = self.fxn_call.get('condition', None)
         self.operator = self.data.get('operator', None)
         self.value = self.data.get('value', None)
 
+    def filter(self, DataModelClass):
+        ''' Return the function condition as an SQLAlchemy condition
+
+        The function name is looked up in expression_functions, whose builder turns
+        the inner condition into an aggregate or subquery that is compared with the
+        value.  Returns None, leaving the condition to the caller, for functions that
+        are not registered or whose builder returns None.
+        '''
+        builder = expression_functions.get(self.fxn_name)
+        if builder is None:
+            return None
+        expression = builder(self.condition, DataModelClass)
+        if expression is None:
+            return None
+        if self.operator not in opdict:
+            raise BooleanSearchException("Function condition {0} does not support the operator "
+                                         "'{1}'.".format(repr(self), self.operator))
+        try:
+            value = int(self.value)
+        except ValueError:
+            try:
+                value = float(self.value)
+            except ValueError:
+                raise BooleanSearchException("Function condition {0} expects a numeric "
+                                             "value.".format(repr(self)))
+        return opdict[self.operator](expression, value)
+
     def __repr__(self):
         return '{0}({1})'.format(self.fxn_name, repr(self.condition)) + self.operator + self.value
 
@@ -160,15 +697,16 @@ class Condition(object):
         where operand can be one of: '<', '<=', '=', '==', '!=', '>=', '>'.
     """
     def __init__(self, data):
-        self.data = data[0].asDict()
+        self.data = _token_dict(data)
 
         self._parse_parameter_name()
         self.op = self.data.get('operator')
 
         self._extract_values()
 
-        uniqueparams.append(self.fullname)
-        self._bind_parameter_names()
+        context = ParseContext.current()
+        context.add_unique(self.fullname)
+        self._bind_parameter_names(context)
 
     def _parse_parameter_name(self):
         ''' parse the parameter name into a base + name '''
@@ -182,6 +720,10 @@ class Condition(object):
     def _extract_values(self):
         ''' Extract the value or values from the condition '''
         self.value = self.data.get('value', None)
+        if self.op == 'in':
+            # a list of values
+            self.value = [self._check_bitwise_value(value) for value in self.value]
+            return
         if not self.value:
             if self.op == 'between':
                 self.value = self._check_bitwise_value(self.data.get('value1'))
@@ -210,67 +752,42 @@ class Condition(object):
 
         return value
 
-    def _bind_parameter_names(self):
+    def _bind_parameter_names(self, context):
         ''' Bind the parameters names to the values '''
 
-        if self.fullname not in params:
-            params.update({self.fullname: self.value})
-            self.bindname = self.fullname
-        else:
-            count = list(params.keys()).count(self.fullname)
-            self.bindname = '{0}_{1}'.format(self.fullname, count)
-            params.update({self.fullname: self.value})
+        self.bindname = context.bind(self.fullname, self.value)
+        if self.op == 'in':
+            self.bindname = context.reserve(_in_bindname(self.bindname), expanding=True)
+        if hasattr(self, 'value2'):
+            self.bindname2 = context.reserve('{0}_{1}'.format(self.bindname, 2))
 
     def filter(self, DataModelClass):
         ''' Return the condition as an SQLalchemy query condition '''
 
-        condition = None
-        if inspect.ismodule(DataModelClass):
-            # one module
-            models = [i[1] for i in inspect.getmembers(DataModelClass, inspect.isclass) if hasattr(i[1], '__tablename__')]
-        else:
-            # list of Model Classes
-            if isinstance(DataModelClass, list):
-                models = DataModelClass
-            else:
-                models = None
-
-        if models:
-            # Input is a a list of DataModelClasses
-            field = None
-            index = None
-            for i, model in enumerate(models):
-
-                field = get_field(model, self.name, base_name=self.basename)
-                try:
-                    ptype = field.type
-                    ilike = field.ilike
-                except AttributeError as e:
-                    ptype = None
-                    ilike = None
-
-                if not isinstance(field, type(None)) and ptype and ilike:
-                    index = i
-                    break
+        if not _instruments:
+            model, field = self.resolve_field(DataModelClass)
+            return self.filter_one(model, field=field)
 
-            if isinstance(field, type(None)):
-                raise BooleanSearchException(
-                    "Table '%(table_name)s' does not have a field named '%(field_name)s'."
-                    % dict(table_name=model.__tablename__, field_name=self.name))
+        start = _clock()
+        model, field = self.resolve_field(DataModelClass)
+        _emit('field_lookup', start, self)
+        start = _clock()
+        condition = self.filter_one(model, field=field)
+        _emit('clause_build', start, self)
+        return condition
 
-            condition = self.filter_one(models[index], field=field, condition=condition)
+    def resolve_field(self, DataModelClass):
+        ''' Return the model class and field the condition parameter refers to
 
-        else:
-            # Input is only one DataModelClass
-            field = get_field(DataModelClass, self.name)
-            if field:
-                condition = self.filter_one(DataModelClass, field=field, condition=condition)
-            else:
-                raise BooleanSearchException(
-                    "Table '%(table_name)s' does not have a field named '%(field_name)s'."
-                    % dict(table_name=DataModelClass.__tablename__, field_name=self.name))
+        Parameters:
+            DataModelClass:
+                A model class, a list of model classes, a module containing the
+                model classes, or a ModelRegistry
 
-        return condition
+        Returns:
+            A tuple of the model class and its field
+        '''
+        return resolve_field(DataModelClass, self.fullname)
 
     def format_value(self, value, fieldtype, field):
         ''' Formats the value based on the fieldtype '''
@@ -311,22 +828,179 @@ class Condition(object):
         boundvalue = bindparam(self.bindname, value)
         lower_value = func.lower(boundvalue) if fieldtype not in ftypes else boundvalue
         if hasattr(self, 'value2'):
-            self.bindname = '{0}_{1}'.format(self.fullname, 2)
-            boundvalue2 = bindparam(self.bindname, value2)
+            boundvalue2 = bindparam(self.bindname2, value2)
             lower_value_2 = func.lower(boundvalue2) if fieldtype not in ftypes else boundvalue2
 
         return lower_field, lower_value, lower_value_2
 
+    @staticmethod
+    def like_pattern(value):
+        ''' Convert a '=' condition value into its LIKE pattern
+
+        x=5 -> '%5%' (x contains 5), x=5* -> '5%' (x starts with 5),
+        x=*5 -> '%5' (x ends with 5)
+        '''
+        if value.find('*') >= 0:
+            return value.replace('*', '%')
+        return '%' + value + '%'
+
+    @staticmethod
+    def match_strategy(field):
+        ''' Return the string-match strategy of a field for '=' conditions
+
+        The strategy is set per column in its info dictionary, e.g.
+        ``Column(String, info={'boolean_search': {'match': 'prefix'}})``, and is one of:
+
+            contains: field ILIKE '%x%', or the pattern as typed with '*' wildcards (default)
+            prefix: field LIKE 'x%', or the pattern as typed; can use a plain index
+            exact: field = 'x', or field LIKE the pattern as typed
+            lower: lower(field) LIKE lower('x%'); can use an index on lower(field)
+            trigram: field % 'x', the PostgreSQL pg_trgm similarity operator
+        '''
+        options = _field_options(field)
+        strategy = options.get('match', 'contains')
+        if strategy not in match_strategies:
+            raise BooleanSearchException(
+                "Unknown string match strategy '{0}'. Expected one of: {1}.".format(
+                    strategy, ', '.join(match_strategies)))
+        return strategy
+
+    def match_value(self, strategy, value):
+        ''' Return the bound value of a '=' condition value for a string-match strategy '''
+        if strategy == 'contains':
+            return self.like_pattern(value)
+        elif strategy == 'trigram':
+            return value.replace('*', '')
+        elif '*' in value:
+            return value.replace('*', '%')
+        return value + '%' if strategy in ('prefix', 'lower') else value
+
+    def match_condition(self, field, strategy):
+        ''' Return the SQLAlchemy condition of a '=' condition on a string field '''
+        boundvalue = bindparam(self.bindname, self.match_value(strategy, self.value))
+        if strategy == 'contains':
+            return field.ilike(boundvalue)
+        elif strategy == 'trigram':
+            return field.op('%')(boundvalue)
+        elif strategy == 'lower':
+            return func.lower(field).like(func.lower(boundvalue))
+        elif strategy == 'exact' and '*' not in self.value:
+            return field == boundvalue
+        return field.like(boundvalue)
+
+    def bound_value(self, field, value):
+        ''' Return the value bound to the query for a raw condition value
+
+        Applies the same conversions as filter_one: bitwise negation, conversion
+        to the field's numeric type, and LIKE patterns for '=' on string fields.
+
+        Parameters:
+            field: The SQLAlchemy field of the condition
+            value (str): A raw value as written in a search
+
+        Returns:
+            The value for the condition's bind parameter
+        '''
+        if _is_array(field.type):
+            return self.array_value(field, value)
+        if isinstance(value, list):
+            # the values of an 'in' condition
+            return [self.bound_value(field, item) for item in value]
+        fieldtype = field.type.python_type
+        value, __ = self.format_value(self._check_bitwise_value(value), fieldtype, field)
+        if self.op == '=' and _is_string_type(field.type):
+            value = self.match_value(self.match_strategy(field), value)
+        elif self.op == 'in' and fieldtype not in (float, int, decimal.Decimal):
+            # compared with lower(field)
+            value = value.lower()
+        return value
+
+    def in_condition(self, field):
+        ''' Return the SQLAlchemy condition of an 'in' condition
+
+        The values are bound as one expanding bind parameter, so lists of any
+        length share one statement.
+        '''
+        boundvalue = bindparam(self.bindname, self.bound_value(field, self.value), expanding=True)
+        if field.type.python_type in (float, int, decimal.Decimal):
+            return field.in_(boundvalue)
+        return func.lower(field).in_(boundvalue)
+
+    @staticmethod
+    def array_mode(field):
+        ''' Return how '==', '=', '!=' and 'in' conditions on an ARRAY field are compiled
+
+        The mode is set per column in its info dictionary, e.g.
+        ``Column(ARRAY(Integer), info={'boolean_search': {'array': 'any'}})``, and is one of:
+
+            contains: containment, which a GIN index can serve (default); x==5 is
+                x @> ARRAY[5], x in [1, 2] is x && ARRAY[1, 2] and x!=5 is NOT x @> ARRAY[5]
+            any: 5 = ANY(x), as for range comparisons
+
+        Range comparisons always use ANY, e.g. x>5 is 5 < ANY(x): some element is
+        greater than 5.  Containment needs the PostgreSQL ARRAY type.
+        '''
+        mode = _field_options(field).get('array', 'contains')
+        if mode not in array_modes:
+            raise BooleanSearchException("Unknown array mode '{0}'. Expected one of: {1}.".format(
+                mode, ', '.join(array_modes)))
+        if mode == 'contains':
+            from sqlalchemy.dialects import postgresql
+            if not isinstance(field.type, postgresql.ARRAY):
+                mode = 'any'
+        return mode
+
+    def array_value(self, field, value):
+        ''' Return the bound value of a condition on an ARRAY field for a raw value
+
+        Containment binds a list of values converted to the element type, ANY a
+        single converted value.
+        '''
+        itemtype = field.type.item_type.python_type
+        values = value if isinstance(value, list) else [value]
+        values = [self.format_value(self._check_bitwise_value(item), itemtype, field)[0]
+                  for item in values]
+        if self.op in ('==', '=', '!=', 'in') and self.array_mode(field) == 'contains':
+            return values
+        return values if self.op == 'in' else values[0]
+
+    def array_condition(self, field):
+        ''' Return the SQLAlchemy condition of a condition on an ARRAY field, see array_mode '''
+        if self.op not in _array_operators:
+            raise BooleanSearchException(
+                "Field {0} does not support the '{1}' operator on arrays.".format(
+                    self.name, self.op))
+
+        value = self.array_value(field, self.value)
+        if self.op in ('==', '=', '!=', 'in') and self.array_mode(field) == 'contains':
+            boundvalue = bindparam(self.bindname, value, type_=field.type)
+            if self.op == 'in':
+                return field.overlap(boundvalue)
+            condition = field.contains(boundvalue)
+            return not_(condition) if self.op == '!=' else condition
+
+        itemtype = field.type.item_type
+        if self.op == 'in':
+            return or_(*[field.any(bindparam('{0}_{1}'.format(self.bindname, i), item,
+                                             type_=itemtype), operator=eq)
+                         for i, item in enumerate(value)])
+        # 'x op value' holds for some element when 'value reversed-op ANY(x)'
+        return field.any(bindparam(self.bindname, value, type_=itemtype),
+                         operator=_array_operators[self.op])
+
     def filter_one(self, DataModelClass, field=None, condition=None):
         """ Return the condition as a SQLAlchemy query condition
         """
         if not isinstance(field, type(None)):
+            if self.op == 'in' and not _is_array(field.type):
+                return self.in_condition(field)
+
             # Prepare field and value
             lower_field, lower_value, lower_value_2 = self.bindAndLowerValue(field)
 
             # Handle Arrays
-            if isinstance(field.type, postgresql.ARRAY):
-                condition = field.any(self.value, operator=opdict[self.op])
+            if _is_array(field.type):
+                condition = self.array_condition(field)
             else:
                 # Do Normal Scalar Stuff
 
@@ -345,20 +1019,10 @@ class Condition(object):
                 elif self.op == '!=':
                     condition = lower_field.__ne__(lower_value)
                 elif self.op == '=':
-                    if isinstance(field.type, sqltypes.TEXT) or \
-                       isinstance(field.type, sqltypes.VARCHAR) or \
-                       isinstance(field.type, sqltypes.String):
-                        # this operator maps to LIKE
-                        # x=5 -> x LIKE '%5%' (x contains 5)
-                        # x=5* -> x LIKE '5%' (x starts with 5)
-                        # x=*5 -> x LIKE '%5' (x ends with 5)
-                        field = getattr(DataModelClass, self.name)
-                        value = self.value
-                        if value.find('*') >= 0:
-                            value = value.replace('*', '%')
-                            condition = field.ilike(bindparam(self.bindname, value))
-                        else:
-                            condition = field.ilike('%' + bindparam(self.bindname, value) + '%')
+                    if _is_string_type(field.type):
+                        # this operator maps to LIKE, with the pattern bound as
+                        # one value so all '=' searches share one statement shape
+                        condition = self.match_condition(field, self.match_strategy(field))
                     else:
                         # if not a text column, then use "=" as a straight equals
                         condition = lower_field.__eq__(lower_value)
@@ -371,15 +1035,158 @@ class Condition(object):
 
         return condition
 
+    def predicate(self):
+        ''' Return the condition as a Python predicate over in-memory rows
+
+        The predicate takes a dict, namedtuple or object and returns True, False,
+        or None when the row value is None, following SQL's NULL semantics.  Numeric
+        row values are compared as numbers, other values as case insensitive strings,
+        and '=' on strings is a case insensitive LIKE, as in filter_one.
+        '''
+        get = _row_getter(self.fullname)
+        op = self.op
+        value = _RowValue(self, self.value) if op != 'in' else None
+        value2 = _RowValue(self, self.value2) if hasattr(self, 'value2') else None
+
+        if op == 'in':
+            values = [_RowValue(self, item) for item in self.value]
+
+            def test(v):
+                return any(item.row(v) == item.coerce(v) for item in values)
+        elif op == '=':
+            pattern = _like_regex(self.like_pattern(self.value))
+
+            def test(v):
+                if isinstance(v, _numeric_types):
+                    return v == value.number()
+                return pattern.match(_lower(v)) is not None
+        elif op == 'between':
+            def test(v):
+                return value.coerce(v) <= value.row(v) <= value2.coerce(v)
+        elif op in ('&', '|'):
+            number = int(self.value)
+            bitwise = (lambda a, b: a & b) if op == '&' else (lambda a, b: a | b)
+
+            def test(v):
+                return bitwise(int(v), number) > 0
+        else:
+            compare = _comparisons[op]
+
+            def test(v):
+                return compare(value.row(v), value.coerce(v))
+
+        def predicate(row):
+            v = get(row)
+            if v is None:
+                return None
+            return test(v)
+
+        return predicate
+
     def __repr__(self):
+        if self.op == 'in':
+            return '{0} in [{1}]'.format(self.fullname, ', '.join(self.value))
         more = 'and' + self.value2 if hasattr(self, 'value2') else ''
         return self.fullname + self.op + self.value + more
 
 
 def update_params(condition):
-    ''' update the global params list with parameter/value '''
-    if isinstance(condition, Condition) and condition.name not in params:
-        params.update({condition.fullname: condition.value})
+    ''' Deprecated: use ParseContext.update_params
+
+    Kept for backwards compatibility; updates the params of the active parse context.
+    '''
+    ParseContext.current().update_params(condition)
+
+
+# the function condition classes, by function name; other names make a ConeCondition, which
+# only compiles to SQL for cone()
+function_conditions = {'cone': ConeCondition, 'hist': HistCondition}
+
+
+def _function_condition(data):
+    ''' Build the function condition for a parsed fxn(...) call, by function name '''
+    fxn_name = _token_dict(data).get('fxn', '')
+    return function_conditions.get(fxn_name.lower(), ConeCondition)(data)
+
+
+def _function_filters(operator, DataModelClass):
+    ''' Return the SQL conditions of the function conditions split out of an and/or operator '''
+    conditions = [condition.filter(DataModelClass)
+                  for condition in getattr(operator, 'fxn_conditions', [])]
+    return [condition for condition in conditions if condition is not None]
+
+
+def _in_bindname(bindname):
+    ''' Return the name of the expanding bind parameter of an 'in' condition
+
+    SQLAlchemy expands a parameter 'a' into 'a_1', 'a_2', ..., which are the names
+    ParseContext.reserve gives to further conditions on 'a', so the list binds as 'a_in'.
+    The name is reserved as an expanding one, so a parameter named 'a_in' moves it to
+    'a_in_1', or the parameter to 'a_in_', see ParseContext.reserve.
+    '''
+    return bindname + '_in'
+
+
+def _or_groups(conditions):
+    ''' Return the '==' and 'in' conditions of an or, grouped by parameter name '''
+    groups = OrderedDict()
+    for condition in conditions:
+        if isinstance(condition, Condition) and condition.op in ('==', 'in'):
+            groups.setdefault(condition.fullname, []).append(condition)
+    return groups
+
+
+def _reserve_in_bindnames(conditions, context):
+    ''' Reserve the bind names of the 'in' conditions that _or_terms merges '==' terms into '''
+    for group in _or_groups(conditions).values():
+        if len(group) > 1 and group[0].op != 'in' and not hasattr(group[0], 'in_bindname'):
+            group[0].in_bindname = context.reserve(_in_bindname(group[0].bindname), expanding=True)
+
+
+def _or_terms(conditions):
+    ''' Return the terms of an or, with its '==' and 'in' conditions on one parameter merged
+
+    A chain such as 'a==1 or a==2 or a==3' becomes the single condition 'a in [1, 2, 3]',
+    which binds the list of values to 'a_in', after the bind name of its first term, or
+    to the name reserved for it by _reserve_in_bindnames.
+    '''
+    groups = _or_groups(conditions)
+
+    terms = []
+    for condition in conditions:
+        group = groups.get(getattr(condition, 'fullname', None), [])
+        if len(group) < 2 or condition not in group:
+            terms.append(condition)
+        elif condition is group[0]:
+            merged = copy.copy(condition)
+            if condition.op != 'in':
+                merged.bindname = (getattr(condition, 'in_bindname', None) or
+                                   _in_bindname(condition.bindname))
+            merged.op = 'in'
+            merged.value = [value for member in group
+                            for value in (member.value if member.op == 'in' else [member.value])]
+            terms.append(merged)
+    return terms
+
+
+def iter_bound_conditions(expression):
+    ''' Yield the Condition elements of a parsed expression as filter() binds them
+
+    As iter_conditions, except that the '==' and 'in' conditions on one parameter of
+    an or are merged into one 'in' condition, see BoolOr.filter.
+    '''
+    if isinstance(expression, Condition):
+        yield expression
+    elif isinstance(expression, BoolNot):
+        for condition in iter_bound_conditions(expression.condition):
+            yield condition
+    elif hasattr(expression, 'conditions'):
+        children = expression.conditions
+        if isinstance(expression, BoolOr):
+            children = _or_terms(children)
+        for child in children:
+            for condition in iter_bound_conditions(child):
+                yield condition
 
 
 class BoolNot(object):
@@ -387,13 +1194,26 @@ class BoolNot(object):
     """
     def __init__(self, data):
         self.condition = data[0][1]
-        update_params(self.condition)
+        ParseContext.current().update_params(self.condition)
 
     def filter(self, DataModelClass):
         """ Return the operator as a SQLAlchemy not_() condition
         """
-        if not isinstance(self.condition, FxnCondition):
-            return not_(self.condition.filter(DataModelClass))
+        condition = self.condition.filter(DataModelClass)
+        if condition is not None:
+            return not_(condition)
+
+    def predicate(self):
+        """ Return the operator as a Python predicate over in-memory rows
+        """
+        predicate = self.condition.predicate()
+        if predicate is None:
+            return None
+
+        def negate(row):
+            result = predicate(row)
+            return None if result is None else not result
+        return negate
 
     def __repr__(self):
         return 'not_(' + repr(self.condition) + ')'
@@ -404,21 +1224,24 @@ class BoolAnd(object):
     """
     def __init__(self, data):
         self.conditions = []
+        self.fxn_conditions = []
+        context = ParseContext.current()
         for condition in data[0]:
             if condition and condition != 'and':
                 if isinstance(condition, FxnCondition):
-                    functions.append(condition)
+                    context.add_function(condition)
+                    self.fxn_conditions.append(condition)
                 else:
                     self.conditions.append(condition)
                 #self.conditions.append(condition)
-                update_params(condition)
+                context.update_params(condition)
 
     def filter(self, DataModelClass):
         """ Return the operator as a SQLAlchemy and_() condition
         """
-        # conditions = [condition.filter(DataModelClass) for condition in self.conditions
-        #               if not isinstance(condition, (FxnCondition, ConeCondition))]
         conditions = [condition.filter(DataModelClass) for condition in self.conditions]
+        # function conditions that compile to SQL, e.g. cones on a configured model
+        conditions += _function_filters(self, DataModelClass)
         return and_(*conditions)  # * converts list to argument sequence
 
     def removeFunctions(self):
@@ -426,6 +1249,11 @@ class BoolAnd(object):
         self.conditions = [condition for condition in self.conditions
                            if not isinstance(condition, FxnCondition)]
 
+    def predicate(self):
+        """ Return the operator as a Python predicate over in-memory rows
+        """
+        return _combine_predicates(self, is_and=True)
+
     def __repr__(self):
         return 'and_(' + ', '.join([repr(condition) for condition in self.conditions]) + ')'
 
@@ -435,20 +1263,31 @@ class BoolOr(object):
     """
     def __init__(self, data):
         self.conditions = []
+        self.fxn_conditions = []
+        context = ParseContext.current()
         for condition in data[0]:
             if condition and condition != 'or':
                 if isinstance(condition, FxnCondition):
-                    functions.append(condition)
+                    context.add_function(condition)
+                    self.fxn_conditions.append(condition)
                 else:
                     self.conditions.append(condition)
-                update_params(condition)
+                context.update_params(condition)
+        _reserve_in_bindnames(self.conditions, context)
 
     def filter(self, DataModelClass):
         """ Return the operator as a SQLAlchemy or_() condition
         """
-        conditions = [condition.filter(DataModelClass) for condition in self.conditions if not isinstance(condition, FxnCondition)]
+        conditions = [condition.filter(DataModelClass) for condition in _or_terms(self.conditions)
+                      if not isinstance(condition, FxnCondition)]
+        conditions += _function_filters(self, DataModelClass)
         return or_(*conditions)  # * converts list to argument sequence
 
+    def predicate(self):
+        """ Return the operator as a Python predicate over in-memory rows
+        """
+        return _combine_predicates(self, is_and=False)
+
     def __repr__(self):
         return 'or_(' + ', '.join([repr(condition) for condition in self.conditions]) + ')'
 
@@ -456,95 +1295,2700 @@ class BoolOr(object):
         ''' remove the fxn conditions '''
         self.conditions = [condition for condition in self.conditions if not isinstance(condition, FxnCondition)]
 
+
+class BoolConstant(object):
+    """ Represents a constant true or false condition, produced by optimize
+    """
+    def __init__(self, value):
+        self.value = bool(value)
+
+    def filter(self, DataModelClass):
+        """ Return the constant as a SQLAlchemy true() or false() condition
+        """
+        return sqlalchemy.true() if self.value else sqlalchemy.false()
+
+    def predicate(self):
+        """ Return the constant as a Python predicate over in-memory rows
+        """
+        value = self.value
+        return lambda row: value
+
+    def __repr__(self):
+        return 'true' if self.value else 'false'
+
+
+# ***** Compiled filters *****
+
+Shape = namedtuple('Shape', ['key', 'values', 'bindnames'])
+
+
+def _canonical(expression):
+    ''' Return the (key, values, bindnames) of an expression element in canonical order '''
+    if isinstance(expression, Condition):
+        if hasattr(expression, 'value2'):
+            return ('{0} between ? and ?'.format(expression.fullname),
+                    [expression.value, expression.value2],
+                    [expression.bindname, expression.bindname2])
+        if expression.op == 'in':
+            # lists of any length share one shape
+            return (expression.fullname + ' in ?', [expression.value], [expression.bindname])
+        return (expression.fullname + expression.op + '?', [expression.value],
+                [expression.bindname])
+    elif isinstance(expression, BoolNot):
+        key, values, bindnames = _canonical(expression.condition)[:3]
+        return ('not(' + key + ')', values, bindnames)
+    elif isinstance(expression, (BoolAnd, BoolOr)):
+        # flatten nested operators of the same kind, then sort the commutative children
+        children = []
+        terms = expression.conditions
+        if isinstance(expression, BoolOr):
+            terms = _or_terms(terms)
+        for child in terms:
+            if type(child) is type(expression):
+                children.extend(_canonical(child)[3])
+            else:
+                children.append(_canonical(child))
+        children.sort(key=lambda child: (child[0], child[1]))
+        name = 'and' if isinstance(expression, BoolAnd) else 'or'
+        return (name + '(' + ', '.join(child[0] for child in children) + ')',
+                [value for child in children for value in child[1]],
+                [bindname for child in children for bindname in child[2]],
+                children)
+    # function conditions are not bound, so they stay literal
+    return (repr(expression), [], [])
+
+
+def canonicalize(expression):
+    ''' Return the shape of a parsed expression
+
+    The shape key is the expression with its values replaced by '?' placeholders,
+    nested and/or operators flattened and their children sorted, so that searches
+    differing only in their values or in the order of their and/or terms, e.g.
+    'a==1 and b<2' and 'b<9 and (a==5)', share one key.  Function conditions
+    separated out of the expression are appended to the key as written.
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+
+    Returns:
+        A Shape namedtuple of the key, the raw values in canonical order, and the
+        bind parameter names of those values
+    '''
+    key, values, bindnames = _canonical(expression)[:3]
+    functions = getattr(expression, 'functions', None)
+    if functions:
+        key += ' | ' + ', '.join(repr(function) for function in functions)
+    return Shape(key, values, bindnames)
+
+
+def _binds_items(condition, field):
+    ''' Returns True if an 'in' condition binds each value separately, see array_condition '''
+    return (condition.op == 'in' and _is_array(field.type) and
+            Condition.array_mode(field) != 'contains')
+
+
+def _value_forms(expression, shape, DataModelClass):
+    ''' Return the forms of the values of an expression that change its SQL, in canonical order
+
+    Exact-match columns compile '=' to = without wildcards and to LIKE with them, and
+    an 'in' on an array compared with ANY binds each value separately, so filters are
+    only shared between searches whose wildcards and such list lengths agree.
+    '''
+    conditions = dict((condition.bindname, condition)
+                      for condition in iter_bound_conditions(expression))
+    forms = []
+    for bindname in shape.bindnames:
+        condition = conditions.get(bindname)
+        form = None
+        if condition is None:
+            pass
+        elif condition.op == '=':
+            form = '*' in condition.value
+        elif condition.op == 'in':
+            try:
+                model, field = condition.resolve_field(DataModelClass)
+                if _binds_items(condition, field):
+                    form = len(condition.value)
+            except (BooleanSearchException, NotImplementedError, AttributeError):
+                pass
+        forms.append(form)
+    return tuple(forms)
+
+
+class CompiledFilter(object):
+    """ A filter clause built once from a parsed expression, rebound with new values.
+
+        The SQLAlchemy clause is built a single time, with stable bind parameter
+        names.  Searches that differ only in their values can reuse it by passing new
+        bind parameter values, which keeps the statement text identical so that
+        SQLAlchemy's compiled statement cache and the database's prepared plans are
+        reused as well.
+
+        Parameters:
+            expression:
+                A parsed expression from parse_boolean_search
+            DataModelClass:
+                A model class, a list of model classes, a module or a ModelRegistry
+
+        Example:
+            compiled = CompiledFilter(parse_boolean_search('integer > 1 and string = a*'), Record)
+            query = Record.query.filter(compiled.clause)
+            query.params(compiled.params({'integer': '5', 'string': 'b*'})).all()
+            query.params(compiled.bind(parse_boolean_search('integer > 2 and string = c*'))).all()
+    """
+
+    def __init__(self, expression, DataModelClass):
+        self.expression = expression
+        self.shape = canonicalize(expression)
+        self.clause = expression.filter(DataModelClass)
+
+        # the condition and field behind each bind parameter name
+        self._binds = OrderedDict()
+        # the bind parameter names of the values of 'in' conditions bound one by one
+        self._items = {}
+        for condition in iter_bound_conditions(expression):
+            model, field = condition.resolve_field(DataModelClass)
+            self._binds[condition.bindname] = (condition, field)
+            if _binds_items(condition, field):
+                self._items[condition.bindname] = ['{0}_{1}'.format(condition.bindname, i)
+                                                   for i in range(len(condition.value))]
+            if hasattr(condition, 'bindname2'):
+                self._binds[condition.bindname2] = (condition, field)
+
+    @property
+    def bindnames(self):
+        ''' The bind parameter names of the clause '''
+        return list(self._binds.keys())
+
+    def values(self, expression=None):
+        ''' Return the raw condition values of an expression, keyed by bind parameter name
+
+        Parameters:
+            expression:
+                A parsed expression with the same structure as the compiled one.
+                Defaults to the compiled expression.
+        '''
+        expression = self.expression if expression is None else expression
+        values = {}
+        for condition in iter_bound_conditions(expression):
+            values[condition.bindname] = condition.value
+            if hasattr(condition, 'bindname2'):
+                values[condition.bindname2] = condition.value2
+        return values
+
+    def params(self, values=None):
+        ''' Return the bind parameter values for new raw condition values
+
+        Parameters:
+            values (dict):
+                Raw values, as they would be written in a search, keyed by bind
+                parameter name.  Names left out keep their compiled values.
+
+        Returns:
+            A dictionary to pass to Query.params or Session.execute
+        '''
+        raw = self.values()
+        if values:
+            unknown = set(values) - set(self._binds)
+            if unknown:
+                raise BooleanSearchException(
+                    "Unknown bind parameter(s) {0}. Expected one of: {1}.".format(
+                        ', '.join(sorted(unknown)), ', '.join(self.bindnames)))
+            for bindname, value in values.items():
+                condition, field = self._binds[bindname]
+                if (self._changes_match_form(condition, field, value) or
+                        (bindname in self._items and len(value) != len(self._items[bindname]))):
+                    raise BooleanSearchException(
+                        "The value '{0}' of {1} needs a different clause than '{2}'; compile a "
+                        "new filter.".format(value, bindname, condition.value))
+            raw.update(values)
+
+        params = {}
+        for bindname, (condition, field) in self._binds.items():
+            value = condition.bound_value(field, raw[bindname])
+            if bindname in self._items:
+                params.update(zip(self._items[bindname], value))
+            else:
+                params[bindname] = value
+        return params
+
+    @staticmethod
+    def _changes_match_form(condition, field, value):
+        ''' Returns True if a new '=' value switches an exact-match clause between = and LIKE '''
+        if condition.op != '=' or _is_array(field.type) or not _is_string_type(field.type):
+            return False
+        if condition.match_strategy(field) != 'exact':
+            return False
+        return ('*' in value) != ('*' in condition.value)
+
+    def bind(self, expression):
+        ''' Return the bind parameter values for another expression of the same shape
+
+        The expression may order its and/or terms differently; its values are
+        matched to the bind parameters through the canonical order of canonicalize.
+        '''
+        shape = canonicalize(expression)
+        if shape.key != self.shape.key:
+            raise BooleanSearchException("The expression {0} does not have the shape of the "
+                                         "compiled filter {1}".format(repr(expression),
+                                                                      repr(self.expression)))
+        return self.params(dict(zip(self.shape.bindnames, shape.values)))
+
+    def __repr__(self):
+        return '<CompiledFilter {0}>'.format(repr(self.expression))
+
+
+# ***** Expression optimizer *****
+
+# the operator of the negated condition, for conditions whose negation is a plain comparison
+_inverse_ops = {'<': '>=', '>=': '<', '>': '<=', '<=': '>', '==': '!=', '!=': '=='}
+
+
+def _node(cls, conditions, fxn_conditions=None):
+    """ Build a BoolAnd or BoolOr element outside of a parse """
+    node = cls.__new__(cls)
+    node.conditions = conditions
+    node.fxn_conditions = fxn_conditions or []
+    return node
+
+
+def _negate(node, DataModelClass=None, context=None):
+    """ Return the negation of an optimized element, with the not pushed inward """
+    if isinstance(node, BoolConstant):
+        return BoolConstant(not node.value)
+    elif isinstance(node, BoolNot):
+        return node.condition
+    elif isinstance(node, (BoolAnd, BoolOr)) and not getattr(node, 'fxn_conditions', None):
+        # De Morgan: not (a and b) -> not a or not b
+        other = BoolOr if isinstance(node, BoolAnd) else BoolAnd
+        negated = [_negate(child, DataModelClass, context) for child in node.conditions]
+        return _optimize_node(_node(other, negated), DataModelClass, context)
+    elif (isinstance(node, Condition) and node.op in _inverse_ops and
+          _is_scalar_field(node, DataModelClass)):
+        # on arrays x>5 means some element is greater, so its negation is not x<=5
+        node = copy.copy(node)
+        node.op = _inverse_ops[node.op]
+        return node
+    negated = BoolNot.__new__(BoolNot)
+    negated.condition = node
+    return negated
+
+
+def _term_key(node):
+    """ Return a key identifying a term by its shape and values """
+    key, values = _canonical(node)[:2]
+    return (key, tuple(tuple(value) if isinstance(value, list) else value for value in values))
+
+
+def _is_scalar_field(condition, DataModelClass):
+    """ Returns True if the condition parameter resolves to a non-array field """
+    if DataModelClass is None:
+        return False
+    try:
+        model, field = condition.resolve_field(DataModelClass)
+        return not _is_array(field.type)
+    except (BooleanSearchException, NotImplementedError, AttributeError):
+        return False
+
+
+def _is_numeric_field(condition, DataModelClass):
+    """ Returns True if the condition parameter resolves to a numeric, non-array field """
+    try:
+        model, field = condition.resolve_field(DataModelClass)
+        return (not _is_array(field.type) and
+                field.type.python_type in (int, float, decimal.Decimal))
+    except (BooleanSearchException, NotImplementedError, AttributeError):
+        return False
+
+
+def _is_nullable(condition, DataModelClass):
+    """ Returns True unless the condition parameter resolves to a NOT NULL column """
+    try:
+        model, field = condition.resolve_field(DataModelClass)
+    except (BooleanSearchException, NotImplementedError, AttributeError):
+        return True
+    column = getattr(field, 'expression', None)
+    return not isinstance(column, sqlalchemy.Column) or column.nullable
+
+
+def _bounds(condition):
+    """ Return the (value, op) lower and upper bounds of a range condition, as floats """
+    if condition.op == 'between':
+        return (float(condition.value), '>='), (float(condition.value2), '<=')
+    value = float(condition.value)
+    if condition.op in ('>', '>='):
+        return (value, condition.op), None
+    elif condition.op in ('<', '<='):
+        return None, (value, condition.op)
+    return (value, '>='), (value, '<=')
+
+
+def _merge_ranges(conditions, context, nullable=True):
+    """ Merge the range conditions on one numeric parameter, joined by and
+
+    Returns the merged conditions, or a false constant for a contradiction.  On a
+    nullable column a contradiction is NULL rather than false for NULL values, which
+    matters once it is negated, so it is kept as the empty range instead.
+    """
+    lower = upper = None
+    equal = None
+    for condition in conditions:
+        low, high = _bounds(condition)
+        if condition.op == '==':
+            if equal is not None and float(equal.value) != low[0]:
+                return [equal, condition] if nullable else [BoolConstant(False)]
+            equal = condition
+        # keep the tighter bound; at equal values an exclusive bound is tighter
+        if low and (lower is None or low[0] > lower[0] or
+                    (low[0] == lower[0] and low[1] == '>')):
+            lower = low
+        if high and (upper is None or high[0] < upper[0] or
+                     (high[0] == upper[0] and high[1] == '<')):
+            upper = high
+
+    empty = lower and upper and (lower[0] > upper[0] or
+                                 (lower[0] == upper[0] and (lower[1] == '>' or upper[1] == '<')))
+    if empty and not nullable:
+        return [BoolConstant(False)]
+    if equal is not None and not empty:
+        return [equal]
+
+    # reuse the bind names of the merged conditions, in order
+    bindnames = [name for condition in conditions
+                 for name in (condition.bindname, getattr(condition, 'bindname2', None)) if name]
+    template = conditions[0]
+
+    def make(op, value, value2=None):
+        condition = copy.copy(template)
+        condition.op = op
+        condition.value = value
+        condition.bindname = bindnames.pop(0) if bindnames else context.reserve(template.fullname)
+        for attr in ('value2', 'bindname2'):
+            if hasattr(condition, attr):
+                delattr(condition, attr)
+        if value2 is not None:
+            condition.value2 = value2
+            if bindnames:
+                condition.bindname2 = bindnames.pop(0)
+            else:
+                condition.bindname2 = context.reserve(template.fullname)
+        return condition
+
+    raw = {}
+    for condition in conditions:
+        for bound in _bounds(condition):
+            if bound:
+                raw.setdefault(bound, condition)
+
+    def raw_value(bound):
+        condition = raw[bound]
+        if condition.op == 'between':
+            return condition.value if bound[1] == '>=' else condition.value2
+        return condition.value
+
+    if lower and upper and lower[1] == '>=' and upper[1] == '<=' and not empty:
+        return [make('between', raw_value(lower), raw_value(upper))]
+    return [make(bound[1], raw_value(bound)) for bound in (lower, upper) if bound]
+
+
+def _optimize_node(node, DataModelClass, context=None):
+    """ Return the optimized form of an expression element """
+    if isinstance(node, BoolNot):
+        condition = _optimize_node(node.condition, DataModelClass, context)
+        return _negate(condition, DataModelClass, context)
+    elif not isinstance(node, (BoolAnd, BoolOr)):
+        return node
+
+    is_and = isinstance(node, BoolAnd)
+
+    # optimize and flatten the children, keeping the function conditions of both
+    children = []
+    functions = list(getattr(node, 'fxn_conditions', []))
+    for child in node.conditions:
+        child = _optimize_node(child, DataModelClass, context)
+        if type(child) is type(node):
+            children.extend(child.conditions)
+            functions.extend(child.fxn_conditions)
+        else:
+            children.append(child)
+
+    # constant folding: a false term decides an and, a true term decides an or
+    if any(isinstance(child, BoolConstant) and child.value != is_and for child in children):
+        return BoolConstant(not is_and)
+    children = [child for child in children if not isinstance(child, BoolConstant)]
+
+    # remove duplicate terms
+    unique = OrderedDict()
+    for child in children:
+        unique.setdefault(_term_key(child), child)
+
+    # absorption: a and (a or b) -> a, a or (a and b) -> a
+    other = BoolOr if is_and else BoolAnd
+    keys = set(unique)
+    children = [child for key, child in unique.items()
+                if not (isinstance(child, other) and
+                        any(_term_key(c) in keys for c in child.conditions))]
+
+    # merge the range conditions on one numeric parameter into the tightest bounds
+    if is_and and DataModelClass is not None:
+        groups = OrderedDict()
+        for child in children:
+            if (isinstance(child, Condition) and
+                    child.op in ('<', '<=', '>', '>=', '==', 'between') and
+                    _is_numeric_field(child, DataModelClass)):
+                try:
+                    _bounds(child)
+                except ValueError:
+                    continue
+                groups.setdefault(child.fullname, []).append(child)
+        merged = []
+        for fullname, group in groups.items():
+            if len(group) < 2:
+                continue
+            replacement = _merge_ranges(group, context, _is_nullable(group[0], DataModelClass))
+            if isinstance(replacement[0], BoolConstant):
+                return replacement[0]
+            merged.append((group, replacement))
+        for group, replacement in merged:
+            index = min(children.index(c) for c in group)
+            children = [c for c in children if c not in group]
+            children[index:index] = replacement
+
+    if not is_and and context is not None:
+        _reserve_in_bindnames(children, context)
+    if functions:
+        return _node(type(node), children, functions)
+    if not children:
+        return BoolConstant(is_and)
+    if len(children) == 1:
+        return children[0]
+    return _node(type(node), children)
+
+
+def optimize(expression, DataModelClass=None):
+    """ Return an optimized copy of a parsed expression
+
+    Flattens nested and/or operators, removes duplicate terms and terms absorbed by
+    another (a and (a or b) -> a), pushes not inward with De Morgan's laws
+    (not (a<1 or b==2) -> not a<1 and not b==2), and folds constant terms.  With a
+    model, negated comparisons on non-array fields are inverted (not a<1 -> a>=1), and
+    range conditions on one numeric parameter joined by and are merged into their
+    tightest bounds, e.g. 'x>1 and x>=5 and x<=9' -> 'x between 5 and 9', and
+    contradictions such as 'x>5 and x<3' on a NOT NULL column become a false
+    condition.  Range merging needs the field types, so it only runs when
+    DataModelClass is given.
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+        DataModelClass:
+            An optional model class, list of model classes, module or ModelRegistry
+
+    Returns:
+        A new expression, with the params, uniqueparams and functions of the original
+
+    Example:
+        expression = optimize(parse_boolean_search('not not (x>1 and x>5)'), DataModel)
+        repr(expression)  # 'x>5'
+        records = DataModel.query.filter(expression.filter(DataModel))
+    """
+    if isinstance(expression, FxnCondition):
+        return expression
+    start = _clock() if _instruments else None
+
+    # reserve new bind names clear of those already in the expression
+    context = ParseContext()
+    for condition in iter_conditions(expression):
+        context.bindnames.add(condition.bindname)
+        if condition.op == 'in':
+            context.expanding.add(condition.bindname)
+        if hasattr(condition, 'bindname2'):
+            context.bindnames.add(condition.bindname2)
+        if hasattr(condition, 'in_bindname'):
+            context.bindnames.add(condition.in_bindname)
+            context.expanding.add(condition.in_bindname)
+
+    optimized = _optimize_node(copy.deepcopy(expression), DataModelClass, context)
+    optimized.params = dict(getattr(expression, 'params', {}))
+    optimized.uniqueparams = list(getattr(expression, 'uniqueparams', []))
+    optimized.functions = list(getattr(expression, 'functions', []))
+    if start is not None:
+        _emit('optimize', start, optimized)
+    return optimized
+
+
+# ***** Cost model *****
+
+def _is_indexed(field):
+    """ Returns True if a field maps to a primary key, unique or indexed column """
+    column = getattr(field, 'expression', None)
+    if not isinstance(column, sqlalchemy.Column):
+        return False
+    if column.primary_key or column.unique or column.index:
+        return True
+    table = getattr(column, 'table', None)
+    return any(index.columns.get(column.key) is not None
+               for index in getattr(table, 'indexes', ()))
+
+
+class CostModel(object):
+    """ Estimates the cost and selectivity of conditions, to order and/or terms.
+
+        A condition's cost depends on its operator, the column type and whether the
+        column is indexed.  Its selectivity, the fraction of rows it matches, is a
+        default per operator unless column statistics are given.  The terms of an and
+        are ordered cheap and selective first, the terms of an or cheap and likely
+        to match first, so sequential evaluation short-circuits as early as possible.
+
+        Parameters:
+            stats (dict):
+                Optional column statistics, keyed by parameter name as written in the
+                search or by 'tablename.column'.  Each entry is a dictionary with a
+                'distinct' count of values, used for the selectivity of equalities,
+                and/or an explicit 'selectivity' for any condition on the column.
+
+        Example:
+            model = CostModel(stats={'records.integer': {'distinct': 1000}})
+            expression = parse_boolean_search('string = abc and integer == 5')
+            expression = reorder(expression, Record, model)
+            repr(expression)  # 'and_(integer==5, string=abc)'
+            model.explain(expression, Record)
+    """
+
+    # relative evaluation costs
+    index_cost = 1.0
+    scan_cost = 4.0
+    string_factor = 2.0
+    like_prefix_cost = 3.0
+    like_contains_cost = 20.0
+
+    # default selectivities per operator
+    selectivities = {'==': 0.05, '=': 0.2, '!=': 0.95, '<': 0.3, '<=': 0.3, '>': 0.3,
+                     '>=': 0.3, 'between': 0.1, '&': 0.5, '|': 0.5, 'in': 0.1}
+
+    def __init__(self, stats=None):
+        self.stats = stats or {}
+
+    def _stats(self, condition, model, field):
+        tablename = getattr(model, '__tablename__', '')
+        for key in (condition.fullname, '{0}.{1}'.format(tablename, condition.name)):
+            if key in self.stats:
+                return self.stats[key]
+        return {}
+
+    def condition_cost(self, condition, DataModelClass):
+        ''' Return the (cost, selectivity) of a single condition '''
+        model, field = condition.resolve_field(DataModelClass)
+        is_string = _is_string_type(field.type)
+        indexed = _is_indexed(field)
+        op = condition.op
+
+        if op == '=' and is_string:
+            # LIKE; only a pattern without a leading wildcard can use an index
+            strategy = condition.match_strategy(field)
+            if strategy == 'trigram':
+                cost = self.like_prefix_cost
+            else:
+                prefix = not condition.match_value(strategy, condition.value).startswith('%')
+                # ILIKE and plain indexes on field do not help a lower(field) pattern, and
+                # vice versa
+                usable = indexed if strategy in ('prefix', 'exact') else strategy == 'lower'
+                cost = self.like_prefix_cost if prefix and usable else self.like_contains_cost
+        else:
+            # string comparisons are made on lower(field), which plain indexes do not cover
+            use_index = indexed and not is_string and op in ('==', '=', '<', '<=', '>', '>=',
+                                                             'between', 'in')
+            cost = self.index_cost if use_index else self.scan_cost
+            if is_string:
+                cost *= self.string_factor
+
+        stats = self._stats(condition, model, field)
+        selectivity = self.selectivities.get(op, 0.5)
+        if 'selectivity' in stats:
+            selectivity = stats['selectivity']
+        elif 'distinct' in stats and op in ('==', '=') and not is_string:
+            selectivity = 1.0 / max(stats['distinct'], 1)
+        elif 'distinct' in stats and op == 'in':
+            selectivity = min(1.0, len(condition.value) / float(max(stats['distinct'], 1)))
+        elif 'distinct' in stats and op == '!=':
+            selectivity = 1.0 - 1.0 / max(stats['distinct'], 1)
+        return cost, selectivity
+
+    def cost(self, node, DataModelClass):
+        ''' Return the (cost, selectivity) of an expression element, its terms in their order '''
+        if isinstance(node, Condition):
+            return self.condition_cost(node, DataModelClass)
+        elif isinstance(node, BoolNot):
+            cost, selectivity = self.cost(node.condition, DataModelClass)
+            return cost, 1.0 - selectivity
+        elif isinstance(node, (BoolAnd, BoolOr)):
+            is_and = isinstance(node, BoolAnd)
+            # each term is only evaluated for the rows the previous ones did not decide
+            total, remaining = 0.0, 1.0
+            for child in node.conditions:
+                cost, selectivity = self.cost(child, DataModelClass)
+                total += remaining * cost
+                remaining *= selectivity if is_and else 1.0 - selectivity
+            return total, remaining if is_and else 1.0 - remaining
+        elif isinstance(node, BoolConstant):
+            return 0.0, 1.0 if node.value else 0.0
+        return 0.0, 1.0
+
+    def rank(self, node, DataModelClass, conjunction=True):
+        ''' Return the sort rank of a term of an and (conjunction) or an or; lower goes first '''
+        cost, selectivity = self.cost(node, DataModelClass)
+        decided = 1.0 - selectivity if conjunction else selectivity
+        return cost / decided if decided > 0 else float('inf')
+
+    def reorder(self, node, DataModelClass):
+        ''' Reorder the and/or terms of an expression element in place, and return it '''
+        if isinstance(node, BoolNot):
+            self.reorder(node.condition, DataModelClass)
+        elif isinstance(node, (BoolAnd, BoolOr)):
+            for child in node.conditions:
+                self.reorder(child, DataModelClass)
+            conjunction = isinstance(node, BoolAnd)
+            # sorted is stable, so equally ranked terms keep their textual order
+            node.conditions = sorted(
+                node.conditions, key=lambda child: self.rank(child, DataModelClass, conjunction))
+        return node
+
+    def explain(self, expression, DataModelClass):
+        ''' Return the evaluation order of an expression, for debugging
+
+        Returns:
+            A list of (depth, element, cost, selectivity) tuples, one per element in
+            the order they are evaluated, where element is the repr of a condition or
+            the name of an operator
+        '''
+        rows = []
+
+        def walk(node, depth):
+            cost, selectivity = self.cost(node, DataModelClass)
+            if isinstance(node, (BoolAnd, BoolOr, BoolNot)):
+                rows.append((depth, type(node).__name__, cost, selectivity))
+                for child in getattr(node, 'conditions', None) or [node.condition]:
+                    walk(child, depth + 1)
+            else:
+                rows.append((depth, repr(node), cost, selectivity))
+
+        walk(expression, 0)
+        return rows
+
+
+def reorder(expression, DataModelClass, cost_model=None):
+    """ Return a copy of a parsed expression with its and/or terms ordered by estimated cost
+
+    Parameters:
+        expression:
+            A parsed, optionally optimized, expression
+        DataModelClass:
+            A model class, a list of model classes, a module or a ModelRegistry
+        cost_model (CostModel):
+            The cost model to use.  Defaults to a CostModel without statistics.
+
+    Returns:
+        A new expression, with the params, uniqueparams and functions of the original
+    """
+    cost_model = cost_model or CostModel()
+    if isinstance(expression, FxnCondition):
+        return expression
+    start = _clock() if _instruments else None
+    reordered = cost_model.reorder(copy.deepcopy(expression), DataModelClass)
+    for attr in ('params', 'uniqueparams', 'functions'):
+        if hasattr(expression, attr):
+            setattr(reordered, attr, copy.copy(getattr(expression, attr)))
+    if start is not None:
+        _emit('reorder', start, reordered)
+    return reordered
+
+
+# ***** Expression functions *****
+
+def _outer_model(DataModelClass):
+    ''' Return the searched model: the model, the first of a list, or the first registered '''
+    if isinstance(DataModelClass, JoinPlanner):
+        return DataModelClass.root
+    if isinstance(DataModelClass, ModelRegistry):
+        return DataModelClass.models[0]
+    elif inspect.ismodule(DataModelClass):
+        return _module_models(DataModelClass)[0]
+    elif isinstance(DataModelClass, list):
+        return DataModelClass[0]
+    return DataModelClass
+
+
+def count_related(condition, DataModelClass):
+    ''' Return a correlated subquery counting the related rows that match a condition
+
+    The condition is on a model related to the searched model, the first of the
+    models passed to filter(), through a foreign key.  E.g. when searching parents,
+    'npergood(records.integer > 5) >= 10' keeps the parents with at least 10
+    records whose integer is above 5.  Returns None, leaving the function condition
+    to the caller, when the condition is on the searched model itself.
+    '''
+    outer = _outer_model(DataModelClass)
+    inner, field = condition.resolve_field(DataModelClass)
+    if inner is outer:
+        return None
+    try:
+        onclause = sqlalchemy.sql.util.join_condition(outer.__table__, inner.__table__)
+    except sqlalchemy.exc.ArgumentError:
+        raise BooleanSearchException("No foreign key relates {0} to {1}.".format(
+            inner.__name__, outer.__name__))
+
+    matches = condition.filter_one(inner, field=field)
+    query = sqlalchemy.select([func.count()]).where(and_(onclause, matches))
+    query = query.correlate(outer.__table__)
+    # scalar_subquery in SQLAlchemy 1.4 and later, as_scalar before
+    return query.scalar_subquery() if hasattr(query, 'scalar_subquery') else query.as_scalar()
+
+
+# the builders of function conditions such as npergood(x > 5) >= 10, by function name;
+# each takes the inner condition and the models, and returns an SQL expression
+expression_functions = {'npergood': count_related, 'count': count_related}
+
+
+def register_function(name, builder):
+    ''' Register the builder of a function condition
+
+    Parameters:
+        name (str):
+            The function name, as written in searches
+        builder:
+            A callable taking the inner Condition and the models passed to filter(),
+            and returning an SQLAlchemy expression to compare with the value, e.g. an
+            aggregate or a correlated subquery, or None to leave the condition to the
+            caller
+
+    Example:
+        def nrelated(condition, DataModelClass):
+            return select([func.count()]).where(...).scalar_subquery()
+
+        register_function('nrelated', nrelated)
+        expression = parse_boolean_search('nrelated(child.x > 5) >= 2')
+        DataModel.query.filter(expression.filter([DataModel, Child]))
+    '''
+    expression_functions[name] = builder
+
+
+# ***** In-memory evaluation *****
+
+_missing = object()
+_numeric_types = (int, float, decimal.Decimal)
+_comparisons = {'<': lt, '<=': le, '>': gt, '>=': ge, '==': eq, '!=': ne}
+
+
+def _lookup(row, key):
+    """ Return a field of a dict-like row or an object, or _missing """
+    if hasattr(row, 'keys') and hasattr(row, '__getitem__'):
+        return row[key] if key in row else _missing
+    return getattr(row, key, _missing)
+
+
+def _row_getter(fullname):
+    """ Return a function reading a parameter from an in-memory row
+
+    A 'parent.name' parameter is read as a 'parent.name' key, then as the name of
+    the parent, and a table-prefixed 'records.name' as the row's name.
+    """
+    path = fullname.split('.')
+    name = path[-1]
+
+    def get(row):
+        value = _lookup(row, fullname) if len(path) > 1 else _missing
+        if value is _missing:
+            value = row
+            for key in path:
+                value = _lookup(value, key) if value is not None else None
+                if value is _missing:
+                    break
+        if value is _missing and len(path) > 1:
+            value = _lookup(row, name)
+        if value is _missing:
+            raise BooleanSearchException("Row {0} does not have a field named '{1}'.".format(
+                repr(row), fullname))
+        return value
+    return get
+
+
+def _lower(value):
+    """ Return a row value as a lower case string """
+    return value.lower() if isinstance(value, str) else str(value).lower()
+
+
+def _like_regex(pattern):
+    """ Return a case insensitive regular expression for a LIKE pattern """
+    regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.compile(regex + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+class _RowValue(object):
+    """ A condition value, converted to the type of the row values it is compared with """
+
+    def __init__(self, condition, value):
+        self.condition = condition
+        self.value = value
+        self.lower = value.lower()
+        self._number = _missing
+
+    def number(self):
+        if self._number is _missing:
+            try:
+                self._number = int(self.value)
+            except ValueError:
+                try:
+                    self._number = float(self.value)
+                except ValueError:
+                    raise BooleanSearchException(
+                        "Field {0} expects a numeric value. Received value {1} "
+                        "instead.".format(self.condition.name, self.value))
+        return self._number
+
+    def coerce(self, row_value):
+        """ Return the value as a number for numeric row values, or as a lower case string """
+        return self.number() if isinstance(row_value, _numeric_types) else self.lower
+
+    @staticmethod
+    def row(row_value):
+        """ Return a row value in the form compared with coerce """
+        return row_value if isinstance(row_value, _numeric_types) else _lower(row_value)
+
+
+def _combine_predicates(operator, is_and):
+    """ Return the predicate of an and/or operator, with SQL's three-valued logic """
+    predicates = [condition.predicate() for condition in operator.conditions]
+    predicates = [predicate for predicate in predicates if predicate is not None]
+    decided = not is_and
+
+    def combine(row):
+        unknown = False
+        for predicate in predicates:
+            result = predicate(row)
+            if result is None:
+                unknown = True
+            elif result == decided:
+                # short-circuit: a false term decides an and, a true term an or
+                return decided
+        return None if unknown else not decided
+    return combine
+
+
+def compile_predicate(expression):
+    """ Compile a parsed expression into a Python predicate over in-memory rows
+
+    The expression is compiled once into closures, which read the parameters of a
+    row from dict keys, namedtuple fields or object attributes, e.g. ORM instances.
+    Comparisons follow the SQL of filter(): numbers compare as numbers, strings
+    case insensitively, '=' on strings is a LIKE match, between is inclusive and
+    'a & 4' is true when the bitwise and is positive.  A condition on a None value
+    is unknown, and only rows the expression is true for match.  Function
+    conditions, e.g. cones, are not evaluated.
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+
+    Returns:
+        A function taking a row and returning True or False
+
+    Example:
+        matches = compile_predicate(parse_boolean_search('a < 5 and name = x*'))
+        matches({'a': 3, 'name': 'Xylophone'})  # True
+    """
+    predicate = expression.predicate()
+    if predicate is None:
+        return lambda row: True
+    return lambda row: predicate(row) is True
+
+
+def filter_rows(expression, rows):
+    """ Lazily yield the in-memory rows matching a parsed expression
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+        rows:
+            An iterable of dicts, namedtuples or objects
+
+    Returns:
+        A generator of the matching rows, in order
+
+    Example:
+        for row in filter_rows(parse_boolean_search('a between 1 and 5'), rows):
+            ...
+    """
+    matches = compile_predicate(expression)
+    for row in rows:
+        if matches(row):
+            yield row
+
+
+# ***** Vectorized evaluation *****
+
+def _numpy():
+    """ Import numpy, which the vectorized evaluation needs, on first use """
+    try:
+        import numpy
+    except ImportError:
+        raise BooleanSearchException("Vectorized evaluation needs numpy. Install it with "
+                                     "'pip install numpy'.")
+    return numpy
+
+
+class _Columns(object):
+    """ Column access to a NumPy structured array, a pandas DataFrame or a dict of arrays """
+
+    def __init__(self, data, tablename=None):
+        np = _numpy()
+        self.data = data
+        self.tablename = tablename
+        if getattr(getattr(data, 'dtype', None), 'names', None):
+            self.names = set(data.dtype.names)
+        else:
+            self.names = set(data.keys())
+        self._cache = {}
+        first = next(iter(self.names)) if self.names else None
+        self.length = len(np.asarray(data[first])) if first is not None else 0
+
+    def resolve(self, fullname):
+        """ Return the column name of a parameter name, as get_field resolves fields """
+        if fullname in self.names:
+            return fullname
+        if '.' in fullname:
+            basename, name = fullname.split('.', 1)
+            if self.tablename is None or basename in self.tablename:
+                if name in self.names:
+                    return name
+        raise BooleanSearchException("The data does not have a column named "
+                                     "'{0}'.".format(fullname))
+
+    def __getitem__(self, fullname):
+        if fullname not in self._cache:
+            self._cache[fullname] = _numpy().asarray(self.data[self.resolve(fullname)])
+        return self._cache[fullname]
+
+
+def _column_value(condition, column, value):
+    """ Convert a condition value to the type of a numeric column, as format_value does """
+    try:
+        return int(value) if column.dtype.kind in 'iub' else float(value)
+    except ValueError:
+        kind = 'an integer' if column.dtype.kind in 'iub' else 'a float'
+        raise BooleanSearchException(
+            "Field {0} expects {1} value. Received value {2} instead.".format(
+                condition.name, kind, value))
+
+
+def _like_mask(np, strings, pattern):
+    """ Return the mask of a lower case string array matching a lower case LIKE pattern """
+    inner = pattern.strip('%')
+    if '_' not in pattern and '%' not in inner:
+        # the common contains, starts-with, ends-with and equality patterns
+        if pattern.startswith('%') and pattern.endswith('%') and len(pattern) > 1:
+            return np.char.find(strings, inner) >= 0
+        elif pattern.endswith('%'):
+            return np.char.startswith(strings, inner)
+        elif pattern.startswith('%'):
+            return np.char.endswith(strings, inner)
+        return strings == inner
+    regex = _like_regex(pattern)
+    return np.frompyfunc(lambda v: regex.match(v) is not None, 1, 1)(strings).astype(bool)
+
+
+def _condition_mask(np, condition, columns):
+    """ Return the (true, false) masks of a condition; both are false for null values """
+    column = columns[condition.fullname]
+    op = condition.op
+
+    if column.dtype.kind in 'iubf':
+        unknown = np.isnan(column) if column.dtype.kind == 'f' else None
+        if op == 'in':
+            value = [_column_value(condition, column, item) for item in condition.value]
+        elif op in ('&', '|'):
+            # bitwise operands are integers, also on float columns of integers with NaN nulls
+            try:
+                value = int(condition.value)
+            except ValueError:
+                raise BooleanSearchException(
+                    "Field {0} expects an integer value. Received value {1} "
+                    "instead.".format(condition.name, condition.value))
+            column = np.where(unknown, 0, column) if unknown is not None else column
+        else:
+            value = _column_value(condition, column, condition.value)
+        if op == 'in':
+            true = np.isin(column, value)
+        elif op in ('==', '='):
+            true = column == value
+        elif op in _comparisons:
+            true = _comparisons[op](column, value)
+        elif op == 'between':
+            value2 = _column_value(condition, column, condition.value2)
+            true = (column >= value) & (column <= value2)
+        elif op == '&':
+            true = (column.astype(np.int64) & value) > 0
+        else:
+            true = (column.astype(np.int64) | value) > 0
+    else:
+        # strings compare case insensitively; None and NaN are nulls
+        unknown = None
+        if column.dtype.kind == 'O':
+            unknown = np.frompyfunc(lambda v: v is None or v != v, 1, 1)(column).astype(bool)
+            if not unknown.any():
+                unknown = None
+        strings = np.char.lower(column.astype(str))
+        if op == 'in':
+            true = np.isin(strings, [item.lower() for item in condition.value])
+        elif op == '=':
+            true = _like_mask(np, strings, condition.like_pattern(condition.value).lower())
+        elif op in _comparisons:
+            true = _comparisons[op](strings, condition.value.lower())
+        elif op == 'between':
+            true = (strings >= condition.value.lower()) & (strings <= condition.value2.lower())
+        else:
+            raise BooleanSearchException(
+                "Field {0} does not support the bitwise operator '{1}' on "
+                "strings.".format(condition.name, op))
+
+    if unknown is None:
+        return true, ~true
+    return true & ~unknown, ~true & ~unknown
+
+
+def _masks(np, node, columns):
+    """ Return the (true, false) masks of an expression element, or None for functions
+
+    Rows in neither mask are unknown, following SQL's three-valued logic.
+    """
+    if isinstance(node, Condition):
+        return _condition_mask(np, node, columns)
+    elif isinstance(node, BoolNot):
+        masks = _masks(np, node.condition, columns)
+        return None if masks is None else (masks[1], masks[0])
+    elif isinstance(node, BoolConstant):
+        return np.full(columns.length, node.value), np.full(columns.length, not node.value)
+    elif not isinstance(node, (BoolAnd, BoolOr)):
+        return None
+
+    is_and = isinstance(node, BoolAnd)
+    # an and is true if all its terms are, false if any is; the reverse for an or
+    true = np.full(columns.length, is_and)
+    false = np.full(columns.length, not is_and)
+    for child in node.conditions:
+        masks = _masks(np, child, columns)
+        if masks is None:
+            continue
+        if is_and:
+            true &= masks[0]
+            false |= masks[1]
+            decided = false
+        else:
+            true |= masks[0]
+            false &= masks[1]
+            decided = true
+        # short-circuit once every row is decided
+        if decided.all():
+            break
+    return true, false
+
+
+def evaluate_mask(expression, data, index=False, tablename=None):
+    """ Evaluate a parsed expression over columns of data, with NumPy mask operations
+
+    The expression is evaluated one column operation at a time, rather than row by
+    row, following the SQL of filter(): numeric columns compare as numbers, string
+    columns case insensitively, '=' on strings is a LIKE match, and NaN or None
+    values are nulls, for which a condition is unknown.  The and/or terms stop
+    being evaluated once every row is decided.  Function conditions, e.g. cones,
+    are not evaluated.  Needs numpy.
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+        data:
+            A NumPy structured array, a pandas DataFrame or a dictionary of arrays
+        index (bool):
+            If True, return the indices of the matching rows instead of a mask
+        tablename (str):
+            The table name of the data.  As with get_field, a 'table.name' parameter
+            maps to the 'name' column if table is part of the table name; without a
+            table name, any table prefix does.
+
+    Returns:
+        A boolean mask, or an index array, of the matching rows
+
+    Example:
+        data = numpy.array([(1, 'abc'), (5, 'xyz')], dtype=[('a', int), ('name', 'U10')])
+        evaluate_mask(parse_boolean_search('a > 2 or name = b*'), data)  # array([False,  True])
+    """
+    np = _numpy()
+    columns = _Columns(data, tablename=tablename)
+    masks = _masks(np, expression, columns)
+    mask = np.ones(columns.length, dtype=bool) if masks is None else masks[0]
+    return np.flatnonzero(mask) if index else mask
+
+
+# ***** Histograms *****
+
+Histogram = namedtuple('Histogram', ['parameters', 'counts', 'edges'])
+
+
+def histogram(query, expression, DataModelClass):
+    ''' Count the rows matching an expression in the bins of its hist() function, in the database
+
+    The rows matching the rest of the expression are binned and counted with one
+    GROUP BY query, so only the non-empty bins are transferred.  Values outside the
+    edges, and the upper edge itself, are not counted.
+
+    Parameters:
+        query:
+            The SQLAlchemy query to count, e.g. DataModel.query
+        expression:
+            A parsed expression containing a hist(name, ..., n_bins, low, high) function
+        DataModelClass:
+            A model class, a list of model classes, a module or a ModelRegistry
+
+    Returns:
+        A Histogram namedtuple of the parameter names, the counts as a list with one
+        dimension per parameter, and the bin edges
+
+    Example:
+        expression = parse_boolean_search('float < 100 and hist(integer, 10, 0, 50)')
+        result = histogram(DataModel.query, expression, DataModel)
+        result.counts  # [3, 0, 5, ...]
+    '''
+    if isinstance(expression, HistCondition):
+        hist = expression
+    else:
+        hists = [f for f in getattr(expression, 'functions', []) if isinstance(f, HistCondition)]
+        if not hists:
+            raise BooleanSearchException("The expression {0} has no hist() "
+                                         "function.".format(repr(expression)))
+        hist = hists[0]
+        clause = expression.filter(DataModelClass)
+        if clause is not None:
+            query = query.filter(clause)
+
+    n_bins, low, high = hist.bins()
+    fields = [resolve_field(DataModelClass, name)[1] for name in hist.parameters]
+    dialect_name = query.session.get_bind().dialect.name
+    buckets = [hist.bucket(field, dialect_name).label('bucket_{0}'.format(i))
+               for i, field in enumerate(fields)]
+    query = query.filter(*[and_(field >= low, field < high) for field in fields])
+    query = query.with_entities(*(buckets + [func.count()])).group_by(*buckets)
+
+    def zeros(depth):
+        return [zeros(depth - 1) if depth > 1 else 0 for __ in range(n_bins)]
+
+    counts = zeros(len(fields))
+    for row in query:
+        bins, count = row[:-1], row[-1]
+        # guard against rounding at the upper edge
+        bins = [min(max(int(b), 0), n_bins - 1) for b in bins]
+        target = counts
+        for b in bins[:-1]:
+            target = target[b]
+        target[bins[-1]] += count
+    return Histogram(list(hist.parameters), counts, hist.edges())
+
+
 # ***** Define the boolean condition expressions *****
 
-# Define expression elements
-LPAR = pp.Suppress('(')
-RPAR = pp.Suppress(')')
-number = pp.Regex(r"[+-~]?\d+(:?\.\d*)?(:?[eE][+-]?\d+)?")
-name = pp.Word(pp.alphas + '._', pp.alphanums + '._').setResultsName('parameter')
-#operator = pp.Regex("==|!=|<=|>=|<|>|=|&|~|||").setResultsName('operator')
-operator = pp.oneOf(['==', '<=', '<', '>', '>=', '=', '!=', '&', '|']).setResultsName('operator')
-value = (pp.Word(pp.alphanums + '-_.*') | pp.QuotedString('"') | number).setResultsName('value')
-
-# list of numbers
-nl = pp.delimitedList(number, combine=True)
-narr = pp.Combine('[' + nl + ']')
-
-# function arguments
-arglist = pp.delimitedList(number | (pp.Word(pp.alphanums + '-_') + pp.NotAny('=')) | narr)
-args = pp.Group(arglist).setResultsName('args')
-# function keyword arguments
-key = pp.Word(pp.alphas) + pp.Suppress('=')
-values = (number | pp.Word(pp.alphas))
-keyval = pp.dictOf(key, values)
-kwarglist = pp.delimitedList(keyval)
-kwargs = pp.Group(kwarglist).setResultsName('kwargs')
-# build generic function
-fxn_args = pp.Optional(args) + pp.Optional(kwargs)
-fxn_name = (pp.Word(pp.alphas)).setResultsName('fxn')
-fxn = pp.Group(fxn_name + LPAR + fxn_args + RPAR)
-
-# overall (recursvie) where clause
-whereexp = pp.Forward()
-
-# condition
-condition = pp.Group(name + operator + value).setResultsName('condition')
-condition.setParseAction(Condition)
-
-# between condition
-between_cond = pp.Group(name + pp.CaselessLiteral('between').setResultsName('operator') +
-                        value.setResultsName('value1') + pp.CaselessLiteral('and') +
-                        value.setResultsName('value2'))
-between_cond.setParseAction(Condition)
-
-# fxn expression condition
-function_call = pp.Group(fxn_name + LPAR + condition + RPAR).setResultsName('call')
-fxn_cond = pp.Group(function_call + operator + value)
-fxn_cond.setParseAction(ExprCondition)
-
-# cone fxn conditions
-cone_cond = copy.copy(fxn)
-cone_cond.setParseAction(ConeCondition)
-
-# histogram fxn conditions
-hist_cond = copy.copy(fxn)
-hist_cond.setParseAction(HistCondition)
-
-# combine all conditions together
-wherecond = condition | fxn_cond | between_cond | cone_cond | hist_cond
-whereexp <<= wherecond
-
-# Define the expression as a hierarchy of boolean operators
-# with the following precedence: NOT > AND > OR
-expression_parser = pp.infixNotation(whereexp, [
-    (pp.CaselessLiteral("not"), 1, pp.opAssoc.RIGHT, BoolNot),
-    (pp.CaselessLiteral("and"), 2, pp.opAssoc.LEFT, BoolAnd),
-    (pp.CaselessLiteral("or"), 2, pp.opAssoc.LEFT, BoolOr),
-])
-
-params = {}
-uniqueparams = []
-functions = []
-
-
-def parse_boolean_search(boolean_search):
-    """ Parses the boolean search expression into a hierarchy of boolean operators.
-        Returns a BoolNot or BoolAnd or BoolOr object.
+# The grammars are built on first use, see _grammar, so importing this module does not
+# import pyparsing or construct the parsers.  The grammar elements, e.g.
+# expression_parser, remain available as module attributes.
+
+def _build_grammar():
+    ''' Build the pyparsing grammar of boolean search expressions
+
+    Returns:
+        A dictionary of the grammar elements by name
+    '''
+    import pyparsing as pp
+
+    # Define expression elements
+    LPAR = pp.Suppress('(')
+    RPAR = pp.Suppress(')')
+    number = pp.Regex(r"[+-~]?\d+(:?\.\d*)?(:?[eE][+-]?\d+)?")
+    name = pp.Word(pp.alphas + '._', pp.alphanums + '._').setResultsName('parameter')
+    #operator = pp.Regex("==|!=|<=|>=|<|>|=|&|~|||").setResultsName('operator')
+    operator = pp.oneOf(['==', '<=', '<', '>', '>=', '=', '!=', '&', '|'])
+    operator = operator.setResultsName('operator')
+    value = pp.Word(pp.alphanums + '-_.*') | pp.QuotedString('"') | number
+    value = value.setResultsName('value')
+    # list of values, e.g. [a, "b c", 1]
+    list_value = pp.Word(pp.alphanums + '-_.*') | pp.QuotedString('"') | number
+    value_list = (pp.Suppress('[') +
+                  pp.Group(pp.delimitedList(list_value)).setResultsName('value') +
+                  pp.Suppress(']'))
+
+    # list of numbers
+    nl = pp.delimitedList(number, combine=True)
+    narr = pp.Combine('[' + nl + ']')
+
+    # function arguments
+    arglist = pp.delimitedList(number | (pp.Word(pp.alphanums + '-_') + pp.NotAny('=')) | narr)
+    args = pp.Group(arglist).setResultsName('args')
+    # function keyword arguments
+    key = pp.Word(pp.alphas) + pp.Suppress('=')
+    values = (number | pp.Word(pp.alphas))
+    keyval = pp.dictOf(key, values)
+    kwarglist = pp.delimitedList(keyval)
+    kwargs = pp.Group(kwarglist).setResultsName('kwargs')
+    # build generic function
+    fxn_args = pp.Optional(args) + pp.Optional(kwargs)
+    fxn_name = (pp.Word(pp.alphas)).setResultsName('fxn')
+    fxn = pp.Group(fxn_name + LPAR + fxn_args + RPAR)
+
+    # overall (recursvie) where clause
+    whereexp = pp.Forward()
+
+    # condition
+    condition = pp.Group(name + operator + value).setResultsName('condition')
+    condition.setParseAction(Condition)
+
+    # between condition
+    between_cond = pp.Group(name + pp.CaselessLiteral('between').setResultsName('operator') +
+                            value.setResultsName('value1') + pp.CaselessLiteral('and') +
+                            value.setResultsName('value2'))
+    between_cond.setParseAction(Condition)
+
+    # in condition
+    in_cond = pp.Group(name + pp.CaselessKeyword('in').setResultsName('operator') + value_list)
+    in_cond.setParseAction(Condition)
+
+    # fxn expression condition
+    function_call = pp.Group(fxn_name + LPAR + condition + RPAR).setResultsName('call')
+    fxn_cond = pp.Group(function_call + operator + value)
+    fxn_cond.setParseAction(ExprCondition)
+
+    # cone fxn conditions; the parse action dispatches on the function name, so this
+    # also matches hist() and other functions
+    cone_cond = copy.copy(fxn)
+    cone_cond.setParseAction(_function_condition)
+
+    # combine all conditions together
+    wherecond = condition | fxn_cond | between_cond | in_cond | cone_cond
+    whereexp <<= wherecond
+
+    # Define the expression as a hierarchy of boolean operators
+    # with the following precedence: NOT > AND > OR
+    boolean_expression = pp.infixNotation(whereexp, [
+        (pp.CaselessLiteral("not"), 1, pp.opAssoc.RIGHT, BoolNot),
+        (pp.CaselessLiteral("and"), 2, pp.opAssoc.LEFT, BoolAnd),
+        (pp.CaselessLiteral("or"), 2, pp.opAssoc.LEFT, BoolOr),
+    ])
+
+    # When used directly, outside of parse_boolean_search, each parse of the grammar
+    # collects its params into a fresh per-thread context attached to the expression
+    expression_parser = pp.Empty().setParseAction(ParseContext._begin_parse) + boolean_expression
+    expression_parser.setParseAction(ParseContext._end_parse)
+
+    grammar = dict(locals())
+    del grammar['pp']
+    return grammar
+
+
+# ***** Model registry *****
+
+def _searchable_field(DataModelClass, field_name, base_name=None):
+    ''' Returns the field if it can be used in a condition (has a type and ilike), else None '''
+    field = get_field(DataModelClass, field_name, base_name=base_name)
+    try:
+        if field is not None and field.type is not None and field.ilike:
+            return field
+    except AttributeError:
+        pass
+    return None
+
+
+def _module_models(module):
+    ''' Returns the model classes (classes with a __tablename__) defined in a module '''
+    return [i[1] for i in inspect.getmembers(module, inspect.isclass)
+            if hasattr(i[1], '__tablename__')]
+
+
+class ModelRegistry(object):
+    """ An index from parameter names to the model fields they resolve to.
+
+        Build a registry once from a module or a list of model classes and pass it to
+        ``filter()`` in place of the module or list.  Flat names ('name') and
+        'tablename.name' forms are indexed up front, so resolving a condition is a
+        dictionary lookup instead of a scan over every model.  An exact table name
+        takes precedence over a partial one, so 'parents.name' never resolves to the
+        'grandparents' table.  Other names, e.g. with a partial table name, are
+        resolved on first use with the same rules as ``filter()`` on a list of
+        models, and remembered.
+
+        Parameters:
+            models (module or list):
+                A module containing the model classes, or a list of model classes.
+                Models earlier in the list take precedence for shared field names.
+
+        Example:
+            registry = ModelRegistry(app.models)
+            records = DataModel.query.filter(parsed_expression.filter(registry))
+    """
+
+    def __init__(self, models):
+        self.models = _module_models(models) if inspect.ismodule(models) else list(models)
+        self._fields = {}
+        for model in self.models:
+            self._index_model(model)
+
+    def _index_model(self, model):
+        ''' Index the mapped attributes of a model '''
+        mapper = sqlalchemy.inspect(model, raiseerr=False)
+        if mapper is None or not hasattr(mapper, 'all_orm_descriptors'):
+            return
+        tablename = getattr(model, '__tablename__', None)
+        for name in mapper.all_orm_descriptors.keys():
+            if name.startswith('__'):
+                continue
+            field = _searchable_field(model, name)
+            if field is None:
+                continue
+            self._fields.setdefault((None, name), (model, field))
+            if tablename:
+                self._fields.setdefault((tablename, name), (model, field))
+
+    def resolve(self, name, basename=None):
+        ''' Return the (model, field) a parameter name resolves to, or None
+
+        Parameters:
+            name (str): The field name
+            basename (str): The table part of a 'table.name' parameter, if any
+
+        Returns:
+            A tuple of the model class and its field, or None if no model has the field
+        '''
+        key = (basename, name)
+        try:
+            return self._fields[key]
+        except KeyError:
+            pass
+
+        resolved = None
+        for model in self.models:
+            field = _searchable_field(model, name, base_name=basename)
+            if field is not None:
+                resolved = (model, field)
+                break
+        self._fields[key] = resolved
+        return resolved
+
+    def __contains__(self, fullname):
+        basename, name = fullname.split('.', 1) if '.' in fullname else (None, fullname)
+        return self.resolve(name, basename=basename) is not None
+
+    def __repr__(self):
+        return '<ModelRegistry ({0} models)>'.format(len(self.models))
+
+
+# ***** Join planning *****
+
+class JoinPlanner(object):
+    """ Resolves dotted relationship paths from a root model, and collects the joins they need.
+
+        A parameter name such as 'parent.grandparent.name' is resolved by following the
+        relationships 'parent' and then 'grandparent' from the root model.  Each distinct
+        relationship path is joined once, whatever the number of conditions using it,
+        and a model reached a second time, e.g. through a self-referential relationship,
+        is joined as an alias.  Names whose first part is not a relationship of the root
+        model are resolved as by ``filter()``, on the root model or on models.
+
+        The planner is passed to ``filter()`` in place of a model; see plan_joins.
+
+        Parameters:
+            root:
+                The model class being searched
+            models:
+                The model class, list of model classes, module or ModelRegistry used to
+                resolve names that are not relationship paths.  Defaults to the root model.
+    """
+
+    def __init__(self, root, models=None):
+        self.root = root
+        self.models = root if models is None else models
+        self.joins = []
+        self._entities = {(): root}
+        self._joined = set([root])
+
+    def entity(self, path):
+        ''' Return the model or alias a tuple of relationship names leads to, or None '''
+        if path in self._entities:
+            return self._entities[path]
+        parent = self.entity(path[:-1])
+        if parent is None:
+            return None
+        relationship = sqlalchemy.inspect(parent).mapper.relationships.get(path[-1])
+        if relationship is None:
+            return None
+
+        target = relationship.mapper.class_
+        attribute = getattr(parent, path[-1])
+        if target in self._joined:
+            from sqlalchemy.orm import aliased
+            target = aliased(target)
+            attribute = attribute.of_type(target)
+        else:
+            self._joined.add(target)
+        self.joins.append(attribute)
+        self._entities[path] = target
+        return target
+
+    def resolve(self, fullname):
+        ''' Return the model or alias and the field a parameter name refers to
+
+        Parameters:
+            fullname (str): The parameter name, e.g. 'parent.grandparent.name'
+
+        Returns:
+            A tuple of the model class or alias and its field
+        '''
+        path = tuple(fullname.split('.'))
+        entity = self.entity(path[:-1]) if len(path) > 1 else None
+        if entity is None:
+            return resolve_field(self.models, fullname)
+
+        field = _searchable_field(entity, path[-1])
+        if field is None:
+            table_name = sqlalchemy.inspect(entity).mapper.local_table.name
+            raise BooleanSearchException(
+                "Table '%(table_name)s' does not have a field named '%(field_name)s'."
+                % dict(table_name=table_name, field_name=path[-1]))
+        return entity, field
+
+    def __repr__(self):
+        return '<JoinPlanner ({0}, {1} joins)>'.format(self.root.__name__, len(self.joins))
+
+
+class JoinPlan(namedtuple('JoinPlan', ['filter', 'joins', 'outer'])):
+    """ The filter of an expression and the relationship joins it needs, from plan_joins
+    """
+
+    def apply(self, query):
+        ''' Return a query with the joins and the filter applied '''
+        for join in self.joins:
+            query = query.outerjoin(join) if self.outer else query.join(join)
+        return query.filter(self.filter)
+
+
+def plan_joins(expression, DataModelClass, models=None, outer=False):
+    """ Return the filter of an expression and the minimal joins for its relationship paths
+
+    Parameter names such as 'parent.name' or 'parent.grandparent.name' are resolved
+    by walking the relationships of DataModelClass.  Each relationship path is joined
+    once, however many conditions use it.
+
+    Parameters:
+        expression:
+            A parsed expression from parse_boolean_search
+        DataModelClass:
+            The model class being searched
+        models:
+            An optional model class, list of model classes, module or ModelRegistry
+            for names that are not relationship paths.  Defaults to DataModelClass.
+        outer (bool):
+            Use outer joins, e.g. so rows without a related row can match an or
+
+    Returns:
+        A JoinPlan of the filter clause, the list of relationship attributes to join,
+        in order, and the outer flag
+
+    Example:
+        expression = parse_boolean_search('parent.name == a and parent.grandparent.name == b')
+        plan = plan_joins(expression, Record)
+        records = plan.apply(Record.query).all()
+    """
+    planner = JoinPlanner(DataModelClass, models=models)
+    clause = expression.filter(planner)
+    return JoinPlan(clause, list(planner.joins), outer)
+
+
+# ***** Define the fast boolean grammar *****
+
+# A left-factored grammar where each condition is matched by reading its name once
+# and then a single operator, between or function-call tail, and where the boolean
+# operators are plain precedence levels instead of infixNotation.  Its parse actions
+# only produce plain (kind, data) tokens; the expression elements are built after
+# parsing, so the tokens may safely be shared by pyparsing's packrat cache.  Unlike
+# the pyparsing grammar, whose boolean operators are caseless literals, and, or and
+# not only match whole words, so a name such as 'nothing' is not read as 'not hing'.
+
+def _where_token(instring, loc, tokens):
+    ''' Convert a matched condition or function into a plain (kind, data) token '''
+    parameter = tokens['parameter']
+    if 'value1' in tokens:
+        return [('cond', {'parameter': parameter, 'operator': 'between',
+                          'value1': tokens['value1'], 'value2': tokens['value2']})]
+    elif tokens.get('operator', '').lower() == 'in':
+        return [('cond', {'parameter': parameter, 'operator': 'in',
+                          'value': tokens['value'].asList()})]
+    elif 'operator' in tokens and 'condition' not in tokens:
+        return [('cond', {'parameter': parameter, 'operator': tokens['operator'],
+                          'value': tokens['value']})]
+
+    # function names are plain words, unlike parameter names
+    if not parameter.isalpha():
+        import pyparsing as pp
+        raise pp.ParseException(instring, loc, 'Expected a function name')
+    if 'condition' in tokens:
+        inner = tokens['condition'].asDict()
+        return [('expr', {'call': {'fxn': parameter, 'condition': inner},
+                          'operator': tokens['operator'], 'value': tokens['value']})]
+    data = {'fxn': parameter}
+    if 'args' in tokens:
+        data['args'] = tokens['args'].asList()
+    if 'kwargs' in tokens:
+        data['kwargs'] = tokens['kwargs'].asDict()
+    return [('fxn', data)]
+
+
+def _build_fast_grammar(grammar):
+    ''' Build the fast grammar from the elements of the pyparsing grammar
+
+    Returns:
+        A dictionary of the grammar elements by name
+    '''
+    import pyparsing as pp
+
+    name, operator = grammar['name'], grammar['operator']
+    value, value_list = grammar['value'], grammar['value_list']
+    LPAR, RPAR, fxn_args = grammar['LPAR'], grammar['RPAR'], grammar['fxn_args']
+
+    AND = pp.CaselessKeyword('and').suppress()
+    OR = pp.CaselessKeyword('or').suppress()
+    NOT = pp.CaselessKeyword('not').suppress()
+
+    cond_tail = operator + value
+    between_tail = (pp.CaselessKeyword('between').setResultsName('operator') +
+                    value.setResultsName('value1') + AND + value.setResultsName('value2'))
+    call_tail = (LPAR + pp.Group(name + operator + value).setResultsName('condition') + RPAR +
+                 operator + value)
+    in_tail = pp.CaselessKeyword('in').setResultsName('operator') + value_list
+    fxn_tail = LPAR + fxn_args + RPAR
+
+    fast_wherecond = name + (cond_tail | between_tail | in_tail | call_tail | fxn_tail)
+    fast_wherecond.setParseAction(_where_token)
+
+    fast_expression = pp.Forward()
+    fast_operand = fast_wherecond | LPAR + fast_expression + RPAR
+    fast_not = pp.Forward()
+    fast_not <<= ((NOT + fast_not).setParseAction(lambda tokens: [('not', (tokens[0],))]) |
+                  fast_operand)
+    fast_and = fast_not + pp.ZeroOrMore(AND + fast_not)
+    fast_and.setParseAction(lambda tokens: [('and', tuple(tokens))] if len(tokens) > 1 else None)
+    fast_or = fast_and + pp.ZeroOrMore(OR + fast_and)
+    fast_or.setParseAction(lambda tokens: [('or', tuple(tokens))] if len(tokens) > 1 else None)
+    fast_expression <<= fast_or
+    fast_expression_parser = fast_expression
+
+    fast_grammar = dict(locals())
+    for element in ('pp', 'grammar', 'name', 'operator', 'value', 'value_list', 'LPAR', 'RPAR',
+                    'fxn_args'):
+        del fast_grammar[element]
+    return fast_grammar
+
+
+def _build_expression(token):
+    ''' Build the expression elements from a plain token of the fast grammar '''
+    kind, data = token
+    if kind == 'cond':
+        return Condition([data])
+    elif kind == 'expr':
+        call = dict(data['call'], condition=Condition([data['call']['condition']]))
+        return ExprCondition([dict(data, call=call)])
+    elif kind == 'fxn':
+        return _function_condition([data])
+
+    conditions = [_build_expression(child) for child in data]
+    if kind == 'not':
+        return BoolNot([['not'] + conditions])
+    elif kind == 'and':
+        return BoolAnd([conditions])
+    else:
+        return BoolOr([conditions])
+
+
+# ***** Define the hand-written Pratt parser *****
+
+# A tokenizer and Pratt (top-down operator precedence) parser for the same grammar,
+# which does not use pyparsing at all.  The tokens are scanned on demand, since what
+# may follow depends on the position: a parameter name, an operator, a value or a
+# function argument.  The boolean operators bind with the precedence NOT > AND > OR.
+
+_name_re = re.compile(r'[A-Za-z._][A-Za-z0-9._]*')
+_fxn_name_re = re.compile(r'[A-Za-z]+')
+_operator_re = re.compile(r'==|!=|<=|>=|<|>|=|&|\|')
+_word_re = re.compile(r'[A-Za-z0-9\-_.*]+')
+_quoted_re = re.compile(r'"([^"\n\r]*)"')
+_number_re = re.compile(r'[+-~]?\d+(:?\.\d*)?(:?[eE][+-]?\d+)?')
+_arg_word_re = re.compile(r'[A-Za-z0-9\-_]+')
+_number_list_re = re.compile(r'\[\s*{0}(?:\s*,\s*{0})*\s*\]'.format(_number_re.pattern))
+_keyword_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$')
+_binding_powers = {'or': 1, 'and': 2, 'not': 3}
+
+
+class _PrattSyntaxError(Exception):
+    ''' Raised at the position where the Pratt parser cannot continue '''
+    def __init__(self, loc):
+        super(_PrattSyntaxError, self).__init__(loc)
+        self.loc = loc
+
+
+class PrattParser(object):
+    """ Parses a boolean search with a hand-written tokenizer and Pratt parser.
+
+        Builds the same Condition, ExprCondition, ConeCondition, BoolNot, BoolAnd
+        and BoolOr elements as the pyparsing grammar, registering them with the
+        active ParseContext.  Like the pyparsing grammar, any text after the
+        longest valid expression is ignored.  Like the fast grammar, and unlike the
+        pyparsing one, the keywords only match whole words: 'nothing==1' is a
+        condition on 'nothing', and in 'a==1 andb==2' the text from 'andb' on is
+        ignored.
+
+        Parameters:
+            boolean_search (str):
+                The boolean search expression
+    """
+
+    def __init__(self, boolean_search):
+        self.text = boolean_search
+        self.pos = 0
+        self.furthest = 0
+
+    # --- tokenizer ---
+
+    def _skip(self):
+        ''' Skip whitespace and return the current position '''
+        source, pos = self.text, self.pos
+        while pos < len(source) and source[pos].isspace():
+            pos += 1
+        self.pos = pos
+        return pos
+
+    def _match(self, regex):
+        ''' Consume and return the match of a regex at the current position, or None '''
+        match = regex.match(self.text, self._skip())
+        if match is None:
+            return None
+        self.pos = match.end()
+        return match
+
+    def _literal(self, literal):
+        ''' Consume a literal character sequence if it is next '''
+        if self.text.startswith(literal, self._skip()):
+            self.pos += len(literal)
+            return True
+        return False
+
+    def _keyword(self, keyword, consume=True):
+        ''' Check for, and optionally consume, a case-insensitive whole-word keyword '''
+        pos = self._skip()
+        end = pos + len(keyword)
+        if self.text[pos:end].lower() != keyword:
+            return False
+        if end < len(self.text) and self.text[end] in _keyword_chars:
+            return False
+        if consume:
+            self.pos = end
+        return True
+
+    def _error(self, loc):
+        ''' Return a syntax error at loc, remembering the furthest error position '''
+        self.furthest = max(self.furthest, loc)
+        return _PrattSyntaxError(loc)
+
+    def _expect(self, regex):
+        match = self._match(regex)
+        if match is None:
+            raise self._error(self.pos)
+        return match
+
+    def _value(self):
+        ''' Consume a condition value: a word, a quoted string or a number '''
+        match = self._match(_word_re)
+        if match is not None:
+            return match.group(0)
+        match = self._match(_quoted_re)
+        if match is not None:
+            return match.group(1)
+        return self._expect(_number_re).group(0)
+
+    # --- parser ---
+
+    def parse(self):
+        ''' Parse the search and return the top expression element '''
+        try:
+            return self._expression(0)
+        except _PrattSyntaxError as e:
+            loc = max(e.loc, self.furthest)
+            raise BooleanSearchException(_syntax_error_message(self.text, loc))
+
+    def _expression(self, rbp):
+        ''' Parse operands joined by operators binding tighter than rbp '''
+        left = self._prefix()
+        while True:
+            mark = self._skip()
+            op = 'and' if self._keyword('and', consume=False) else \
+                 'or' if self._keyword('or', consume=False) else None
+            if op is None or _binding_powers[op] <= rbp:
+                return left
+
+            # collect a whole chain of the same operator into one element
+            conditions = [left]
+            while self._keyword(op):
+                try:
+                    conditions.append(self._expression(_binding_powers[op]))
+                except _PrattSyntaxError:
+                    # as in the pyparsing grammar, stop before an incomplete operand
+                    self.pos = mark
+                    break
+                mark = self._skip()
+            if len(conditions) == 1:
+                return left
+            left = BoolAnd([conditions]) if op == 'and' else BoolOr([conditions])
+
+    def _prefix(self):
+        ''' Parse a not, a parenthesized expression or a single condition '''
+        mark = self._skip()
+        if self._keyword('not'):
+            try:
+                condition = self._expression(_binding_powers['not'])
+            except _PrattSyntaxError:
+                # 'not' may also be a parameter name
+                self.pos = mark
+            else:
+                return BoolNot([['not', condition]])
+
+        if self._literal('('):
+            expression = self._expression(0)
+            if not self._literal(')'):
+                raise self._error(self.pos)
+            return expression
+
+        return self._condition()
+
+    def _condition(self):
+        ''' Parse a condition, a between or in condition, or a function condition '''
+        start = self._skip()
+        parameter = self._expect(_name_re).group(0)
+
+        if self.text.startswith('(', self._skip()):
+            # function names are plain words, unlike parameter names
+            if not parameter.isalpha():
+                raise self._error(start)
+            self.pos += 1
+            return self._function(parameter)
+
+        if self._keyword('between'):
+            value1 = self._value()
+            if not self._keyword('and'):
+                raise self._error(self.pos)
+            value2 = self._value()
+            return Condition([{'parameter': parameter, 'operator': 'between',
+                               'value1': value1, 'value2': value2}])
+
+        if self._keyword('in'):
+            if not self._literal('['):
+                raise self._error(self.pos)
+            values = [self._value()]
+            while self._literal(','):
+                values.append(self._value())
+            if not self._literal(']'):
+                raise self._error(self.pos)
+            return Condition([{'parameter': parameter, 'operator': 'in', 'value': values}])
+
+        op = self._expect(_operator_re).group(0)
+        return Condition([{'parameter': parameter, 'operator': op, 'value': self._value()}])
+
+    def _function(self, fxn_name):
+        ''' Parse the rest of a function call, after its opening parenthesis '''
+        mark = self.pos
+        try:
+            # fxn(name op value) op value
+            parameter = self._expect(_name_re).group(0)
+            inner = {'parameter': parameter, 'operator': self._expect(_operator_re).group(0),
+                     'value': self._value()}
+            if not self._literal(')'):
+                raise self._error(self.pos)
+            op = self._expect(_operator_re).group(0)
+            value = self._value()
+        except _PrattSyntaxError:
+            self.pos = mark
+        else:
+            call = {'fxn': fxn_name, 'condition': Condition([inner])}
+            return ExprCondition([{'call': call, 'operator': op, 'value': value}])
+
+        # fxn(args) or fxn(key=value, ...)
+        data = {'fxn': fxn_name}
+        args = self._delimited(self._argument)
+        if args:
+            data['args'] = args
+        kwargs = self._delimited(self._keyword_argument)
+        if kwargs:
+            data['kwargs'] = dict(kwargs)
+        if not self._literal(')'):
+            raise self._error(self.pos)
+        return _function_condition([data])
+
+    def _delimited(self, item):
+        ''' Parse a comma-delimited list of items, returning an empty list if there is none '''
+        items = []
+        mark = self.pos
+        value = item()
+        while value is not None:
+            items.append(value)
+            mark = self.pos
+            if not self._literal(','):
+                break
+            value = item()
+        self.pos = mark
+        return items
+
+    def _argument(self):
+        mark = self.pos
+        for regex in (_number_re, _arg_word_re, _number_list_re):
+            match = self._match(regex)
+            if match is None:
+                continue
+            if regex is _arg_word_re and self.text.startswith('=', self._skip()):
+                self.pos = mark
+                return None
+            return ''.join(match.group(0).split())
+        return None
+
+    def _keyword_argument(self):
+        mark = self.pos
+        key = self._match(_fxn_name_re)
+        if key is None or not self._literal('='):
+            self.pos = mark
+            return None
+        value = self._match(_number_re) or self._match(_fxn_name_re)
+        if value is None:
+            self.pos = mark
+            return None
+        return key.group(0), value.group(0)
+
+
+def _syntax_error_message(source, loc):
+    ''' Format a syntax error at a position like the pyparsing grammar does '''
+    lineno = source.count('\n', 0, loc) + 1
+    col = loc - source.rfind('\n', 0, loc)
+    line_start = source.rfind('\n', 0, loc) + 1
+    line_end = source.find('\n', loc)
+    line = source[line_start:line_end if line_end >= 0 else len(source)]
+    marked = line[:col - 1] + '>!<' + line[col - 1:]
+    return "Parsing syntax error ({0}) at line:{1}, col:{2}".format(marked, lineno, col)
+
+
+def enable_packrat(cache_size_limit=128):
+    """ Enables pyparsing packrat memoization of partial parse results.
+
+        Packrat caching is process-wide in pyparsing and applies to every grammar.  It
+        is recommended together with the 'fast' engine, whose memoized tokens carry no
+        parse state.  With the default 'pyparsing' engine, identical searches parsed at
+        the same moment in two threads could share cached expression elements.
+
+        Parameters:
+            cache_size_limit (int):
+                The maximum number of memoized results, or None for an unbounded cache
     """
-    global params, functions, uniqueparams
-    params = {}
-    uniqueparams = []
-    functions = []
+    import pyparsing as pp
+    pp.ParserElement.enablePackrat(cache_size_limit)
+
+
+_grammar_elements = None
+_grammar_lock = threading.Lock()
+
+
+def _grammar():
+    ''' Return the elements of the pyparsing and fast grammars, building them on first use '''
+    global _grammar_elements
+    if _grammar_elements is None:
+        with _grammar_lock:
+            if _grammar_elements is None:
+                grammar = _build_grammar()
+                grammar.update(_build_fast_grammar(grammar))
+                _grammar_elements = grammar
+    return _grammar_elements
+
+
+def __getattr__(name):
+    ''' Return the grammar elements, e.g. expression_parser, and ParseException on first access '''
+    if not name.startswith('_'):
+        if name == 'ParseException':
+            import pyparsing as pp
+            return pp.ParseException
+        grammar = _grammar()
+        if name in grammar:
+            return grammar[name]
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+def _parse_grammar(parser, boolean_search):
+    ''' Parse a search with a pyparsing grammar, raising BooleanSearchException on errors '''
+    import pyparsing as pp
     try:
-        expression = expression_parser.parseString(boolean_search)[0]
-    except ParseException as e:
+        return parser.parseString(boolean_search)[0]
+    except pp.ParseException as e:
         raise BooleanSearchException("Parsing syntax error ({0}) at line:{1}, "
             "col:{2}".format(e.markInputline(), e.lineno, e.col))
+
+
+def _parse_pyparsing(boolean_search):
+    return _parse_grammar(_grammar()['expression_parser'], boolean_search)
+
+
+def _parse_fast(boolean_search):
+    return _build_expression(_parse_grammar(_grammar()['fast_expression_parser'], boolean_search))
+
+
+def _parse_pratt(boolean_search):
+    return PrattParser(boolean_search).parse()
+
+
+# the parser engines selectable in parse_boolean_search
+engines = {'pyparsing': _parse_pyparsing, 'fast': _parse_fast, 'pratt': _parse_pratt}
+
+_whitespace_re = re.compile(r'("[^"]*")|\s+')
+
+
+class LRUCache(object):
+    """ A thread-safe, bounded least-recently-used cache with hit/miss counters.
+
+        Parameters:
+            maxsize (int):
+                The maximum number of entries to keep.  The least recently used
+                entry is evicted once the cache is full.  A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _copy(self, value):
+        ''' Return the copy of a value that is stored or handed out '''
+        return value
+
+    def get(self, key):
+        ''' Return the cached value for a key, or None '''
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            # re-insert to mark the entry as most recently used
+            self._entries[key] = value
+            self.hits += 1
+        return self._copy(value)
+
+    def put(self, key, value):
+        ''' Store a value, evicting the least recently used entry '''
+        if self.maxsize <= 0:
+            return
+        value = self._copy(value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        ''' Change the maximum size, evicting entries if necessary '''
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        ''' Remove all entries and reset the hit/miss counters '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        ''' Return the cache statistics as a dictionary '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'maxsize': self.maxsize, 'currsize': len(self._entries)}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+class ParseCache(LRUCache):
+    """ A thread-safe, bounded LRU cache of parsed boolean search expressions.
+
+        Entries are keyed on the parser engine and the normalized search string
+        (surrounding and repeated whitespace removed, outside of quoted values), as
+        the engines may parse one search differently.  The cache stores a pristine
+        parsed expression and hands out a deep copy on every hit, so callers receive
+        their own tree with its own params, uniqueparams and functions, and cannot
+        corrupt the cached entry.
+
+        Parameters:
+            maxsize (int):
+                The maximum number of expressions to keep.  The least recently used
+                entry is evicted once the cache is full.  A maxsize of 0 disables caching.
+
+        Example:
+            cache = ParseCache(maxsize=256)
+            expression = parse_boolean_search('a < 1 and b > 2', cache=cache)
+            cache.info()  # {'hits': 0, 'misses': 1, 'maxsize': 256, 'currsize': 1}
+    """
+
+    @staticmethod
+    def normalize(boolean_search):
+        ''' Normalize a search string, removing surrounding and repeated whitespace '''
+        return _whitespace_re.sub(lambda m: m.group(1) or ' ', boolean_search).strip()
+
+    @classmethod
+    def key(cls, boolean_search, engine='pyparsing'):
+        ''' Return the cache key of a search string parsed by an engine '''
+        return (engine, cls.normalize(boolean_search))
+
+    def _copy(self, expression):
+        return copy.deepcopy(expression)
+
+    def __contains__(self, boolean_search):
+        ''' Check a search string parsed by the default engine, or an (engine, search) tuple '''
+        if isinstance(boolean_search, tuple):
+            key = self.key(boolean_search[1], engine=boolean_search[0])
+            return super(ParseCache, self).__contains__(key)
+        return super(ParseCache, self).__contains__(self.key(boolean_search))
+
+
+class FilterCache(LRUCache):
+    """ A thread-safe, bounded LRU cache of compiled filters, keyed on query shape.
+
+        Searches with the same shape (see canonicalize), e.g. 'a==1 and b<2' and
+        'b<9 and a==5', share one CompiledFilter per model, and only differ in the
+        bind parameter values returned with it.
+
+        Parameters:
+            maxsize (int):
+                The maximum number of compiled filters to keep
+
+        Example:
+            cache = FilterCache(maxsize=256)
+            clause, params = cache.filter(parse_boolean_search('a==1 and b<2'), DataModel)
+            records = DataModel.query.filter(clause).params(params).all()
+    """
+
+    def compiled(self, expression, DataModelClass):
+        ''' Return the CompiledFilter for the shape of an expression and a model '''
+        models = tuple(DataModelClass) if isinstance(DataModelClass, list) else DataModelClass
+        shape = canonicalize(expression)
+        key = (shape.key, _value_forms(expression, shape, DataModelClass), models)
+        compiled = self.get(key)
+        if compiled is None:
+            compiled = CompiledFilter(expression, DataModelClass)
+            self.put(key, compiled)
+        return compiled
+
+    def filter(self, expression, DataModelClass):
+        ''' Return the filter clause for an expression and its bind parameter values '''
+        compiled = self.compiled(expression, DataModelClass)
+        return compiled.clause, compiled.bind(expression)
+
+
+def _parse(boolean_search, engine='pyparsing'):
+    """ Parses the boolean search expression, without any caching """
+    try:
+        parser = engines[engine]
+    except KeyError:
+        raise BooleanSearchException("Unknown parser engine '{0}'. Choose one of: {1}.".format(
+            engine, ', '.join(sorted(engines))))
+
+    start = _clock() if _instruments else None
+    with ParseContext() as context:
+        try:
+            expression = parser(boolean_search)
+        except RecursionError:
+            raise BooleanSearchException("Parsing error: the search expression is nested too "
+                                         "deeply")
+    context.attach(expression)
+    if start is not None:
+        _emit('parse', start, expression)
+    return expression
+
+
+def parse_boolean_search(boolean_search, cache=None, engine='pyparsing'):
+    """ Parses the boolean search expression into a hierarchy of boolean operators.
+        Returns a BoolNot or BoolAnd or BoolOr object.
+
+        If a ParseCache is given, repeated searches are served from the cache
+        instead of being parsed again.  The engine selects the parser: 'pyparsing'
+        (the default), 'fast', a left-factored grammar that does not backtrack
+        on deeply nested expressions or long and/or chains, or 'pratt', a
+        hand-written parser that does not use pyparsing.  The 'fast' and 'pratt'
+        engines only match the and, or and not keywords as whole words, where the
+        'pyparsing' engine also splits them off names: it reads 'notes==1' as
+        'not es==1' and 'a==1 andb==2' as 'a==1 and b==2'.
+    """
+    if cache is None:
+        return _parse(boolean_search, engine=engine)
+
+    key = cache.key(boolean_search, engine=engine)
+    expression = cache.get(key)
+    if expression is None:
+        expression = _parse(boolean_search, engine=engine)
+        cache.put(key, expression)
+    return expression
+
+
+# ***** Batch parsing and compilation *****
+
+BatchResult = namedtuple('BatchResult', ['search', 'expression', 'compiled', 'params', 'error'])
+
+
+def _batch_parse(item):
+    ''' Parse one search of a batch, returning the expression or the error '''
+    boolean_search, engine = item
+    try:
+        return _parse(boolean_search, engine=engine), None
+    except Exception as e:
+        # e.g. the assertions of function conditions with missing arguments
+        return None, e
+
+
+def compile_searches(searches, DataModelClass, engine='pyparsing', processes=None, cache=None):
+    """ Parse and compile many search strings in one call
+
+    Identical searches, up to whitespace, are parsed once, and searches of the same
+    shape (see canonicalize) share one CompiledFilter, so only their bind parameter
+    values differ.  A module or list of models is indexed once in a ModelRegistry,
+    so all searches share the field resolution.  Errors are returned per search
+    instead of being raised.
+
+    Parameters:
+        searches:
+            An iterable of boolean search strings
+        DataModelClass:
+            A model class, a list of model classes, a module or a ModelRegistry
+        engine (str):
+            The parser engine, as in parse_boolean_search
+        processes (int):
+            If given, parse the distinct searches in a multiprocessing pool of this
+            many processes.  Worthwhile for large batches of long searches.
+        cache (ParseCache):
+            An optional parse cache, consulted and filled when parsing in this process
+
+    Returns:
+        A list of BatchResult namedtuples, in the order of the searches, with the
+        search, its parsed expression, its CompiledFilter, its bind parameter values
+        and the error, which is None on success
+
+    Example:
+        for result in compile_searches(saved_searches, app.models):
+            if result.error is None:
+                query = DataModel.query.filter(result.compiled.clause)
+                records = query.params(result.params).all()
+    """
+    searches = list(searches)
+    if inspect.ismodule(DataModelClass) or isinstance(DataModelClass, list):
+        DataModelClass = ModelRegistry(DataModelClass)
+
+    # parse each distinct search once
+    keys = [ParseCache.normalize(search) for search in searches]
+    distinct = list(OrderedDict((key, search) for key, search in zip(keys, searches)).items())
+    if processes:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            parsed = pool.map(_batch_parse, [(search, engine) for key, search in distinct])
+        finally:
+            pool.close()
+            pool.join()
+    elif cache is not None:
+        parsed = []
+        for key, search in distinct:
+            try:
+                parsed.append((parse_boolean_search(search, cache=cache, engine=engine), None))
+            except Exception as e:
+                parsed.append((None, e))
     else:
-        expression.params = params
-        expression.uniqueparams = list(set(uniqueparams))
-        expression.functions = functions
-        return expression
+        parsed = [_batch_parse((search, engine)) for key, search in distinct]
+    parsed = dict((key, result) for (key, search), result in zip(distinct, parsed))
+
+    # compile each shape once
+    compiled_shapes = {}
+    results = []
+    for search, key in zip(searches, keys):
+        expression, error = parsed[key]
+        compiled = params = None
+        if error is None:
+            shape = canonicalize(expression)
+            shape_key = (shape.key, _value_forms(expression, shape, DataModelClass))
+            if shape_key not in compiled_shapes:
+                try:
+                    compiled_shapes[shape_key] = (CompiledFilter(expression, DataModelClass), None)
+                except Exception as e:
+                    compiled_shapes[shape_key] = (None, e)
+            compiled, error = compiled_shapes[shape_key]
+            if error is None:
+                try:
+                    params = compiled.bind(expression)
+                except Exception as e:
+                    compiled, error = None, e
+        results.append(BatchResult(search, expression, compiled, params, error))
+    return results
+
+
+# ***** Multiple searches in one query *****
+
+def _top_terms(expression):
+    ''' Return the flattened terms of the top-level and of an expression, or the expression '''
+    if isinstance(expression, BoolAnd):
+        terms = []
+        for child in expression.conditions:
+            terms.extend(_top_terms(child))
+        return terms + list(getattr(expression, 'fxn_conditions', []))
+    return [expression]
+
+
+def _rebind(node, context):
+    ''' Give the conditions of an expression element new bind names, unique within a context '''
+    if isinstance(node, Condition):
+        node.__dict__.pop('in_bindname', None)
+        node.bindname = context.reserve(node.fullname)
+        if node.op == 'in':
+            node.bindname = context.reserve(_in_bindname(node.bindname), expanding=True)
+        if hasattr(node, 'bindname2'):
+            node.bindname2 = context.reserve('{0}_{1}'.format(node.bindname, 2))
+    elif isinstance(node, BoolNot):
+        _rebind(node.condition, context)
+    elif isinstance(node, ExprCondition):
+        _rebind(node.condition, context)
+    for child in getattr(node, 'conditions', []) + getattr(node, 'fxn_conditions', []):
+        _rebind(child, context)
+    if isinstance(node, BoolOr):
+        _reserve_in_bindnames(node.conditions, context)
+    return node
+
+
+class SearchSet(object):
+    """ Several searches against the same models, evaluated in one query.
+
+        The terms of each search's top-level and are compared across searches.  Terms
+        shared by all searches become a common prefilter, the rest of each search becomes
+        a CASE expression, and the CASE expressions add up to a bitmask of the searches
+        each row matches, so N overlapping searches cost one scan instead of N.  Terms
+        repeated across searches are built once, and all conditions get bind parameter
+        names unique across the searches.
+
+        Parameters:
+            expressions:
+                A list of parsed expressions
+            DataModelClass:
+                A model class, a list of model classes, a module or a ModelRegistry
+
+        Example:
+            searches = SearchSet(
+                [parse_boolean_search('survey == dr17 and quality == 0 and mag < 20'),
+                 parse_boolean_search('survey == dr17 and quality == 0 and z > 1')], DataModel)
+            for row in searches.query(db.session.query(DataModel)):
+                record, mask = row
+                searches.matches(mask)  # e.g. [0, 1]
+    """
+
+    def __init__(self, expressions, DataModelClass):
+        self.expressions = list(expressions)
+        if not self.expressions:
+            raise BooleanSearchException("A SearchSet needs at least one search.")
+        self.DataModelClass = DataModelClass
+
+        # one rebound copy of each distinct term, shared by the searches using it
+        context = ParseContext()
+        self._terms = OrderedDict()
+        self._searches = []
+        for expression in self.expressions:
+            keys = []
+            for term in _top_terms(expression):
+                key = _term_key(term)
+                if key not in self._terms:
+                    self._terms[key] = _rebind(copy.deepcopy(term), context)
+                if key not in keys:
+                    keys.append(key)
+            self._searches.append(keys)
+
+        common = set(self._searches[0]).intersection(*self._searches[1:])
+        self.shared = [term for key, term in self._terms.items() if key in common]
+        self.residuals = [[self._terms[key] for key in keys if key not in common]
+                          for keys in self._searches]
+
+    def _filter(self, terms):
+        ''' Return the and of the terms that compile to SQL, or None if there are none '''
+        clauses = [term.filter(self.DataModelClass) for term in terms]
+        clauses = [clause for clause in clauses if clause is not None]
+        return and_(*clauses) if clauses else None
+
+    @property
+    def prefilter(self):
+        ''' The filter clause of the rows matching any of the searches '''
+        shared = self._filter(self.shared)
+        residuals = [self._filter(terms) for terms in self.residuals]
+        clauses = [] if shared is None else [shared]
+        if all(residual is not None for residual in residuals):
+            clauses.append(or_(*residuals))
+        return and_(*clauses) if clauses else sqlalchemy.true()
+
+    @property
+    def columns(self):
+        ''' One CASE expression per search, 2**index if the row matches the search, or 0 '''
+        columns = []
+        for index, terms in enumerate(self.residuals):
+            residual = self._filter(terms)
+            bit = 2 ** index
+            if residual is None:
+                columns.append(sqlalchemy.literal(bit))
+            else:
+                columns.append(sqlalchemy.case([(residual, bit)], else_=0))
+        return columns
+
+    @property
+    def bitmask(self):
+        ''' The sum of the CASE expressions: a bitmask of the searches a row matches '''
+        columns = self.columns
+        mask = columns[0]
+        for column in columns[1:]:
+            mask = mask + column
+        return mask
+
+    def query(self, query, label='search_mask'):
+        ''' Filter a query with the prefilter, and add the bitmask as a column '''
+        return query.filter(self.prefilter).add_columns(self.bitmask.label(label))
+
+    def matches(self, mask):
+        ''' Return the indices of the searches in a bitmask '''
+        return [index for index in range(len(self.expressions)) if mask & (2 ** index)]
 
+    def __repr__(self):
+        return '<SearchSet shared={0} residuals={1}>'.format(self.shared, self.residuals)
 
+
+# ***** Keyset pagination and streaming *****
+
+Page = namedtuple('Page', ['items', 'next_token'])
+
+
+def _encode_token(payload):
+    ''' Return an opaque, url-safe continuation token of a JSON payload '''
+    import base64
+    import json
+    data = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _decode_token(token):
+    ''' Return the JSON payload of a continuation token '''
+    import base64
+    import binascii
+    import json
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(data.decode('utf-8'))
+    except (TypeError, ValueError, binascii.Error):
+        raise BooleanSearchException("Invalid continuation token.")
+
+
+def _key_value(column, value):
+    ''' Convert a key value read from a token back to the Python type of its column '''
+    import datetime
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+    if isinstance(value, python_type):
+        return value
+    if python_type in (datetime.datetime, datetime.date, datetime.time):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+class SearchPager(object):
+    """ Pages through, or streams, the rows matching a search in the order of a key.
+
+        Pages use keyset (seek) pagination: each page continues from the key of the
+        last row of the previous one, with a WHERE on the key instead of an OFFSET,
+        so with an index on the key every page costs the same however deep it is.
+        The position is returned as an opaque continuation token.  The primary key is
+        added to the key when it is not part of it, to order rows with equal keys.
+        Key values must not be null.
+
+        Parameters:
+            DataModelClass:
+                A model class, a list of model classes, a module or a ModelRegistry;
+                the first model is the one paged through
+            key (str or list):
+                The name, or names, of the columns of the first model to order by.
+                Defaults to the primary key.
+            page_size (int):
+                The number of rows per page
+            descending (bool):
+                Page from the largest key down
+
+        Example:
+            pager = SearchPager(DataModel, key='mag', page_size=100)
+            expression = parse_boolean_search('mag < 20 and z > 1')
+            page = pager.page(DataModel.query, expression)
+            page = pager.page(DataModel.query, expression, page.next_token)
+
+            for record in pager.stream(DataModel.query, expression):
+                ...
+    """
+
+    def __init__(self, DataModelClass, key=None, page_size=100, descending=False):
+        self.DataModelClass = DataModelClass
+        self.page_size = int(page_size)
+        if self.page_size < 1:
+            raise BooleanSearchException("The page size must be positive.")
+        self.descending = descending
+
+        model = _outer_model(DataModelClass)
+        primary_key = [column.key for column in sqlalchemy.inspect(model).primary_key]
+        if key is None:
+            key = primary_key
+        elif not isinstance(key, (list, tuple)):
+            key = [key]
+        key = list(key)
+        key += [name for name in primary_key if name not in key]
+        self.key = key
+
+        self.columns = []
+        for name in self.key:
+            column = getattr(model, name, None)
+            if column is None:
+                raise BooleanSearchException(
+                    "Table '{0}' does not have a field named '{1}'.".format(model.__tablename__,
+                                                                            name))
+            self.columns.append(column)
+
+    def _filter(self, query, expression):
+        ''' Filter a query by a parsed expression '''
+        if expression is None:
+            return query
+        clause = expression.filter(self.DataModelClass)
+        return query if clause is None else query.filter(clause)
+
+    def _ordered(self, query):
+        return query.order_by(*[column.desc() if self.descending else column.asc()
+                                for column in self.columns])
+
+    def seek(self, values):
+        ''' Return the clause of the rows after a key, e.g. (a > 1) or (a = 1 and id > 5)
+
+        The rows with a greater first key, or an equal first key and a greater second key,
+        and so on; smaller keys when descending.
+        '''
+        after = lt if self.descending else gt
+        terms = []
+        for i, (column, value) in enumerate(zip(self.columns, values)):
+            equal = [c == v for c, v in zip(self.columns[:i], values[:i])]
+            terms.append(and_(*(equal + [after(column, value)])))
+        return or_(*terms)
+
+    def token(self, row):
+        ''' Return the continuation token of the rows after a row '''
+        return _encode_token({'key': self.key, 'after': [getattr(row, name) for name in self.key],
+                              'desc': bool(self.descending)})
+
+    def values(self, token):
+        ''' Return the key values of a continuation token '''
+        payload = _decode_token(token)
+        if not isinstance(payload, dict) or payload.get('key') != self.key or \
+                payload.get('desc') != bool(self.descending) or \
+                len(payload.get('after') or []) != len(self.key):
+            raise BooleanSearchException("The continuation token does not match the key of this "
+                                         "pager.")
+        return [_key_value(column, value) for column, value in zip(self.columns, payload['after'])]
+
+    def page(self, query, expression, token=None):
+        ''' Return a page of the rows matching an expression
+
+        Parameters:
+            query:
+                The SQLAlchemy query to page through, e.g. DataModel.query
+            expression:
+                A parsed expression, or None for all the rows
+            token (str):
+                The next_token of the previous page, or None for the first page
+
+        Returns:
+            A Page namedtuple of the items, and the token of the next page, which is None
+            on the last page
+        '''
+        query = self._filter(query, expression)
+        if token is not None:
+            query = query.filter(self.seek(self.values(token)))
+        # one more row tells whether there is a next page
+        items = self._ordered(query).limit(self.page_size + 1).all()
+        if len(items) <= self.page_size:
+            return Page(items, None)
+        items = items[:self.page_size]
+        return Page(items, self.token(items[-1]))
+
+    def pages(self, query, expression, token=None):
+        ''' Yield the pages of the rows matching an expression, from a token or the first page '''
+        while True:
+            page = self.page(query, expression, token)
+            yield page
+            if page.next_token is None:
+                return
+            token = page.next_token
+
+    def stream(self, query, expression, yield_per=1000):
+        ''' Return an iterator of the rows matching an expression in key order
+
+        The query runs once, with a server-side cursor where the database driver supports
+        one, and the rows are fetched yield_per at a time, so memory stays bounded however
+        many rows match.
+        '''
+        query = self._ordered(self._filter(query, expression))
+        return iter(query.execution_options(stream_results=True).yield_per(yield_per))
+
+    def __repr__(self):
+        return '<SearchPager key={0} page_size={1}{2}>'.format(
+            self.key, self.page_size, ' descending' if self.descending else '')
+
+
+# ***** Asyncio *****
+
+class AsyncSearch(object):
+    """ Parses, compiles and runs searches from asyncio code without blocking the event loop.
+
+        Parsing and filter compilation are CPU bound, so they run in a bounded thread
+        pool.  The filters run through SQLAlchemy's asyncio extension, on an
+        ``AsyncSession``, ``AsyncConnection`` or ``AsyncEngine``, and the rows are
+        streamed back as an async iterator.
+
+        Parameters:
+            DataModelClass:
+                The model class searched, or a list of model classes, a module or a
+                ModelRegistry whose first model is searched
+            max_workers (int):
+                The number of threads parsing and compiling searches
+            executor:
+                An optional concurrent.futures executor to use instead of a thread pool
+                of max_workers threads; it is not shut down by close
+            cache (ParseCache):
+                An optional cache of parsed expressions
+            filter_cache (FilterCache):
+                An optional cache of compiled filters, shared by searches of one shape
+            engine (str):
+                The parser engine, see parse_boolean_search
+
+        Example:
+            searches = AsyncSearch(DataModel, max_workers=4)
+            async with AsyncSession(async_engine) as session:
+                async for record in searches.stream(session, 'field1=a* and field2<10'):
+                    ...
+    """
+
+    def __init__(self, DataModelClass, max_workers=4, executor=None, cache=None, filter_cache=None,
+                 engine='pyparsing'):
+        self.DataModelClass = DataModelClass
+        self.cache = cache
+        self.filter_cache = filter_cache
+        self.engine = engine
+        self._owns_executor = executor is None
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+
+    def _run(self, function, *args):
+        ''' Run a function in the executor, returning an awaitable of its result '''
+        import asyncio
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _compile(self, search):
+        ''' Parse and compile a search, returning its filter clause and bind parameter values '''
+        expression = parse_boolean_search(search, cache=self.cache, engine=self.engine)
+        if self.filter_cache is not None:
+            return self.filter_cache.filter(expression, self.DataModelClass)
+        return expression.filter(self.DataModelClass), {}
+
+    async def parse(self, search):
+        ''' Return the parsed expression of a search, parsed in the executor '''
+        return await self._run(parse_boolean_search, search, self.cache, self.engine)
+
+    async def filter(self, search):
+        ''' Return the filter clause and bind values of a search, built in the executor '''
+        return await self._run(self._compile, search)
+
+    async def statement(self, search, statement=None):
+        ''' Return a select statement filtered by a search, and its bind parameter values
+
+        Parameters:
+            search (str): The boolean search
+            statement: The select to filter.  Defaults to a select of the searched model.
+        '''
+        clause, params = await self.filter(search)
+        if statement is None:
+            statement = sqlalchemy.select(_outer_model(self.DataModelClass))
+        return statement.where(clause), params
+
+    async def stream(self, bind, search, statement=None, yield_per=None):
+        ''' Run a search and yield its rows as they arrive
+
+        Parameters:
+            bind:
+                An AsyncSession, AsyncConnection or AsyncEngine
+            search (str):
+                The boolean search
+            statement:
+                The select to filter.  Defaults to a select of the searched model, whose
+                instances are yielded; other statements yield rows.
+            yield_per (int):
+                The number of rows fetched from the server-side cursor at a time
+        '''
+        from sqlalchemy.ext.asyncio import AsyncEngine
+
+        scalars = statement is None
+        statement, params = await self.statement(search, statement)
+        if yield_per is not None:
+            statement = statement.execution_options(yield_per=yield_per)
+
+        if isinstance(bind, AsyncEngine):
+            async with bind.connect() as connection:
+                async for row in self._stream(connection, statement, params, scalars):
+                    yield row
+        else:
+            async for row in self._stream(bind, statement, params, scalars):
+                yield row
+
+    @staticmethod
+    async def _stream(bind, statement, params, scalars):
+        result = await bind.stream(statement, params)
+        if scalars:
+            result = result.scalars()
+        async for row in result:
+            yield row
+
+    async def all(self, bind, search, statement=None):
+        ''' Run a search and return a list of its rows, see stream '''
+        return [row async for row in self.stream(bind, search, statement)]
+
+    def close(self):
+        ''' Shut down the thread pool, if it was created by this AsyncSearch '''
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    def __repr__(self):
+        name = getattr(_outer_model(self.DataModelClass), '__name__', '?')
+        return '<AsyncSearch ({0})>'.format(name)
@@ -32,3 +32,23 @@ class Record(db.Model):
     float = db.Column(db.Float(), nullable=False, server_default='0.0')
 
 
+class Source(db.Model):
+    __tablename__ = 'sources'
+    __boolean_search__ = {'cone': {'ra': 'ra', 'dec': 'dec'}}
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), index=True, info={'boolean_search': {'match': 'prefix'}})
+    designation = db.Column(db.String(50), unique=True,
+                            info={'boolean_search': {'match': 'exact'}})
+    alias = db.Column(db.String(50), info={'boolean_search': {'match': 'lower'}})
+    remarks = db.Column(db.String(200), info={'boolean_search': {'match': 'trigram'}})
+    comment = db.Column(db.String(200))
+    ra = db.Column(db.Float(), index=True)
+    dec = db.Column(db.Float(), index=True)
+
+
+class Person(db.Model):
+    __tablename__ = 'people'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, server_default='')
+    manager_id = db.Column(db.Integer(), db.ForeignKey('people.id'))
+    manager = db.relationship('Person', remote_side=[id])
@@ -0,0 +1,94 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy import Column, Integer, Float, String, ARRAY
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy_boolean_search import (parse_boolean_search, optimize, CompiledFilter, FilterCache,
+                                       BooleanSearchException)
+import pytest
+
+# ARRAY columns need PostgreSQL, so these models are only compiled, never created
+Base = declarative_base()
+
+
+class Spectrum(Base):
+    __tablename__ = 'spectra'
+    id = Column(Integer, primary_key=True)
+    flags = Column(postgresql.ARRAY(Integer))
+    lines = Column(postgresql.ARRAY(String(20)))
+    fluxes = Column(postgresql.ARRAY(Float), info={'boolean_search': {'array': 'any'}})
+    bins = Column(ARRAY(Integer))
+
+
+def compiled(search):
+    clause = parse_boolean_search(search).filter(Spectrum)
+    sql = str(clause.compile(dialect=postgresql.dialect()))
+    return sql, clause.compile(dialect=postgresql.dialect()).params
+
+
+def test_array_containment():
+    assert compiled('flags == 5') == ('spectra.flags @> %(flags)s::INTEGER[]', {'flags': [5]})
+    assert compiled('lines = Halpha') == \
+        ('spectra.lines @> %(lines)s::VARCHAR(20)[]', {'lines': ['Halpha']})
+    assert compiled('flags != 5') == ('NOT spectra.flags @> %(flags)s::INTEGER[]', {'flags': [5]})
+    assert compiled('flags in [1, 2]') == \
+        ('spectra.flags && %(flags_in)s::INTEGER[]', {'flags_in': [1, 2]})
+    # or'ed equalities become one overlap
+    assert compiled('flags == 1 or flags == 3')[0] == 'spectra.flags && %(flags_in)s::INTEGER[]'
+
+
+def test_array_ranges():
+    # some element is greater than 5
+    assert compiled('flags > 5') == ('%(flags)s < ANY (spectra.flags)', {'flags': 5})
+    assert compiled('flags <= 5') == ('%(flags)s >= ANY (spectra.flags)', {'flags': 5})
+    with pytest.raises(BooleanSearchException):
+        compiled('flags between 1 and 5')
+    with pytest.raises(BooleanSearchException):
+        compiled('flags == x')
+
+
+def test_array_optimize_not():
+    # not flags > 5 means every element is at most 5, which no inverted comparison states
+    expr = optimize(parse_boolean_search('not flags > 5'), Spectrum)
+    assert repr(expr) == 'not_(flags>5)'
+    assert str(expr.filter(Spectrum).compile(dialect=postgresql.dialect())) == \
+        'NOT (%(flags)s < ANY (spectra.flags))'
+    expr = optimize(parse_boolean_search('not fluxes == 1.5'), Spectrum)
+    assert repr(expr) == 'not_(fluxes==1.5)'
+
+
+def test_array_any_mode():
+    assert compiled('fluxes == 1.5') == ('%(fluxes)s = ANY (spectra.fluxes)', {'fluxes': 1.5})
+    assert compiled('fluxes in [1, 2]')[0] == \
+        '%(fluxes_in_0)s = ANY (spectra.fluxes) OR %(fluxes_in_1)s = ANY (spectra.fluxes)'
+    # containment needs the PostgreSQL ARRAY type
+    assert compiled('bins == 2') == ('%(bins)s = ANY (spectra.bins)', {'bins': 2})
+
+
+def test_array_compiled_filter():
+    compiled_filter = CompiledFilter(parse_boolean_search('flags == 5 and fluxes > 1'), Spectrum)
+    assert compiled_filter.params({'flags': '7', 'fluxes': '2.5'}) == {'flags': [7], 'fluxes': 2.5}
+
+
+def test_array_any_mode_in_rebind():
+    compiled_filter = CompiledFilter(parse_boolean_search('fluxes in [1, 2]'), Spectrum)
+    assert compiled_filter.bind(parse_boolean_search('fluxes in [7, 8]')) == \
+        {'fluxes_in_0': 7.0, 'fluxes_in_1': 8.0}
+    # the clause has one bind parameter per value
+    with pytest.raises(BooleanSearchException):
+        compiled_filter.bind(parse_boolean_search('fluxes in [7, 8, 9]'))
+    compiled_filter = CompiledFilter(parse_boolean_search('fluxes == 1 or fluxes == 2'), Spectrum)
+    with pytest.raises(BooleanSearchException):
+        compiled_filter.bind(parse_boolean_search('fluxes == 7 or fluxes == 8 or fluxes == 9'))
+
+    cache = FilterCache()
+    cache.filter(parse_boolean_search('fluxes in [1, 2]'), Spectrum)
+    clause, params = cache.filter(parse_boolean_search('fluxes in [7, 8, 9]'), Spectrum)
+    assert params == {'fluxes_in_0': 7.0, 'fluxes_in_1': 8.0, 'fluxes_in_2': 9.0}
+    assert set(clause.compile(dialect=postgresql.dialect()).params) == set(params)
+    # containment binds the whole list, so lists of any length share one filter
+    first, params = cache.filter(parse_boolean_search('flags in [1, 2]'), Spectrum)
+    second, params = cache.filter(parse_boolean_search('flags in [7, 8, 9]'), Spectrum)
+    assert first is second and params == {'flags_in': [7, 8, 9]}
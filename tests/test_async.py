@@ -0,0 +1,82 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+import asyncio
+from sqlalchemy import select
+from sqlalchemy_boolean_search import AsyncSearch, FilterCache, BooleanSearchException
+from .conftest import the_db
+from .models import Record
+import pytest
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession  # noqa: E402
+
+
+async def setup_database(path):
+    engine = create_async_engine('sqlite+aiosqlite:///{0}'.format(path))
+    async with engine.begin() as connection:
+        await connection.run_sync(the_db.Model.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        session.add_all([Record(integer=i, float=i / 10.0, string='s{0}'.format(i % 10))
+                         for i in range(200)])
+        await session.commit()
+    return engine
+
+
+def test_async_search(tmp_path):
+    async def run():
+        engine = await setup_database(tmp_path / 'async.sqlite')
+        searches = AsyncSearch(Record, max_workers=2)
+        try:
+            async with AsyncSession(engine) as session:
+                records = await searches.all(session, 'integer < 10 and string = s1')
+                assert [record.integer for record in records] == [1]
+
+                expression = await searches.parse('integer < 10')
+                assert repr(expression) == 'integer<10'
+
+                # rows of a custom statement, on the engine
+                statement = select(Record.integer)
+                rows = [row async for row in searches.stream(engine, 'integer >= 198', statement)]
+                assert [tuple(row) for row in rows] == [(198,), (199,)]
+
+            with pytest.raises(BooleanSearchException):
+                await searches.filter('integer <')
+        finally:
+            searches.close()
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_async_concurrent(tmp_path):
+    events = []
+
+    async def search(searches, engine, index):
+        events.append(('start', index))
+        count = 0
+        async with AsyncSession(engine) as session:
+            async for record in searches.stream(session, 'integer >= {0} and integer < {1}'.format(
+                    index * 10, index * 10 + 10), yield_per=2):
+                assert index * 10 <= record.integer < index * 10 + 10
+                count += 1
+        events.append(('end', index))
+        return count
+
+    async def run():
+        engine = await setup_database(tmp_path / 'concurrent.sqlite')
+        searches = AsyncSearch(Record, max_workers=4, filter_cache=FilterCache())
+        try:
+            counts = await asyncio.gather(*[search(searches, engine, i) for i in range(20)])
+        finally:
+            searches.close()
+            await engine.dispose()
+        assert counts == [10] * 20
+        # all searches started before the first one finished
+        first_end = events.index(next(event for event in events if event[0] == 'end'))
+        assert len([event for event in events[:first_end] if event[0] == 'start']) == 20
+        assert searches.filter_cache.info()['misses'] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,94 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import compile_searches, ParseCache, BooleanSearchException
+from . import models
+from .models import Record
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+searches = [
+    'integer > 1 and float < 2',
+    'integer > 1  and float < 2',
+    'float < 9 and integer > 5',
+    'integer > x',
+    'integer:1',
+    'xyz == 1',
+    'string = ab',
+]
+
+
+def check_results(results):
+    assert [r.search for r in results] == searches
+    first, second, third, bad_value, bad_syntax, bad_field, string = results
+
+    # identical searches are parsed once, same shapes are compiled once
+    assert first.expression is second.expression
+    assert first.compiled is second.compiled is third.compiled
+    assert first.params == {'integer': 1, 'float': 2.0}
+    assert third.params == {'integer': 5, 'float': 9.0}
+    assert string.params == {'string': '%ab%'}
+
+    for result in (bad_value, bad_syntax, bad_field):
+        assert isinstance(result.error, BooleanSearchException)
+        assert result.compiled is None and result.params is None
+    assert bad_value.expression is not None
+    assert bad_syntax.expression is None
+    assert all(r.error is None for r in (first, second, third, string))
+
+
+def test_batch():
+    check_results(compile_searches(searches, Record))
+
+
+def test_batch_models():
+    results = compile_searches(searches, models, engine='pratt')
+    check_results(results)
+    assert str(results[0].compiled.clause) == \
+        'records.integer > :integer AND records.float < :float'
+
+
+def test_batch_cache():
+    cache = ParseCache()
+    check_results(compile_searches(searches, Record, cache=cache))
+    assert cache.info()['misses'] == 6
+    compile_searches(searches, Record, cache=cache)
+    assert cache.info()['hits'] == 5
+
+
+def test_batch_processes():
+    check_results(compile_searches(searches, [Record], processes=2))
+
+
+def test_batch_function_errors():
+    # a cone with too few arguments fails its assertion, which is kept per search
+    for results in (compile_searches(['integer < 1', 'cone(1, 2)'], Record),
+                    compile_searches(['integer < 1', 'cone(1, 2)'], Record, cache=ParseCache())):
+        good, bad = results
+        assert good.error is None and good.params == {'integer': 1}
+        assert isinstance(bad.error, AssertionError)
+        assert bad.expression is None and bad.compiled is None
+
+
+def test_batch_query(db):
+    records = [Record(integer=i, float=i / 2.0) for i in range(10)]
+    add_records(db, records)
+    ids = [r.id for r in records]
+    query = Record.query.filter(Record.id.in_(ids))
+    searches = ['integer > 1 and float < 2', 'float < 4 and integer > 5']
+    counts = [query.filter(r.compiled.clause).params(r.params).count()
+              for r in compile_searches(searches, Record)]
+    assert counts == [2, 2]
+    delete_records(db, records)
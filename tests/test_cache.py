@@ -0,0 +1,129 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, ParseCache, BooleanSearchException
+import threading
+import pytest
+
+
+def test_cache_hits_and_misses():
+    cache = ParseCache(maxsize=4)
+    expr = parse_boolean_search('a < 1 and b > 2', cache=cache)
+    assert repr(expr) == 'and_(a<1, b>2)'
+    assert cache.info() == {'hits': 0, 'misses': 1, 'maxsize': 4, 'currsize': 1}
+
+    # whitespace differences share one entry
+    expr = parse_boolean_search('  a < 1    and b > 2 ', cache=cache)
+    assert repr(expr) == 'and_(a<1, b>2)'
+    assert cache.info()['hits'] == 1
+    assert len(cache) == 1
+    assert 'a < 1 and b > 2' in cache
+
+
+def test_cache_returns_copies():
+    cache = ParseCache()
+    first = parse_boolean_search('a < 1 and b > 2 and cone(3.4, 5.6, 1)', cache=cache)
+    first.params['a'] = 'changed'
+    first.conditions.pop()
+    first.functions.pop()
+
+    second = parse_boolean_search('a < 1 and b > 2 and cone(3.4, 5.6, 1)', cache=cache)
+    assert second is not first
+    assert second.params == {'a': '1', 'b': '2'}
+    assert sorted(second.uniqueparams) == ['a', 'b']
+    assert len(second.conditions) == 2
+    assert repr(second.functions) == '[cone(3.4,5.6,1)]'
+
+
+def test_cache_quoted_whitespace():
+    cache = ParseCache()
+    parse_boolean_search('a = "x y"', cache=cache)
+    expr = parse_boolean_search('a = "x  y"', cache=cache)
+    assert expr.value == 'x  y'
+    assert len(cache) == 2
+
+
+def test_cache_engines():
+    # the engines differ on keywords run into names, so each keeps its own entries
+    cache = ParseCache()
+    assert repr(parse_boolean_search('notes==1', cache=cache)) == 'not_(es==1)'
+    assert repr(parse_boolean_search('notes==1', cache=cache, engine='fast')) == 'notes==1'
+    assert cache.info()['misses'] == 2
+    assert ('fast', 'notes==1') in cache
+    assert ('pratt', 'notes==1') not in cache
+
+
+def test_cache_eviction():
+    cache = ParseCache(maxsize=2)
+    parse_boolean_search('a==1', cache=cache)
+    parse_boolean_search('b==1', cache=cache)
+    parse_boolean_search('a==1', cache=cache)
+    parse_boolean_search('c==1', cache=cache)
+    # b==1 was the least recently used entry
+    assert 'a==1' in cache
+    assert 'c==1' in cache
+    assert 'b==1' not in cache
+
+    cache.resize(1)
+    assert len(cache) == 1
+    assert 'c==1' in cache
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'maxsize': 1, 'currsize': 0}
+
+
+def test_cache_disabled():
+    cache = ParseCache(maxsize=0)
+    parse_boolean_search('a==1', cache=cache)
+    parse_boolean_search('a==1', cache=cache)
+    assert len(cache) == 0
+    assert cache.info()['misses'] == 2
+
+
+def test_cache_errors_not_cached():
+    cache = ParseCache()
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('a:1', cache=cache)
+    assert len(cache) == 0
+
+
+def test_cache_error_position():
+    # errors point into the text as typed, not into its normalized form
+    # pyparsing versions differ on whether the leading whitespace is skipped, so
+    # compare with an uncached parse rather than a fixed column
+    cache = ParseCache()
+    with pytest.raises(BooleanSearchException) as excinfo:
+        parse_boolean_search('   a:1', cache=cache)
+    with pytest.raises(BooleanSearchException) as uncached:
+        parse_boolean_search('   a:1')
+    assert str(excinfo.value) == str(uncached.value)
+    assert 'col:1' not in str(excinfo.value)
+
+
+def test_cache_threads():
+    # fewer slots than distinct searches, so the workers race on misses,
+    # puts and evictions as well as on hits
+    cache = ParseCache(maxsize=3)
+    searches = ['a=={0} and b<2'.format(i % 6) for i in range(300)]
+    errors = []
+
+    def worker(chunk):
+        for search in chunk:
+            try:
+                expr = parse_boolean_search(search, cache=cache)
+                assert repr(expr) == 'and_({0}, b<2)'.format(search.split(' ')[0])
+                assert expr.params == {'a': search[3], 'b': '2'}
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(searches[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    info = cache.info()
+    assert info['hits'] + info['misses'] == len(searches)
+    assert info['misses'] >= 6
+    assert info['currsize'] <= 3
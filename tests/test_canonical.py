@@ -0,0 +1,65 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import (parse_boolean_search, canonicalize, CompiledFilter,
+                                       FilterCache)
+from .models import Record
+
+
+def shape(search):
+    return canonicalize(parse_boolean_search(search))
+
+
+def test_canonical_condition():
+    assert shape('a < 1') == ('a<?', ['1'], ['a'])
+    assert shape('t.a between 1 and 5') == ('t.a between ? and ?', ['1', '5'], ['t.a', 't.a_2'])
+    assert shape('a & ~64') == ('a&?', ['-65'], ['a'])
+
+
+def test_canonical_order():
+    first = shape('a==1 and b<2')
+    second = shape('b<9 and (a==5)')
+    assert first.key == second.key == 'and(a==?, b<?)'
+    assert first.values == ['1', '2']
+    assert second.values == ['5', '9']
+
+    # nested operators of the same kind are flattened
+    assert shape('a==1 and (c>3 and b<2)').key == shape('c>0 and b<0 and a==0').key
+    assert shape('a==1 or (b<2 and c>3)').key == 'or(a==?, and(b<?, c>?))'
+    assert shape('not (b<2 or a==1)').key == 'not(or(a==?, b<?))'
+
+
+def test_canonical_differences():
+    assert shape('a==1 and b<2').key != shape('a==1 or b<2').key
+    assert shape('a==1 and b<2').key != shape('a==1 and b<=2').key
+    assert shape('a==1 and b<2').key != shape('a==1 and not b<2').key
+    assert shape('a==1 and b<2 and cone(1, 2, 3)').key == 'and(a==?, b<?) | cone(1,2,3)'
+
+
+def test_canonical_repeated_names():
+    # equal shaped children are ordered by their values
+    first = shape('a<5 or a<1')
+    assert first.key == 'or(a<?, a<?)'
+    assert first.values == ['1', '5']
+    assert first.bindnames == ['a_1', 'a']
+
+
+def test_compiled_bind_reordered():
+    compiled = CompiledFilter(parse_boolean_search('integer > 1 and not string == abc'), Record)
+    other = parse_boolean_search('not string == xyz and integer > 7')
+    assert compiled.bind(other) == {'integer': 7, 'string': 'xyz'}
+
+
+def test_filter_cache():
+    cache = FilterCache(maxsize=4)
+    clause, params = cache.filter(parse_boolean_search('integer > 1 and float < 2'), Record)
+    assert params == {'integer': 1, 'float': 2.0}
+    other, params = cache.filter(parse_boolean_search('float < 5 and integer > 3'), Record)
+    assert other is clause
+    assert params == {'integer': 3, 'float': 5.0}
+    assert cache.info() == {'hits': 1, 'misses': 1, 'maxsize': 4, 'currsize': 1}
+
+    # another model is another entry
+    cache.filter(parse_boolean_search('integer > 1 and float < 2'), [Record])
+    assert len(cache) == 2
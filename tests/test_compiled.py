@@ -0,0 +1,75 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import (parse_boolean_search, BooleanSearchException,
+                                       CompiledFilter, ModelRegistry)
+from .models import Record
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def test_compiled_params():
+    expr = parse_boolean_search('integer > 1 and string = ab* and float between 1 and 2')
+    compiled = CompiledFilter(expr, Record)
+    assert compiled.bindnames == ['integer', 'string', 'float', 'float_2']
+    assert compiled.params() == {'integer': 1, 'string': 'ab%', 'float': 1.0, 'float_2': 2.0}
+    assert compiled.params({'integer': '5', 'string': 'xy'}) == \
+        {'integer': 5, 'string': '%xy%', 'float': 1.0, 'float_2': 2.0}
+
+    with pytest.raises(BooleanSearchException):
+        compiled.params({'integer': 'text'})
+    with pytest.raises(BooleanSearchException):
+        compiled.params({'xyz': '1'})
+
+
+def test_compiled_bitwise():
+    compiled = CompiledFilter(parse_boolean_search('integer & 64'), Record)
+    assert compiled.params({'integer': '~8'}) == {'integer': -9}
+
+
+def test_compiled_bind():
+    expr = parse_boolean_search('integer > 1 or not string == abc')
+    compiled = CompiledFilter(expr, ModelRegistry([Record]))
+    other = parse_boolean_search('integer > 7 or not string == xyz')
+    assert compiled.bind(other) == {'integer': 7, 'string': 'xyz'}
+
+    with pytest.raises(BooleanSearchException):
+        compiled.bind(parse_boolean_search('integer < 7 or not string == xyz'))
+    with pytest.raises(BooleanSearchException):
+        compiled.bind(parse_boolean_search('integer > 7 and not string == xyz'))
+
+
+def test_compiled_statement_reuse(db):
+    all_records = [Record(integer=i, string='rec{0}'.format(i)) for i in range(5)]
+    add_records(db, all_records)
+
+    compiled = CompiledFilter(parse_boolean_search('integer >= 1 and string = rec*'), Record)
+    query = Record.query.filter(compiled.clause)
+    sql = str(query.statement.compile())
+
+    records = query.params(compiled.params()).all()
+    assert sorted(r.integer for r in records) == [1, 2, 3, 4]
+
+    records = query.params(compiled.params({'integer': '3', 'string': '*c4'})).all()
+    assert [r.integer for r in records] == [4]
+
+    other = parse_boolean_search('integer >= 0 and string = ec')
+    records = query.params(compiled.bind(other)).all()
+    assert len(records) == 5
+
+    # the statement text never changes
+    assert str(query.statement.compile()) == sql
+
+    delete_records(db, all_records)
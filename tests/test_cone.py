@@ -0,0 +1,128 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_boolean_search import parse_boolean_search, optimize, BooleanSearchException
+from .models import Record, Source
+import math
+import sqlite3
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def has_math_functions():
+    try:
+        sqlite3.connect(':memory:').execute('select sin(radians(1))')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def distance(ra1, dec1, ra2, dec2):
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    cosine = (math.sin(dec1) * math.sin(dec2) +
+              math.cos(dec1) * math.cos(dec2) * math.cos(ra1 - ra2))
+    return math.degrees(math.acos(min(1.0, cosine)))
+
+
+def test_cone_unconfigured():
+    # without a configured model the cone is left to the caller
+    assert parse_boolean_search('cone(10, 20, 1)').filter(Record) is None
+    expr = parse_boolean_search('integer > 1 and cone(10, 20, 1)')
+    assert str(expr.filter(Record)) == 'records.integer > :integer'
+    assert repr(expr.functions) == '[cone(10,20,1)]'
+
+
+def test_cone_other_functions():
+    # other functions are left to the caller, even on a configured model
+    expr = parse_boolean_search('foo(1, 2, 3) and ra > 1')
+    assert str(expr.filter(Source)) == 'sources.ra > :ra'
+    assert parse_boolean_search('mean(ra, dec, 5)').filter(Source) is None
+
+
+def test_cone_missing_arguments():
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('cone()').filter(Source)
+
+
+def test_cone_bbox():
+    clause = str(parse_boolean_search('cone(10, 20, 1)').filter(Source))
+    assert clause.startswith('sources.dec BETWEEN :dec_1 AND :dec_2 AND '
+                             'sources.ra BETWEEN :ra_1 AND :ra_2 AND ')
+    assert 'sin(radians(sources.dec))' in clause
+
+    # at a pole only the Dec band applies
+    clause = str(parse_boolean_search('cone(10, 89.5, 1)').filter(Source))
+    assert 'sources.ra BETWEEN' not in clause
+
+    # across RA 0 the RA range wraps
+    clause = str(parse_boolean_search('cone(0.5, 0, 1)').filter(Source))
+    assert 'sources.ra >= :ra_1 OR sources.ra <= :ra_2' in clause
+
+
+def test_cone_modes():
+    options = Source.__boolean_search__['cone']
+    dialect = postgresql.dialect()
+    try:
+        options['mode'] = 'q3c'
+        clause = parse_boolean_search('cone(10, 20, 1)').filter(Source).compile(dialect=dialect)
+        assert str(clause) == 'q3c_radial_query(sources.ra, sources.dec, ' \
+            '%(q3c_radial_query_1)s, %(q3c_radial_query_2)s, %(q3c_radial_query_3)s)'
+        assert list(clause.params.values()) == [10.0, 20.0, 1.0]
+
+        options['mode'] = 'pgsphere'
+        clause = parse_boolean_search('cone(10, 20, 1)').filter(Source).compile(dialect=dialect)
+        assert str(clause).startswith(
+            'spoint(radians(sources.ra), radians(sources.dec)) <@ scircle(')
+
+        options['mode'] = 'xyz'
+        with pytest.raises(BooleanSearchException):
+            parse_boolean_search('cone(10, 20, 1)').filter(Source)
+    finally:
+        del options['mode']
+
+
+def test_cone_values():
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('cone(a, 20, 1)').filter(Source)
+
+
+def test_cone_operators():
+    assert str(parse_boolean_search('name = abc or cone(10, 20, 1)').filter(Source)).startswith(
+        'sources.name LIKE :name OR sources.dec BETWEEN')
+    assert str(parse_boolean_search('not cone(10, 20, 1)').filter(Source)).startswith(
+        'NOT (sources.dec BETWEEN')
+    # the optimizer keeps function conditions in their operator
+    expr = optimize(parse_boolean_search('not not name = abc and cone(10, 20, 1)'))
+    assert str(expr.filter(Source)).startswith('sources.name LIKE :name AND sources.dec BETWEEN')
+
+
+@pytest.mark.skipif(not has_math_functions(), reason='SQLite without math functions')
+@pytest.mark.parametrize('ra, dec, radius',
+                         [(10, 20, 2), (0.5, -10, 1.5), (359.5, 45, 1), (120, 88, 3)])
+def test_cone_results(db, ra, dec, radius):
+    points = [(ra + dra, dec + ddec) for dra in (-4, -2, -1, -0.5, 0, 0.5, 1, 2, 4)
+              for ddec in (-3, -1.4, -0.7, 0, 0.7, 1.4, 3)]
+    points = [(p_ra % 360, p_dec) for p_ra, p_dec in points if -90 <= p_dec <= 90]
+    sources = [Source(name='s{0}'.format(i), ra=p_ra, dec=p_dec)
+               for i, (p_ra, p_dec) in enumerate(points)]
+    add_records(db, sources)
+
+    expr = parse_boolean_search('cone({0}, {1}, {2})'.format(ra, dec, radius))
+    found = sorted(s.name for s in Source.query.filter(expr.filter(Source)).all())
+    expected = sorted(s.name for s in sources if distance(ra, dec, s.ra, s.dec) <= radius)
+    assert expected
+    assert found == expected
+    delete_records(db, sources)
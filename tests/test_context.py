@@ -0,0 +1,89 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, ParseContext, expression_parser
+from .models import Record
+import threading
+
+
+def bindnames(expr):
+    compiled = expr.filter(Record).compile()
+    return sorted(compiled.params.items())
+
+
+def test_unique_bindnames():
+    expr = parse_boolean_search('integer < 1 or integer > 5 or integer == 3')
+    assert [c.bindname for c in expr.conditions] == ['integer', 'integer_1', 'integer_2']
+    assert bindnames(expr) == [('integer', 1), ('integer_1', 5), ('integer_2', 3)]
+
+
+def test_between_bindnames():
+    expr = parse_boolean_search('integer between 1 and 5 or integer == 2')
+    between, equal = expr.conditions
+    assert (between.bindname, between.bindname2) == ('integer', 'integer_2')
+    assert equal.bindname == 'integer_1'
+
+    # filtering does not change the bind names
+    first = bindnames(expr)
+    assert first == bindnames(expr)
+    assert first == [('integer', 1), ('integer_1', 2), ('integer_2', 5)]
+
+
+def test_context_grammar():
+    with ParseContext() as context:
+        expr = expression_parser.parseString('a < 1 and b > 2 and cone(1, 2, 3)')[0]
+    assert ParseContext.current() is not context
+    assert context.params == {'a': '1', 'b': '2'}
+    assert context.uniqueparams == ['a', 'b']
+    assert context.bindnames == set(['a', 'b'])
+    assert repr(context.functions) == '[cone(1,2,3)]'
+    assert repr(expr) == 'and_(a<1, b>2)'
+
+
+def test_direct_grammar():
+    # without an explicit context each parse collects into its own context
+    expr = expression_parser.parseString('integer<1 or integer>2')[0]
+    assert [c.bindname for c in expr.conditions] == ['integer', 'integer_1']
+    assert bindnames(expr) == [('integer', 1), ('integer_1', 2)]
+    assert expr.params == {'integer': '2'}
+
+    expr = expression_parser.parseString('integer<3')[0]
+    assert expr.bindname == 'integer'
+    assert expr.params == {'integer': '3'}
+
+
+def test_nested_contexts():
+    with ParseContext() as outer:
+        with ParseContext() as inner:
+            assert ParseContext.current() is inner
+            expression_parser.parseString('a < 1')
+        assert ParseContext.current() is outer
+        expression_parser.parseString('b < 1')
+    assert inner.params == {'a': '1'}
+    assert outer.params == {'b': '1'}
+
+
+def test_concurrent_parses():
+    errors = []
+
+    def worker(index):
+        names = ['p{0}_{1}'.format(index, i) for i in range(5)]
+        search = ' and '.join('{0} == {1}'.format(name, index) for name in names)
+        for _ in range(50):
+            expr = parse_boolean_search(search + ' or ' + names[0] + ' < 0')
+            try:
+                assert sorted(expr.params) == sorted(names)
+                assert expr.uniqueparams == names
+                bound = [c.bindname for c in expr.conditions[0].conditions]
+                assert bound == names
+                assert expr.conditions[1].bindname == names[0] + '_1'
+            except AssertionError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
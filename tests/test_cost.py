@@ -0,0 +1,73 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, reorder, CostModel
+from .models import Record
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def reordered(search, cost_model=None):
+    return repr(reorder(parse_boolean_search(search), Record, cost_model))
+
+
+def test_reorder_and():
+    # indexed equality, then scans, then a LIKE '%abc%'
+    assert reordered('string = abc and integer == 5 and id == 3') == \
+        'and_(id==3, integer==5, string=abc)'
+    # equally ranked terms keep their order
+    assert reordered('integer == 5 and float == 2') == 'and_(integer==5, float==2)'
+    assert reordered('float == 2 and integer == 5') == 'and_(float==2, integer==5)'
+
+
+def test_reorder_or():
+    # for an or, terms likely to match go first
+    assert reordered('integer == 5 or integer != 2') == 'or_(integer!=2, integer==5)'
+    assert reordered('not (string = abc or id > 3)') == 'not_(or_(id>3, string=abc))'
+
+
+def test_reorder_stats():
+    stats = {'records.float': {'distinct': 1000}, 'integer': {'selectivity': 0.9}}
+    assert reordered('integer == 5 and float == 2', CostModel(stats)) == \
+        'and_(float==2, integer==5)'
+
+
+def test_cost_like_prefix():
+    model = CostModel()
+    prefix = parse_boolean_search('string = abc*')
+    contains = parse_boolean_search('string = abc')
+    # without an index a prefix match scans too
+    assert model.cost(prefix, Record) == model.cost(contains, Record)
+    assert model.cost(parse_boolean_search('id == 1'), Record)[0] < model.cost(prefix, Record)[0]
+
+
+def test_explain():
+    model = CostModel()
+    expr = reorder(parse_boolean_search('string = abc and (float < 1 or id == 2)'), Record, model)
+    rows = model.explain(expr, Record)
+    assert [(depth, element) for depth, element, cost, selectivity in rows] == \
+        [(0, 'BoolAnd'), (1, 'BoolOr'), (2, 'float<1'), (2, 'id==2'), (1, 'string=abc')]
+    depth, element, cost, selectivity = rows[0]
+    assert 0 < selectivity < 1
+
+
+def test_reorder_results(db):
+    records = [Record(integer=i, float=i * 10.0, string='s{0}'.format(i)) for i in range(6)]
+    add_records(db, records)
+    expr = parse_boolean_search('string = s and (float < 30 or id > 0) and integer != 4')
+    expected = Record.query.filter(expr.filter(Record)).order_by(Record.id).all()
+    result = Record.query.filter(reorder(expr, Record).filter(Record)).order_by(Record.id).all()
+    assert result == expected
+    assert repr(expr) == 'and_(string=s, or_(float<30, id>0), integer!=4)'
+    delete_records(db, records)
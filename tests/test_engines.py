@@ -0,0 +1,192 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, BooleanSearchException, FxnCondition
+import random
+import re
+import subprocess
+import sys
+import pytest
+
+
+engines = ['fast', 'pratt']
+
+
+searches = [
+    'a=1 or b=2 or not c=3 and d=4 and e=5',
+    'a=1 or not b=2 and c=3',
+    'a=1 or not (b=2 and c=3)',
+    '(a=1 or not b=2) and c=3',
+    'a < 1 or a <= 1 or a = 1 or a == 1 or a >= 1 or a > 1 or a != 1',
+    'field1=*something* and not (field2==1 or field3<=10.0)',
+    'a >= 4 and a < 6',
+    'a between 1 and 2',
+    'a between 1 and 2 or c > 10',
+    'a BETWEEN 1 AND 2 and b == "x y"',
+    'table.a & ~64',
+    'table.a | 64 and b < ~0.1',
+    'a==1 AND b==2 OR c==3',
+    'not not a==1',
+    '((a==1))',
+    'a < 1 and a > 2 and a == 3',
+    'func(a > 5) < 40',
+    'b < 2 and func(a > 5) < 40',
+    'b < 2 or func(a > 5) < 40 and c == 1',
+    'cone(3.4, 5.6, 1)',
+    'b < 2 and cone(3.4, 5.6, 1)',
+    'hist(a, b, 10, 0, 1)',
+]
+
+
+def describe(expr):
+    ''' Return a comparable description of a parsed expression '''
+    def walk(node):
+        if isinstance(node, FxnCondition):
+            return (type(node).__name__, repr(node), getattr(node, 'bindname', None))
+        if hasattr(node, 'conditions'):
+            return (type(node).__name__, [walk(c) for c in node.conditions])
+        if hasattr(node, 'condition'):
+            return (type(node).__name__, walk(node.condition))
+        return (type(node).__name__, repr(node), node.bindname, getattr(node, 'bindname2', None))
+
+    return (walk(expr), expr.params, expr.uniqueparams, [repr(f) for f in expr.functions])
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('search', searches)
+def test_engine(search, engine):
+    expected = parse_boolean_search(search)
+    expr = parse_boolean_search(search, engine=engine)
+    assert describe(expr) == describe(expected)
+
+
+def random_search(rand, depth=0):
+    ''' Build a random search from the grammar '''
+    roll = rand.random()
+    if depth >= 3 or roll < 0.4:
+        if rand.random() < 0.1:
+            names = ['nothing', 'notes', 'android', 'order']
+        else:
+            names = ['a', 'b', 'tab.c', 'd_1']
+        name = rand.choice(names)
+        kind = rand.random()
+        if kind < 0.1:
+            return '{0} between {1} and {2}'.format(name, rand.randint(0, 5), rand.randint(5, 9))
+        if kind < 0.2:
+            return '{0} {1} ~{2}'.format(name, rand.choice(['&', '|']), rand.choice([1, 2, 64]))
+        if kind < 0.25:
+            return 'cone({0}, {1}, {2})'.format(rand.randint(0, 360), rand.randint(-90, 90), 1)
+        if kind < 0.3:
+            return 'npergood({0} > {1}) >= {2}'.format(name, rand.randint(0, 9),
+                                                       rand.randint(0, 9))
+        value = rand.choice(['1', '2.5', '-3', 'x*', '*y*', '"two words"', '1e5'])
+        op = rand.choice(['<', '<=', '=', '==', '!=', '>=', '>'])
+        op = rand.choice(['', ' ']) + op + rand.choice(['', ' '])
+        return '{0}{1}{2}'.format(name, op, value)
+    if roll < 0.5:
+        return 'not ' + random_search(rand, depth + 1)
+    if roll < 0.6:
+        return '(' + random_search(rand, depth + 1) + ')'
+    op = rand.choice(['and', 'or', 'AND', 'Or'])
+    terms = [random_search(rand, depth + 1) for __ in range(rand.randint(2, 3))]
+    return ' {0} '.format(op).join(terms)
+
+
+# names the pyparsing engine splits a keyword off, see test_engine_keyword_names
+keyword_names = re.compile(r'\b(nothing|notes|android)\b')
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_engine_random(engine):
+    # differential test against the pyparsing engine, or against the pratt engine for
+    # the names only the pyparsing engine splits keywords off
+    rand = random.Random(1234)
+    for __ in range(150):
+        search = random_search(rand)
+        if keyword_names.search(search):
+            assert describe(parse_boolean_search(search, engine=engine)) == \
+                describe(parse_boolean_search(search, engine='pratt')), search
+            continue
+        try:
+            expected = describe(parse_boolean_search(search))
+        except BooleanSearchException:
+            with pytest.raises(BooleanSearchException):
+                parse_boolean_search(search, engine=engine)
+            continue
+        assert describe(parse_boolean_search(search, engine=engine)) == expected, search
+
+
+def nested_search(depth):
+    search = 'x{0}==1'.format(depth)
+    for i in range(depth):
+        search = '(x{0}<{0} {1} {2})'.format(i, 'and' if i % 2 else 'or', search)
+    return search
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_engine_deep_nesting(engine):
+    expr = parse_boolean_search(nested_search(30), engine=engine)
+    assert len(expr.params) == 31
+    assert repr(expr).count('(') == 30
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_engine_long_chain(engine):
+    search = ' or '.join('x{0}=={0}'.format(i) for i in range(300))
+    expr = parse_boolean_search(search, engine=engine)
+    assert len(expr.conditions) == 300
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('search', ['a:1', 'or a==1', '(a==1', 'f2(a>1)<3', 'a between 1'])
+def test_engine_errors(search, engine):
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search(search, engine=engine)
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_engine_keywords(engine):
+    # keywords only match whole words
+    expr = parse_boolean_search('notes==1 and order==2', engine=engine)
+    assert repr(expr) == 'and_(notes==1, order==2)'
+
+
+@pytest.mark.parametrize('search, pyparsing, others', [
+    ('nothing==1', 'not_(hing==1)', 'nothing==1'),
+    ('notes==1 and android==2', 'and_(not_(es==1), android==2)', 'and_(notes==1, android==2)'),
+    ('a==1 andb==2', 'and_(a==1, b==2)', 'a==1'),
+    ('order==1 or android==2', 'or_(order==1, android==2)', 'or_(order==1, android==2)'),
+])
+def test_engine_keyword_names(search, pyparsing, others):
+    # the documented difference: the pyparsing engine splits keywords off names
+    assert repr(parse_boolean_search(search)) == pyparsing
+    for engine in engines:
+        assert repr(parse_boolean_search(search, engine=engine)) == others
+
+
+def test_pratt_error_position():
+    with pytest.raises(BooleanSearchException) as excinfo:
+        parse_boolean_search('(a==1 and b:2)', engine='pratt')
+    assert str(excinfo.value) == 'Parsing syntax error ((a==1 and b>!<:2)) at line:1, col:12'
+
+
+def test_pratt_trailing_text():
+    # as with the pyparsing grammar, text after the expression is ignored
+    assert repr(parse_boolean_search('a==1 or', engine='pratt')) == 'a==1'
+    assert repr(parse_boolean_search('a==1 and (b==2 or)', engine='pratt')) == 'a==1'
+
+
+def test_unknown_engine():
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('a==1', engine='xyz')
+
+
+def test_packrat():
+    # packrat memoization is process-wide, so check it in a separate interpreter
+    code = ('import sqlalchemy_boolean_search as s; s.enable_packrat(); '
+            'search = "(a==1 or (b<2 and c>3)) and d==4"; '
+            'print(repr(s.parse_boolean_search(search, engine="fast")), '
+            'repr(s.parse_boolean_search(search)))')
+    output = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+    assert output == 'and_(or_(a==1, and_(b<2, c>3)), d==4) and_(or_(a==1, and_(b<2, c>3)), d==4)'
@@ -0,0 +1,106 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from collections import namedtuple
+from sqlalchemy_boolean_search import (parse_boolean_search, compile_predicate, filter_rows,
+                                       optimize, BooleanSearchException)
+from .models import Record, Parent
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def matches(search, row):
+    return compile_predicate(parse_boolean_search(search))(row)
+
+
+def test_evaluate_dicts():
+    row = {'a': 3, 'name': 'Xylophone', 'flags': 65, 'x': None}
+    assert matches('a < 5 and name = x*', row)
+    assert matches('name = *PHONE', row)
+    assert not matches('name = phone*', row)
+    assert matches('name == xylophone', row)
+    assert matches('a between 3 and 4', row)
+    assert not matches('a between 4 and 5', row)
+    assert matches('flags & 64 and not flags & 2', row)
+    assert matches('flags & ~1', row)
+    assert matches('a = 3 and a != 4', row)
+
+
+def test_evaluate_like():
+    # '_' matches any one character, as in SQL
+    assert matches('name = x_l*', {'name': 'Xylophone'})
+    assert not matches('name = x.l*', {'name': 'Xylophone'})
+
+
+def test_evaluate_nulls():
+    row = {'a': 3, 'x': None}
+    assert not matches('x < 1', row)
+    assert not matches('not x < 1', row)
+    assert matches('x < 1 or a == 3', row)
+    assert not matches('x < 1 and a == 3', row)
+    assert not matches('not (x < 1 and a == 3)', row)
+    assert matches('not (x < 1 and a == 4)', row)
+
+
+def test_evaluate_rows():
+    Row = namedtuple('Row', ['a', 'b'])
+    rows = [Row(i, 'b{0}'.format(i)) for i in range(10)]
+    result = filter_rows(parse_boolean_search('a >= 2 and a < 8 and not b = *5'), iter(rows))
+    assert next(result) == Row(2, 'b2')
+    assert [row.a for row in result] == [3, 4, 6, 7]
+
+
+def test_evaluate_names():
+    parent = Parent(name='pa')
+    record = Record(parent=parent, integer=5)
+    assert matches('parent.name == pa and records.integer == 5', record)
+    assert matches('parent.name == pa', {'parent.name': 'pa'})
+    assert matches('parent.name == pa', {'parent': {'name': 'pa'}})
+    assert not matches('parent.name == pa', Record(parent=None))
+    with pytest.raises(BooleanSearchException):
+        matches('xyz == 1', {'a': 1})
+    with pytest.raises(BooleanSearchException):
+        matches('a < x', {'a': 1})
+
+
+def test_evaluate_functions():
+    # function conditions are not evaluated, as in filter
+    assert matches('cone(1, 2, 3)', {'a': 1})
+    assert matches('a == 1 and cone(1, 2, 3)', {'a': 1})
+    assert not matches('a == 2 and cone(1, 2, 3)', {'a': 1})
+    assert not matches('integer>5 and integer<3', {'integer': 4})
+    expr = optimize(parse_boolean_search('integer>5 and integer<3'), Record)
+    assert not compile_predicate(expr)({})
+
+
+@pytest.mark.parametrize('search', [
+    'integer > 2 and float <= 30',
+    'string = b* or string = *c',
+    'string == abc or string != abd',
+    'string < b and not integer between 2 and 4',
+    'integer & 2 or integer | ~1',
+    'not (integer == 1 or string = a)',
+    'float = 20 or string = a_c',
+])
+def test_evaluate_matches_sql(db, search):
+    values = [(0, 0.0, 'abc'), (1, 10.0, 'ABD'), (2, 20.0, 'bcd'), (3, 30.0, 'a_c'),
+              (4, 40.0, 'xyzc'), (5, 50.0, 'B')]
+    records = [Record(integer=i, float=f, string=s) for i, f, s in values]
+    add_records(db, records)
+    expr = parse_boolean_search(search)
+    query = Record.query.filter(Record.id.in_([r.id for r in records])).filter(expr.filter(Record))
+    expected = sorted(record.id for record in query.all())
+    assert sorted(record.id for record in filter_rows(expr, records)) == expected
+    delete_records(db, records)
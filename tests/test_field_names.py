@@ -3,9 +3,8 @@
 # Authors: Ling Thio <ling.thio@gmail.com>
 
 from __future__ import print_function
-from sqlalchemy_boolean_search import parse_boolean_search
+from sqlalchemy_boolean_search import parse_boolean_search, plan_joins
 from .models import Record, Parent, GrandParent
-import pytest
 
 
 def test_field_names(db):
@@ -23,26 +22,26 @@ def test_field_names(db):
     assert record.string == 'Record'
 
 
-@pytest.mark.skip(reason="tests no longer works for relationships")
 def test_fields_across_relationships(db):
     # Create records
     grandparent = GrandParent(name='GrandParent')
     parent = Parent(name='Parent', grandparent=grandparent)
-    record = Record(string='Record', parent=parent)
+    record = Record(string='RelatedRecord', parent=parent)
     db.session.add(record)
     db.session.commit()
 
     # Test level-1 hierarchy name
-    expression = parse_boolean_search('parent.name==Parent')
-    record = Record.query.filter(expression.filter(Record)).first()
+    expression = parse_boolean_search('parent.name==Parent and string==RelatedRecord')
+    record = plan_joins(expression, Record).apply(Record.query).first()
     assert record is not None
-    assert record.string == 'Record'
+    assert record.string == 'RelatedRecord'
 
     # Test level-2 hierarchy name
-    expression = parse_boolean_search('parent.grandparent.name==GrandParent')
-    record = Record.query.filter(expression.filter(Record)).first()
+    expression = parse_boolean_search('parent.grandparent.name==GrandParent and '
+                                      'string==RelatedRecord')
+    record = plan_joins(expression, Record).apply(Record.query).first()
     assert record is not None
-    assert record.string == 'Record'
+    assert record.string == 'RelatedRecord'
 
     # Delete records
     db.session.delete(record)
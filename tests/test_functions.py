@@ -0,0 +1,81 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy import func
+from sqlalchemy_boolean_search import (parse_boolean_search, register_function,
+                                       expression_functions, BooleanSearchException)
+from .models import Record, Parent, GrandParent
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def test_unregistered_function():
+    # unregistered functions are left to the caller, as before
+    expr = parse_boolean_search('integer < 3 and nbad(float > 5) > 1')
+    assert str(expr.filter(Record)) == 'records.integer < :integer'
+    assert repr(expr.functions) == '[nbad(float>5)>1]'
+
+
+def test_function_on_searched_model():
+    # a condition on the searched model itself is left to the caller, as before
+    expr = parse_boolean_search('string == a and npergood(integer > 5) >= 10')
+    assert str(expr.filter(Record)) == 'lower(records.string) = lower(:string)'
+    assert repr(expr.functions) == '[npergood(integer>5)>=10]'
+    assert parse_boolean_search('npergood(integer > 5) >= 1').filter(Record) is None
+
+
+def test_function_errors():
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('npergood(records.integer > 5) >= x').filter([Parent, Record])
+    with pytest.raises(BooleanSearchException):
+        # no foreign key between grandparents and records
+        parse_boolean_search('npergood(records.integer > 5) >= 1').filter([GrandParent, Record])
+
+
+def test_register_function():
+    def total(condition, DataModelClass):
+        model, field = condition.resolve_field(DataModelClass)
+        return func.abs(field)
+
+    register_function('total', total)
+    try:
+        expr = parse_boolean_search('total(integer > 0) < 4')
+        assert str(expr.filter(Record)) == 'abs(records.integer) < :abs_1'
+    finally:
+        del expression_functions['total']
+
+
+def test_npergood(db):
+    parents = [Parent(name='pa'), Parent(name='pb'), Parent(name='pc')]
+    add_records(db, parents)
+    records = [Record(parent=parents[0], integer=i) for i in (1, 6, 7, 8)] + \
+        [Record(parent=parents[1], integer=i) for i in (2, 9)]
+    add_records(db, records)
+
+    def names(search):
+        expr = parse_boolean_search(search)
+        # other tests may leave parents behind
+        query = Parent.query.filter(Parent.id.in_([p.id for p in parents]))
+        query = query.filter(expr.filter([Parent, Record]))
+        return sorted(parent.name for parent in query.all())
+
+    assert names('npergood(records.integer > 5) >= 2') == ['pa']
+    assert names('npergood(records.integer > 5) >= 1') == ['pa', 'pb']
+    assert names('count(records.integer > 5) == 0') == ['pc']
+    # in one statement with the rest of the search
+    assert names('name = p and not npergood(records.integer < 3) > 0') == ['pc']
+    assert names('name == pb or npergood(records.integer >= 7) == 2') == ['pa', 'pb']
+    delete_records(db, records)
+    delete_records(db, parents)
@@ -0,0 +1,73 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_boolean_search import (parse_boolean_search, histogram, HistCondition,
+                                       BooleanSearchException)
+from .models import Record
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'fast', 'pratt'])
+def test_hist_dispatch(engine):
+    expr = parse_boolean_search('integer < 5 and hist(integer, float, 10, 0, 1)', engine=engine)
+    hist = expr.functions[0]
+    assert isinstance(hist, HistCondition)
+    assert hist.parameters == ['integer', 'float']
+    assert hist.bins() == (10, 0.0, 1.0)
+    assert hist.edges() == [i / 10. for i in range(11)]
+
+
+def test_hist_bins():
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('hist(integer, 0, 0, 1)').bins()
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('hist(integer, 10, 1, 0)').bins()
+
+
+def test_hist_bucket():
+    hist = parse_boolean_search('hist(float, 10, 0, 50)')
+    clause = hist.bucket(Record.float, 'postgresql').compile(dialect=postgresql.dialect())
+    assert str(clause) == 'width_bucket(records.float, %(width_bucket_1)s, %(width_bucket_2)s, ' \
+        '%(width_bucket_3)s) - %(width_bucket_4)s'
+    assert str(hist.bucket(Record.float)) == \
+        'CAST((records.float - :float_1) * :param_1 AS INTEGER)'
+
+
+def test_histogram(db):
+    records = [Record(integer=i, float=i * 2.5, string='hist{0}'.format(i % 2)) for i in range(20)]
+    add_records(db, records)
+
+    expr = parse_boolean_search('string = hist and hist(integer, 4, 0, 20)')
+    result = histogram(Record.query, expr, Record)
+    assert result.parameters == ['integer']
+    assert result.counts == [5, 5, 5, 5]
+    assert result.edges == [0.0, 5.0, 10.0, 15.0, 20.0]
+
+    # the rest of the expression filters the rows
+    expr = parse_boolean_search('string == hist0 and float < 30 and hist(integer, 5, 2, 12)')
+    result = histogram(Record.query, expr, Record)
+    assert result.counts == [1, 1, 1, 1, 1]
+
+    # one dimension per parameter
+    expr = parse_boolean_search('string = hist and integer < 10 and '
+                                'hist(integer, float, 2, 0, 10)')
+    # only rows within the edges of both parameters count
+    assert histogram(Record.query, expr, Record).counts == [[2, 2], [0, 0]]
+
+    with pytest.raises(BooleanSearchException):
+        histogram(Record.query, parse_boolean_search('integer < 10'), Record)
+    delete_records(db, records)
@@ -0,0 +1,32 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+import subprocess
+import sys
+
+
+def run(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode().split()
+
+
+def test_lazy_import():
+    # importing the module neither imports pyparsing nor builds the grammar
+    code = ('import sys; import sqlalchemy_boolean_search as s; '
+            'print("pyparsing" in sys.modules, "sqlalchemy.dialects.postgresql" in sys.modules, '
+            's._grammar_elements is None); '
+            's.parse_boolean_search("a==1 and not b<2", engine="pratt"); '
+            'print("pyparsing" in sys.modules); '
+            's.parse_boolean_search("a==1 and not b<2"); '
+            'print("pyparsing" in sys.modules, s._grammar_elements is None)')
+    assert run(code) == ['False', 'False', 'True', 'False', 'True', 'False']
+
+
+def test_grammar_attributes():
+    code = ('import sqlalchemy_boolean_search as s; '
+            'from sqlalchemy_boolean_search import expression_parser, ParseException; '
+            'print(repr(expression_parser.parseString("a<1 or b==2")[0]), '
+            'expression_parser is s.expression_parser, '
+            's.fast_expression_parser is s._grammar()["fast_expression"], '
+            'ParseException.__module__.startswith("pyparsing"), hasattr(s, "unknown_element"))')
+    assert run(code) == ['or_(a<1,', 'b==2)', 'True', 'True', 'True', 'False']
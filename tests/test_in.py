@@ -0,0 +1,151 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import (parse_boolean_search, canonicalize, CompiledFilter,
+                                       FilterCache, filter_rows, iter_conditions, optimize,
+                                       BooleanSearchException)
+from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+from .models import Record
+import pytest
+
+# created in an in-memory database of its own
+Base = declarative_base()
+
+
+class Counter(Base):
+    __tablename__ = 'counters'
+    id = Column(Integer, primary_key=True)
+    a = Column(Integer)
+    a_in = Column(Integer)
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'fast', 'pratt'])
+def test_in_syntax(engine):
+    expr = parse_boolean_search('integer in [1, 2,3] and not string IN [a*, "b c"]', engine=engine)
+    assert repr(expr) == 'and_(integer in [1, 2, 3], not_(string in [a*, b c]))'
+    assert expr.params == {'integer': ['1', '2', '3'], 'string': ['a*', 'b c']}
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('integer in []', engine=engine)
+
+
+def test_in_filter():
+    clause = parse_boolean_search('integer in [1, 3] and string in [A, b]').filter(Record)
+    assert str(clause) == ('records.integer IN (__[POSTCOMPILE_integer_in]) AND '
+                           'lower(records.string) IN (__[POSTCOMPILE_string_in])')
+    assert clause.compile().params == {'integer_in': [1, 3], 'string_in': ['a', 'b']}
+    with pytest.raises(BooleanSearchException):
+        parse_boolean_search('integer in [1, x]').filter(Record)
+
+
+def test_or_collapse():
+    expr = parse_boolean_search('integer == 1 or float > 2 or integer == 3 or integer in [4, 5]')
+    clause = expr.filter(Record)
+    assert str(clause) == \
+        'records.integer IN (__[POSTCOMPILE_integer_in]) OR records.float > :float'
+    assert clause.compile().params == {'integer_in': [1, 3, 4, 5], 'float': 2.0}
+    # other operators on the column are kept
+    clause = parse_boolean_search('integer == 1 or integer > 5').filter(Record)
+    assert str(clause) == 'records.integer = :integer OR records.integer > :integer_1'
+
+
+def test_in_bindname_collision():
+    # a parameter named like the list bind gets a free name, clear of the list's
+    # expanded names a_in_1, a_in_2, ...
+    def params(search):
+        return parse_boolean_search(search).filter(Counter).compile().params
+
+    expr = parse_boolean_search('a in [1, 2] and a_in == 3')
+    assert [c.bindname for c in iter_conditions(expr)] == ['a_in', 'a_in_']
+    assert params('a in [1, 2] and a_in == 3') == {'a_in': [1, 2], 'a_in_': 3}
+    assert params('a_in == 3 and a in [1, 2]') == {'a_in': 3, 'a_in_1': [1, 2]}
+    assert params('(a == 1 or a == 2) and a_in == 3') == {'a_in': [1, 2], 'a_in_': 3}
+    assert params('a_in == 3 and (a == 1 or a == 2)') == {'a_in': 3, 'a_in_1': [1, 2]}
+    # optimize flattens the ors into new merged terms, with names clear of the others
+    expr = optimize(parse_boolean_search('a_in == 3 and (a == 1 or (a == 2 or a == 4))'))
+    assert expr.filter(Counter).compile().params == {'a_in': 3, 'a_in_1': [1, 2, 4]}
+
+
+def test_in_bindname_collision_results():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    session.add_all([Counter(a=i, a_in=i) for i in range(5)])
+    session.commit()
+
+    def values(search):
+        clause = parse_boolean_search(search).filter(Counter)
+        return sorted(c.a for c in session.query(Counter).filter(clause))
+
+    assert values('a in [1, 2, 3] and a_in == 3') == [3]
+    assert values('a_in == 3 and a in [1, 2, 3]') == [3]
+    assert values('(a == 1 or a == 3) and a_in == 3') == [3]
+    assert values('a_in == 3 and (a == 1 or a == 3)') == [3]
+    session.close()
+
+
+def test_in_shape():
+    small = parse_boolean_search(' or '.join('integer == {0}'.format(i) for i in range(3)))
+    large = parse_boolean_search(' or '.join('integer == {0}'.format(i) for i in range(500)))
+    assert canonicalize(small).key == canonicalize(large).key == 'or(integer in ?)'
+    assert canonicalize(parse_boolean_search('integer in [7]')).key == 'integer in ?'
+
+    cache = FilterCache()
+    clause, params = cache.filter(small, Record)
+    other, params = cache.filter(large, Record)
+    assert other is clause
+    assert params == {'integer_in': list(range(500))}
+
+    compiled = CompiledFilter(parse_boolean_search('integer in [1, 2] and float < 1'), Record)
+    assert compiled.params({'integer_in': ['7', '8', '9']}) == \
+        {'integer_in': [7, 8, 9], 'float': 1.0}
+
+
+def test_in_predicate():
+    rows = [{'integer': 1, 'string': 'Abc'}, {'integer': 2, 'string': 'b'},
+            {'integer': None, 'string': 'c'}]
+    assert list(filter_rows(parse_boolean_search('integer in [1, 2]'), rows)) == rows[:2]
+    assert list(filter_rows(parse_boolean_search('string in [abc, c]'), rows)) == \
+        [rows[0], rows[2]]
+    assert list(filter_rows(parse_boolean_search('not integer in [1]'), rows)) == [rows[1]]
+
+
+def test_in_mask():
+    np = pytest.importorskip('numpy')
+    from sqlalchemy_boolean_search import evaluate_mask
+    data = {'integer': np.array([1, 2, 3]), 'string': np.array(['Abc', 'b', 'c'])}
+    assert evaluate_mask(parse_boolean_search('integer in [1, 3]'), data).tolist() == \
+        [True, False, True]
+    assert evaluate_mask(parse_boolean_search('string in [abc, b]'), data).tolist() == \
+        [True, True, False]
+
+
+def test_in_results(db):
+    records = [Record(integer=i, string='in{0}'.format(i)) for i in range(6)]
+    add_records(db, records)
+    ids = [record.id for record in records]
+
+    def found(search):
+        clause = parse_boolean_search(search).filter(Record)
+        query = Record.query.filter(clause, Record.id.in_(ids)).order_by(Record.id)
+        return [r.integer for r in query]
+
+    assert found('integer in [1, 4, 9]') == [1, 4]
+    assert found('integer == 1 or integer == 4 or string == IN5') == [1, 4, 5]
+    assert found('string in [IN2, in3]') == [2, 3]
+    assert found('not integer in [0, 1, 2]') == [3, 4, 5]
+    delete_records(db, records)
@@ -0,0 +1,55 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+import sqlalchemy_boolean_search as sbs
+from sqlalchemy_boolean_search import (parse_boolean_search, optimize, reorder, SearchStats,
+                                       add_instrument, remove_instrument, expression_size)
+from .models import Record
+
+
+def test_expression_size():
+    assert expression_size(parse_boolean_search('a == 1')) == (1, 1)
+    assert expression_size(parse_boolean_search('a == 1 and b == 2')) == (2, 2)
+    assert expression_size(parse_boolean_search('a == 1 and not (b == 2 or c < 3)')) == (3, 4)
+    assert expression_size(parse_boolean_search('a == 1 and cone(1, 2, 3)')) == (2, 2)
+
+
+def test_search_stats():
+    with SearchStats() as stats:
+        expression = parse_boolean_search('integer > 1 and not (float < 2 or string = abc)')
+        expression.filter(Record)
+        reorder(optimize(expression, Record), Record)
+    assert sbs._instruments == ()
+
+    result = stats.as_dict()
+    assert result['parse.count'] == 1
+    assert result['field_lookup.count'] == 3
+    assert result['clause_build.count'] == 3
+    assert result['optimize.count'] == result['reorder.count'] == 1
+    assert result['parse.seconds'] > 0
+    assert result['parse.max_seconds'] == result['parse.seconds']
+    assert (result['searches'], result['conditions'], result['max_depth']) == (1, 3, 4)
+    assert list(result)[:3] == ['parse.count', 'parse.seconds', 'parse.max_seconds']
+
+    stats.reset()
+    assert stats.as_dict()['parse.count'] == 0
+
+
+def test_instrument_callback():
+    calls = []
+
+    def instrument(stage, seconds, target):
+        calls.append((stage, repr(target)))
+
+    add_instrument(instrument)
+    try:
+        parse_boolean_search('integer > 1').filter(Record)
+    finally:
+        remove_instrument(instrument)
+    assert calls == [('parse', 'integer>1'), ('field_lookup', 'integer>1'),
+                     ('clause_build', 'integer>1')]
+
+    # disabled instruments are not called
+    parse_boolean_search('integer > 1').filter(Record)
+    assert len(calls) == 3
@@ -0,0 +1,63 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, plan_joins, BooleanSearchException
+from .models import Record, Person
+import pytest
+
+
+def plan(search, model=Record, **kwargs):
+    return plan_joins(parse_boolean_search(search), model, **kwargs)
+
+
+def test_plan_joins():
+    result = plan('parent.name == a and (parent.grandparent.name == b or parent.id > 2) and '
+                  'integer < 5')
+    # each relationship path is joined once
+    assert [str(join) for join in result.joins] == ['Record.parent', 'Parent.grandparent']
+    sql = str(result.apply(Record.query))
+    assert sql.count('JOIN') == 2
+    assert 'WHERE lower(parents.name) = lower(?) AND (lower(grandparents.name) = lower(?)' in sql
+
+
+def test_plan_no_joins():
+    result = plan('integer < 5 and records.float > 1')
+    assert result.joins == []
+    assert str(result.filter) == 'records.integer < :integer AND records.float > :records.float'
+
+
+def test_plan_aliases():
+    result = plan('manager.name == a and manager.manager.name == b and name == c', Person)
+    assert len(result.joins) == 2
+    sql = str(result.apply(Person.query))
+    assert 'lower(people_1.name) = lower(?) AND lower(people_2.name) = lower(?) AND ' \
+        'lower(people.name)' in sql
+
+
+def test_plan_errors():
+    with pytest.raises(BooleanSearchException):
+        plan('parent.unknown == 1')
+    with pytest.raises(BooleanSearchException):
+        plan('parent.grandparent.unknown == 1')
+
+
+def test_plan_outer(db):
+    people = [Person(name='planner_c')]
+    people.append(Person(name='planner_b', manager=people[0]))
+    people.append(Person(name='planner_a', manager=people[1]))
+    people.append(Person(name='planner_d'))
+    db.session.add_all(people)
+    db.session.commit()
+
+    result = plan('manager.manager.name == planner_c and name = planner', Person)
+    assert [p.name for p in result.apply(Person.query).all()] == ['planner_a']
+
+    search = 'manager.name == planner_b or name == planner_d'
+    assert [p.name for p in plan(search, Person).apply(Person.query).all()] == ['planner_a']
+    names = [p.name for p in plan(search, Person, outer=True).apply(Person.query).all()]
+    assert sorted(names) == ['planner_a', 'planner_d']
+
+    for person in reversed(people):
+        db.session.delete(person)
+    db.session.commit()
@@ -0,0 +1,102 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_boolean_search import (parse_boolean_search, CompiledFilter, FilterCache,
+                                       BooleanSearchException)
+from .models import Source
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def compiled(search, dialect=None):
+    clause = parse_boolean_search(search).filter(Source)
+    compiled = clause.compile(dialect=dialect)
+    return str(compiled), compiled.params
+
+
+def test_match_contains():
+    clause = 'lower(sources.comment) LIKE lower(:comment)'
+    assert compiled('comment = abc') == (clause, {'comment': '%abc%'})
+    assert compiled('comment = abc*') == (clause, {'comment': 'abc%'})
+
+
+def test_match_prefix():
+    assert compiled('name = abc') == ('sources.name LIKE :name', {'name': 'abc%'})
+    assert compiled('name = *abc') == ('sources.name LIKE :name', {'name': '%abc'})
+
+
+def test_match_exact():
+    assert compiled('designation = J1234') == \
+        ('sources.designation = :designation', {'designation': 'J1234'})
+    assert compiled('designation = J12*') == \
+        ('sources.designation LIKE :designation', {'designation': 'J12%'})
+
+
+def test_match_lower():
+    assert compiled('alias = Abc') == \
+        ('lower(sources.alias) LIKE lower(:alias)', {'alias': 'Abc%'})
+
+
+def test_match_trigram():
+    assert compiled('remarks = *galaxy*', dialect=postgresql.dialect()) == \
+        ('sources.remarks %% %(remarks)s', {'remarks': 'galaxy'})
+
+
+def test_match_compiled_params():
+    compiled = CompiledFilter(parse_boolean_search('name = ab and alias = cd'), Source)
+    assert compiled.params({'name': 'xy', 'alias': 'z*'}) == {'name': 'xy%', 'alias': 'z%'}
+
+
+def test_match_exact_rebind_wildcard():
+    exact = parse_boolean_search('designation = ABC123')
+    pattern = parse_boolean_search('designation = AB*')
+    cache = FilterCache()
+    cache.filter(exact, Source)
+    clause, params = cache.filter(pattern, Source)
+    assert str(clause) == 'sources.designation LIKE :designation'
+    assert params == {'designation': 'AB%'}
+    with pytest.raises(BooleanSearchException):
+        CompiledFilter(exact, Source).params({'designation': 'AB*'})
+
+
+def test_match_unknown_strategy():
+    expr = parse_boolean_search('comment = abc')
+    Source.comment.expression.info['boolean_search'] = {'match': 'xyz'}
+    try:
+        with pytest.raises(BooleanSearchException):
+            expr.filter(Source)
+    finally:
+        del Source.comment.expression.info['boolean_search']
+
+
+def test_match_results(db):
+    sources = [Source(name='Abell 1', designation='J1', alias='ABELL', comment='x'),
+               Source(name='abell 2', designation='J12', alias='abell-2', comment='y'),
+               Source(name='M31', designation='J2', alias='Andromeda', comment='z')]
+    add_records(db, sources)
+
+    def names(search):
+        expr = parse_boolean_search(search)
+        return sorted(s.name for s in Source.query.filter(expr.filter(Source)).all())
+
+    # prefix matches only; SQLite's LIKE is case-insensitive
+    assert names('name = abell') == ['Abell 1', 'abell 2']
+    assert names('name = bell') == []
+    assert names('comment = y') == ['abell 2']
+    assert names('designation = J1') == ['Abell 1']
+    assert names('designation = J1*') == ['Abell 1', 'abell 2']
+    assert names('alias = abell') == ['Abell 1', 'abell 2']
+    delete_records(db, sources)
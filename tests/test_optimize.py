@@ -0,0 +1,130 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, optimize, iter_conditions
+from .models import Record, Source
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def optimized(search, model=None):
+    return repr(optimize(parse_boolean_search(search), model))
+
+
+def test_optimize_flatten():
+    assert optimized('(a==1 and (b==2 and c==3)) and d==4') == 'and_(a==1, b==2, c==3, d==4)'
+    assert optimized('a==1 or (b==2 or c==3)') == 'or_(a==1, b==2, c==3)'
+    assert optimized('((a==1))') == 'a==1'
+
+
+def test_optimize_duplicates():
+    assert optimized('a==1 and b==2 and a==1') == 'and_(a==1, b==2)'
+    assert optimized('(a==1 and b==2) or (b==2 and a==1)') == 'and_(a==1, b==2)'
+    assert optimized('a==1 and a==2') == 'and_(a==1, a==2)'
+    # absorption
+    assert optimized('a==1 and (a==1 or b==2)') == 'a==1'
+    assert optimized('a==1 or (b==2 and a==1)') == 'a==1'
+
+
+def test_optimize_not():
+    assert optimized('not not a==1') == 'a==1'
+    assert optimized('not (integer<1 or string==2)', Record) == 'and_(integer>=1, string!=2)'
+    assert optimized('not (integer>1 and not float<=2)', Record) == 'or_(integer<=1, float<=2)'
+    # without a model the fields may be arrays, so comparisons are not inverted
+    assert optimized('not (a<1 or b==2)') == 'and_(not_(a<1), not_(b==2))'
+    # '=' and bitwise conditions have no plain negation
+    assert optimized('not (a=x* or b & 4)') == 'and_(not_(a=x*), not_(b&4))'
+
+
+def test_optimize_ranges():
+    assert optimized('integer>1 and integer>5', Record) == 'integer>5'
+    assert optimized('integer>=5 and integer>5', Record) == 'integer>5'
+    assert optimized('integer>1 and integer>=5 and integer<=9', Record) == 'integerbetween5and9'
+    assert optimized('integer>=1 and integer<9 and float<2', Record) == \
+        'and_(integer>=1, integer<9, float<2)'
+    assert optimized('integer between 1 and 5 and integer>2', Record) == \
+        'and_(integer>2, integer<=5)'
+    assert optimized('integer==3 and integer>1', Record) == 'integer==3'
+    assert optimized('not (integer<1 or integer>5)', Record) == 'integerbetween1and5'
+
+    # without a model the field types are unknown, so ranges are kept
+    assert optimized('integer>1 and integer>5') == 'and_(integer>1, integer>5)'
+    # string fields compare as strings
+    assert optimized('string>1 and string>5', Record) == 'and_(string>1, string>5)'
+
+
+def test_optimize_contradictions():
+    assert optimized('integer>5 and integer<3', Record) == 'false'
+    assert optimized('integer>=3 and integer<3', Record) == 'false'
+    assert optimized('integer==3 and integer==4', Record) == 'false'
+    assert optimized('(integer>5 and integer<3) or float<1', Record) == 'float<1'
+    assert optimized('not (integer>5 and integer<3)', Record) == 'true'
+    assert optimized('(integer>5 and integer<3) and float<1', Record) == 'false'
+
+    # on a nullable column the contradiction is NULL for NULL values, so it is kept
+    assert optimized('ra>5 and ra>6 and ra<3', Source) == 'and_(ra>6, ra<3)'
+    assert optimized('ra==3 and ra==4', Source) == 'and_(ra==3, ra==4)'
+    assert optimized('not (ra>5 and ra<3)', Source) == 'or_(ra<=5, ra>=3)'
+
+
+def test_optimize_contradictions_nullable(db):
+    sources = [Source(name='s1', designation='n1', ra=None),
+               Source(name='s2', designation='n2', ra=4.0)]
+    add_records(db, sources)
+    for search in ('not (ra>5 and ra<3)', 'not (ra==3 and ra==4)',
+                   'not (ra>=4 and ra<4) and name=s'):
+        expr = parse_boolean_search(search)
+        original = Source.query.filter(expr.filter(Source)).all()
+        optimized_rows = Source.query.filter(optimize(expr, Source).filter(Source)).all()
+        assert [s.name for s in optimized_rows] == [s.name for s in original] == ['s2']
+    delete_records(db, sources)
+
+
+def test_optimize_bindnames():
+    expr = parse_boolean_search('integer>1 and integer>=5 and integer<=9 and float<2')
+    expr = optimize(expr, Record)
+    assert [(c.bindname, getattr(c, 'bindname2', None)) for c in iter_conditions(expr)] == \
+        [('integer', 'integer_1'), ('float', None)]
+    params = expr.filter(Record).compile().params
+    assert params == {'integer': 5, 'integer_1': 9, 'float': 2.0}
+
+
+def test_optimize_keeps_original():
+    expr = parse_boolean_search('not not (a==1 and a==1) and cone(1, 2, 3)')
+    result = optimize(expr)
+    # the and keeps its function condition
+    assert repr(result) == 'and_(a==1)'
+    assert repr(result.fxn_conditions) == '[cone(1,2,3)]'
+    assert repr(expr) == 'and_(not_(not_(and_(a==1, a==1))))'
+    assert result.params == {'a': '1'}
+    assert repr(result.functions) == '[cone(1,2,3)]'
+
+
+@pytest.mark.parametrize('search', [
+    'integer>1 and integer>=3 and integer<=4',
+    'not (integer<2 or integer>=4) and not not float<100',
+    'integer>4 and integer<1',
+    'not (integer>4 and integer<1)',
+    '(integer==2 or integer==3) and (integer==2 or integer==3 or float>1)',
+    'integer between 1 and 4 and integer>2 and integer!=4',
+])
+def test_optimize_results(db, search):
+    records = [Record(integer=i, float=i * 10.0, string='s{0}'.format(i)) for i in range(6)]
+    add_records(db, records)
+    expr = parse_boolean_search(search)
+    expected = Record.query.filter(expr.filter(Record)).order_by(Record.id).all()
+    result = Record.query.filter(optimize(expr, Record).filter(Record)).order_by(Record.id).all()
+    assert result == expected
+    delete_records(db, records)
@@ -0,0 +1,84 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, SearchPager, BooleanSearchException
+from .models import Record
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+def test_pager_key():
+    assert SearchPager(Record).key == ['id']
+    assert SearchPager(Record, key='float').key == ['float', 'id']
+    assert SearchPager([Record], key=['integer', 'id']).key == ['integer', 'id']
+    with pytest.raises(BooleanSearchException):
+        SearchPager(Record, key='nope')
+    with pytest.raises(BooleanSearchException):
+        SearchPager(Record, page_size=0)
+
+    pager = SearchPager(Record, key='integer')
+    clause = pager.seek([3, 7])
+    assert str(clause.compile(compile_kwargs={'literal_binds': True})) == \
+        'records.integer > 3 OR records.integer = 3 AND records.id > 7'
+
+
+def test_pager_pages(db):
+    records = [Record(integer=i % 4, float=i * 1.5, string='pager{0}'.format(i))
+               for i in range(11)]
+    add_records(db, records)
+    expression = parse_boolean_search('string = pager* and float < 15')
+    expected = sorted([r for r in records if r.float < 15], key=lambda r: (r.integer, r.id))
+
+    pager = SearchPager(Record, key='integer', page_size=3)
+    pages = list(pager.pages(Record.query, expression))
+    assert [len(page.items) for page in pages] == [3, 3, 3, 1]
+    assert [item for page in pages for item in page.items] == expected
+    assert pages[-1].next_token is None
+
+    # a token resumes where its page ended
+    page = pager.page(Record.query, expression, pages[1].next_token)
+    assert page.items == pages[2].items
+
+    # descending
+    pager = SearchPager(Record, key='float', page_size=4, descending=True)
+    items = [item for page in pager.pages(Record.query, expression) for item in page.items]
+    assert items == sorted(expected, key=lambda r: -r.float)
+
+    # the stream yields the same rows in the same order
+    pager = SearchPager(Record, key='integer')
+    assert list(pager.stream(Record.query, expression, yield_per=2)) == expected
+
+    delete_records(db, records)
+
+
+def test_pager_tokens(db):
+    records = [Record(integer=i, float=i / 4.0, string='tokens{0}'.format(i)) for i in range(5)]
+    add_records(db, records)
+    expression = parse_boolean_search('string = tokens*')
+
+    pager = SearchPager(Record, key='float', page_size=2)
+    token = pager.page(Record.query, expression).next_token
+    assert pager.values(token) == [0.25, records[1].id]
+    assert [r.integer for r in pager.page(Record.query, expression, token).items] == [2, 3]
+
+    with pytest.raises(BooleanSearchException):
+        pager.page(Record.query, expression, 'not a token')
+    # tokens of another key or direction are rejected
+    with pytest.raises(BooleanSearchException):
+        SearchPager(Record, key='integer').values(token)
+    with pytest.raises(BooleanSearchException):
+        SearchPager(Record, key='float', descending=True).values(token)
+
+    delete_records(db, records)
@@ -0,0 +1,72 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, BooleanSearchException, ModelRegistry
+from . import models
+from .models import Record, Parent, GrandParent, Source, Person
+import pytest
+
+
+def compiled(clause):
+    compiled = clause.compile()
+    return str(compiled), compiled.params
+
+
+def test_registry_index():
+    registry = ModelRegistry(models)
+    assert set(registry.models) == set([Record, Parent, GrandParent, Source, Person])
+    assert registry.resolve('integer') == (Record, Record.integer)
+    assert registry.resolve('name', basename='parents') == (Parent, Parent.name)
+    assert registry.resolve('name', basename='grandparents') == (GrandParent, GrandParent.name)
+    assert registry.resolve('xyz') is None
+    assert 'records.float' in registry
+    assert 'parents.float' not in registry
+
+
+def test_registry_list_order():
+    registry = ModelRegistry([Parent, GrandParent])
+    assert registry.resolve('name') == (Parent, Parent.name)
+    registry = ModelRegistry([GrandParent, Parent])
+    assert registry.resolve('name') == (GrandParent, GrandParent.name)
+
+
+def test_registry_partial_table_name():
+    # table names are matched like filter() on a list of models does
+    registry = ModelRegistry(models)
+    assert registry.resolve('name', basename='grand') == (GrandParent, GrandParent.name)
+
+
+@pytest.mark.parametrize('search',
+                         ['integer == 1 and float < 2.5',
+                          'string = *abc* or not unicode == x',
+                          'grandparents.name == bob and records.integer between 1 and 5',
+                          'integer & ~64'])
+def test_registry_filter(search):
+    expr = parse_boolean_search(search)
+    expected = compiled(expr.filter(models))
+    registry = ModelRegistry(models)
+    assert compiled(expr.filter(registry)) == expected
+    assert compiled(expr.filter([Record, Parent, GrandParent])) == expected
+
+
+def test_registry_missing_field():
+    expr = parse_boolean_search('xyz == 1')
+    with pytest.raises(BooleanSearchException):
+        expr.filter(ModelRegistry(models))
+
+
+def test_registry_query(db):
+    grandparent = GrandParent(name='GrandParent')
+    parent = Parent(name='Parent', grandparent=grandparent)
+    record = Record(integer=7, string='Record', parent=parent)
+    db.session.add(record)
+    db.session.commit()
+
+    registry = ModelRegistry([Record, Parent, GrandParent])
+    expression = parse_boolean_search('integer == 7 and string = rec*')
+    records = Record.query.filter(expression.filter(registry)).all()
+    assert [r.integer for r in records] == [7]
+
+    db.session.delete(record)
+    db.session.commit()
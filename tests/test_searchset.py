@@ -0,0 +1,75 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import parse_boolean_search, SearchSet, BooleanSearchException
+from .models import Record
+import pytest
+
+
+def add_records(db, records):
+    for record in records:
+        db.session.add(record)
+    db.session.commit()
+
+
+def delete_records(db, records):
+    for record in records:
+        db.session.delete(record)
+    db.session.commit()
+
+
+searches = [
+    'string == dr17 and integer < 5 and float > 1',
+    'integer < 5 and string == dr17 and float < 3',
+    'string == dr17 and (integer < 5 and integer > 0)',
+]
+
+
+def test_searchset_terms():
+    searches_set = SearchSet([parse_boolean_search(search) for search in searches], Record)
+    assert repr(searches_set.shared) == '[string==dr17, integer<5]'
+    assert repr(searches_set.residuals) == '[[float>1], [float<3], [integer>0]]'
+
+    # bind names are unique across the searches
+    clause = searches_set.prefilter.compile()
+    assert clause.params == {'string': 'dr17', 'integer': 5, 'float': 1.0, 'float_1': 3.0,
+                             'integer_1': 0}
+
+
+def test_searchset_shared_values():
+    # equal terms are shared, terms with other values are not
+    searches_set = SearchSet([parse_boolean_search('integer < 5 and float > 1'),
+                              parse_boolean_search('integer < 6 and float > 1')], Record)
+    assert repr(searches_set.shared) == '[float>1]'
+    assert repr(searches_set.residuals) == '[[integer<5], [integer<6]]'
+
+
+def test_searchset_no_residual():
+    searches_set = SearchSet([parse_boolean_search('integer < 5'),
+                              parse_boolean_search('integer < 5 and float > 1')], Record)
+    assert str(searches_set.prefilter) == 'records.integer < :integer'
+    with pytest.raises(BooleanSearchException):
+        SearchSet([], Record)
+
+
+def test_searchset_query(db):
+    records = [Record(string='dr17' if i % 3 else 'dr16', integer=i % 7, float=i / 4.0)
+               for i in range(30)]
+    add_records(db, records)
+    ids = [r.id for r in records]
+    expressions = [parse_boolean_search(search)
+                   for search in searches + ['float > 6 or integer == 3']]
+    searches_set = SearchSet(expressions, Record)
+
+    rows = searches_set.query(db.session.query(Record).filter(Record.id.in_(ids))).all()
+    found = [set() for __ in expressions]
+    for record, mask in rows:
+        for index in searches_set.matches(mask):
+            found[index].add(record.id)
+    for index, expression in enumerate(expressions):
+        query = Record.query.filter(Record.id.in_(ids)).filter(expression.filter(Record))
+        assert found[index] == set(record.id for record in query.all())
+    # every returned row matches at least one search
+    assert all(mask for record, mask in rows)
+    delete_records(db, records)
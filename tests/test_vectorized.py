@@ -0,0 +1,95 @@
+# Copyright 2015 SolidBuilds.com. All rights reserved.
+#
+# Authors: Ling Thio <ling.thio@gmail.com>
+
+from sqlalchemy_boolean_search import (parse_boolean_search, evaluate_mask, compile_predicate,
+                                       BooleanSearchException)
+import random
+import pytest
+
+np = pytest.importorskip('numpy')
+
+
+def make_data(size=200, seed=42):
+    rand = random.Random(seed)
+    words = ['abc', 'ABD', 'bcd', 'a_c', 'xyzc', 'B', 'Xylophone']
+    rows = [(rand.randint(-5, 70), rand.choice([rand.uniform(-10, 10), float('nan')]),
+             rand.choice(words)) for __ in range(size)]
+    return np.array(rows, dtype=[('integer', np.int64), ('float', float), ('string', 'U20')])
+
+
+def mask(search, data, **kwargs):
+    return evaluate_mask(parse_boolean_search(search), data, **kwargs).tolist()
+
+
+searches = [
+    'integer > 2 and float <= 3',
+    'string = b* or string = *c',
+    'string == abc or string != abd',
+    'string < b and not integer between 2 and 40',
+    'integer & 2 or integer | ~1',
+    'not (integer == 1 or string = a)',
+    'not (float < 0 and integer > 10) or string = a_c',
+    'records.float >= 1.5 or not float >= 1.5',
+    'not not (float > 0 or integer < 3) and string = *y*',
+]
+
+
+@pytest.mark.parametrize('search', searches)
+def test_mask_matches_predicate(search):
+    data = make_data()
+    expr = parse_boolean_search(search)
+    matches = compile_predicate(expr)
+    rows = [dict((name, None if name == 'float' and row[name] != row[name] else row[name].item())
+                 for name in data.dtype.names) for row in data]
+    expected = [matches(row) for row in rows]
+    assert evaluate_mask(expr, data).tolist() == expected
+    assert evaluate_mask(expr, data, index=True).tolist() == \
+        [i for i, m in enumerate(expected) if m]
+
+
+def test_mask_nulls():
+    data = {'a': np.array([1.0, np.nan, 3.0]), 'b': np.array(['x', None, 'y'], dtype=object)}
+    assert mask('a < 2', data) == [True, False, False]
+    assert mask('not a < 2', data) == [False, False, True]
+    assert mask('not b == x', data) == [False, False, True]
+    assert mask('a < 2 or not a < 2', data) == [True, False, True]
+
+
+def test_mask_names():
+    data = {'integer': np.arange(5)}
+    expr = parse_boolean_search('records.integer > 2')
+    assert evaluate_mask(expr, data, tablename='records').tolist() == \
+        [False, False, False, True, True]
+    with pytest.raises(BooleanSearchException):
+        evaluate_mask(expr, data, tablename='parents')
+    with pytest.raises(BooleanSearchException):
+        evaluate_mask(parse_boolean_search('xyz > 2'), data)
+    with pytest.raises(BooleanSearchException):
+        evaluate_mask(parse_boolean_search('integer > x'), data)
+
+
+def test_mask_functions():
+    data = {'a': np.arange(3)}
+    assert mask('cone(1, 2, 3)', data) == [True, True, True]
+    assert mask('a > 0 and cone(1, 2, 3)', data) == [False, True, True]
+
+
+def test_mask_dataframe():
+    pd = pytest.importorskip('pandas')
+    frame = pd.DataFrame({'a': [1, 5, 9], 'name': ['Abc', None, 'xbz']})
+    expr = parse_boolean_search('a > 2 and name = *b*')
+    assert evaluate_mask(expr, frame).tolist() == [False, False, True]
+    assert frame.index[evaluate_mask(expr, frame, index=True)].tolist() == [2]
+
+
+def test_mask_bitwise():
+    # integer columns with NaN nulls arrive from pandas as floats
+    data = {'flags': np.array([1.0, 2.0, 3.0, float('nan'), 6.0]),
+            'integer': np.array([1, 2, 3, 4, 6])}
+    assert mask('flags & 2', data) == [False, True, True, False, True]
+    assert mask('integer & 2', data) == [False, True, True, False, True]
+    assert mask('not flags & 2', data) == [True, False, False, False, False]
+    assert mask('flags & ~2', data) == [True, False, True, False, True]
+    with pytest.raises(BooleanSearchException):
+        evaluate_mask(parse_boolean_search('flags & 2.5'), data)